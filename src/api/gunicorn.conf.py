@@ -0,0 +1,30 @@
+import os
+
+from prometheus_client import multiprocess
+
+# same default as POC_PRINT_HUB_METRICS_DIR in pocprintapi/settings.py: the master never imports Django
+METRICS_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR", os.environ.get("POC_PRINT_HUB_METRICS_DIR", "/tmp/poc_print_hub_metrics"))
+
+def on_starting(server):
+    # samples of the previous run: stale totals would be summed forever, and a reused pid would write into a dead worker's file
+    os.makedirs(METRICS_DIR, exist_ok=True)
+
+    for file_name in os.listdir(METRICS_DIR):
+        if file_name.endswith(".db"):
+            os.remove(os.path.join(METRICS_DIR, file_name))
+
+def child_exit(server, worker):
+    # live gauges of an exited worker would otherwise be reported forever
+    multiprocess.mark_process_dead(worker.pid, METRICS_DIR)
+
+def post_worker_init(worker):
+    from pocprintapi.services.embeddedconsumer import embedded_consumer
+    from pocprintapi.services.publishspool import publish_spool
+
+    # recovers a publish spool slot left behind by an exited worker right away, rather than on the first publish
+    if publish_spool.enabled:
+        publish_spool.open()
+
+    # one worker at a time consumes the database print queues, the others take over when it exits
+    if embedded_consumer.enabled:
+        embedded_consumer.start()
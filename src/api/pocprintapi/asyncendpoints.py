@@ -0,0 +1,47 @@
+from django.http import HttpRequest, JsonResponse
+from django.conf import settings
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from typing import List
+from rest_framework import status as response_status
+from pocprintapi.services.asyncprintservice import AsyncPrintService
+from pocprintapi.services.authservice import AuthService
+from pocprintapi.services.metrics import PUBLISH_SECONDS
+from pocprintapi.models import TenantRole
+
+@csrf_exempt
+@require_POST
+async def publish(request: HttpRequest):
+    if await _is_request_authorized(request, [TenantRole.ADMIN, TenantRole.USER]):
+        with PUBLISH_SECONDS.labels("publish").time():
+            return await AsyncPrintService().apublish(request.body, request.headers.get(settings.POC_PRINT_HUB_TENANT_ID_HEADER))
+    
+    return _response_unauthorized()
+
+@require_GET
+async def status(request: HttpRequest):
+    if await _is_request_authorized(request, [TenantRole.ADMIN]):
+        return await AsyncPrintService().astatus()
+    
+    return _response_unauthorized()
+
+@require_GET
+async def queue_status(request: HttpRequest):
+    if await _is_request_authorized(request, [TenantRole.ADMIN]):
+        return await AsyncPrintService().aget_queue_status()
+    
+    return _response_unauthorized()
+
+async def _is_request_authorized(request: HttpRequest, allowed_roles: List[str]):
+    tenant_id = request.headers.get(settings.POC_PRINT_HUB_TENANT_ID_HEADER) 
+    tenant_token = request.headers.get(settings.POC_PRINT_HUB_TENANT_TOKEN_HEADER) 
+
+    return await AuthService().ais_authorized(tenant_id, tenant_token, allowed_roles)
+
+def _response_unauthorized():
+    return JsonResponse(
+        {
+            "message": "Request Unauthorized"
+        }, 
+        status=response_status.HTTP_401_UNAUTHORIZED
+    )
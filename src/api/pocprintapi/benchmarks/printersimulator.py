@@ -0,0 +1,385 @@
+import random
+import socket
+import struct
+import threading
+import time
+
+from typing import List, Optional, Tuple
+from escpos.capabilities import get_profile
+
+DLE = 0x10
+ESC = 0x1B
+GS = 0x1D
+
+# status replies, as decoded by escpos is_online / paper_status
+ONLINE_STATUS_BYTE = 0x12
+OFFLINE_STATUS_BYTE = 0x1A
+PAPER_STATUS_BYTES = { 0: 0x72, 1: 0x1E, 2: 0x12 } # Empty, Near End, Plenty
+
+# argument byte counts of the fixed-length commands python-escpos sends
+ESC_ARGUMENT_COUNTS = {
+    b"@"[0]: 0, b"2"[0]: 0, b"!"[0]: 1, b"-"[0]: 1, b"3"[0]: 1, b"E"[0]: 1, b"G"[0]: 1, b"J"[0]: 1,
+    b"M"[0]: 1, b"a"[0]: 1, b"d"[0]: 1, b"t"[0]: 1, b"{"[0]: 1, b"c"[0]: 2, b"p"[0]: 3
+}
+GS_ARGUMENT_COUNTS = {
+    b"!"[0]: 1, b"B"[0]: 1, b"H"[0]: 1, b"L"[0]: 2, b"W"[0]: 2, b"a"[0]: 1, b"b"[0]: 1,
+    b"f"[0]: 1, b"h"[0]: 1, b"w"[0]: 1
+}
+
+class PrinterSimulator:
+    """Local TCP stand-in for an ESC/POS network printer, for load and latency testing without hardware.
+
+    Answers the DLE EOT online and paper status queries, accepts text, images,
+    feed and cut commands, and keeps what it printed (`lines`, `cuts`) so
+    tests can assert on rendered output. Optional realism: print throughput
+    (received bytes are consumed at `bytes_per_sec`, so clients see TCP
+    backpressure), a delay before each connection is served, random
+    disconnects, and a paper roll that runs near end and out. Like most
+    network printers, it serves one connection at a time by default: the next
+    client waits until the previous job has been printed.
+    """
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        bytes_per_sec: float = 0,
+        connect_latency_sec: float = 0,
+        disconnect_probability: float = 0,
+        paper_status: int = 2,
+        paper_capacity_bytes: int = 0,
+        is_online: bool = True,
+        max_connections: int = 1,
+        log_file: Optional[str] = None,
+        seed: Optional[int] = None
+    ):
+        self.host: str = host
+        self.port: int = port
+        self.bytes_per_sec: float = bytes_per_sec # 0 means unlimited
+        self.connect_latency_sec: float = connect_latency_sec
+        self.disconnect_probability: float = disconnect_probability # per received chunk
+        self.paper_status: int = paper_status # 2: Plenty, 1: Near End, 0: Empty
+        self.paper_capacity_bytes: int = paper_capacity_bytes # 0 means endless paper
+        self.is_online: bool = is_online
+        self.log_file: Optional[str] = log_file
+
+        self.connects: int = 0
+        self.disconnects: int = 0
+        self.status_queries: int = 0
+        self.printed_bytes: int = 0
+        self.cuts: int = 0
+        self.lines: List[str] = []
+
+        self._connection_slots = threading.Semaphore(max_connections)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: Optional[socket.socket] = None
+        self._is_running: bool = False
+        self._code_pages = get_profile().codePages
+
+    def __enter__(self) -> "PrinterSimulator":
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def start(self) -> "PrinterSimulator":
+        """Starts serving in background threads, `port` 0 picks a free port"""
+        self._server = socket.create_server((self.host, self.port))
+        self.port = self._server.getsockname()[1]
+        self._is_running = True
+
+        threading.Thread(target=self._accept_connections, daemon=True).start()
+        print(f"Printer simulator listening on {self.host}:{self.port}")
+
+        return self
+
+    def serve_forever(self) -> None:
+        self.start()
+
+        try:
+            while self._is_running:
+                time.sleep(0.5)
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        self._is_running = False
+
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+
+    def reset(self) -> None:
+        with self._lock:
+            self.connects = 0
+            self.disconnects = 0
+            self.status_queries = 0
+            self.printed_bytes = 0
+            self.cuts = 0
+            self.lines = []
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "connects": self.connects,
+                "disconnects": self.disconnects,
+                "statusQueries": self.status_queries,
+                "printedBytes": self.printed_bytes,
+                "cuts": self.cuts,
+                "lines": len(self.lines),
+                "paperStatus": self.paper_status
+            }
+
+    def _accept_connections(self) -> None:
+        while self._is_running:
+            try:
+                connection, _ = self._server.accept()
+            except OSError:
+                return # stopped
+
+            threading.Thread(target=self._serve_connection, args=(connection,), daemon=True).start()
+
+    def _serve_connection(self, connection: socket.socket) -> None:
+        with self._connection_slots:
+            self._serve_connection_slot(connection)
+
+    def _serve_connection_slot(self, connection: socket.socket) -> None:
+        with self._lock:
+            self.connects += 1
+
+        if self.connect_latency_sec > 0:
+            time.sleep(self.connect_latency_sec)
+
+        parser = _EscposStreamParser(self)
+
+        with connection:
+            while self._is_running:
+                try:
+                    chunk = connection.recv(4096)
+                except OSError:
+                    return
+
+                if not chunk:
+                    return
+
+                for reply in parser.feed(chunk):
+                    connection.sendall(reply)
+
+                if self.bytes_per_sec > 0:
+                    time.sleep(len(chunk) / self.bytes_per_sec)
+
+                if self.disconnect_probability > 0 and self._random.random() < self.disconnect_probability:
+                    # abortive close: the client sees a reset, like a printer power cycle
+                    connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+
+                    with self._lock:
+                        self.disconnects += 1
+
+                    return
+
+    def _reply_status(self, query: int) -> bytes:
+        with self._lock:
+            self.status_queries += 1
+
+        if query == 4: # paper sensor
+            return bytes([PAPER_STATUS_BYTES.get(self.paper_status, PAPER_STATUS_BYTES[0])])
+
+        return bytes([ONLINE_STATUS_BYTE if self.is_online else OFFLINE_STATUS_BYTE])
+
+    def _print_line(self, line: str) -> None:
+        with self._lock:
+            self.lines.append(line)
+
+        self._log(line)
+
+    def _cut(self) -> None:
+        with self._lock:
+            self.cuts += 1
+
+        self._log("--- cut ---")
+
+    def _consume_paper(self, byte_count: int) -> None:
+        with self._lock:
+            self.printed_bytes += byte_count
+
+            if self.paper_capacity_bytes <= 0:
+                return
+
+            if self.printed_bytes >= self.paper_capacity_bytes:
+                self.paper_status = 0
+            elif self.printed_bytes >= self.paper_capacity_bytes * 0.9:
+                self.paper_status = min(self.paper_status, 1)
+
+    def _decode_text(self, text: bytes, code_page: int) -> str:
+        encoding = self._code_pages.get(f"{code_page}", "CP437")
+
+        try:
+            return text.decode(encoding, errors="replace")
+        except LookupError:
+            return text.decode("CP437", errors="replace")
+
+    def _log(self, line: str) -> None:
+        if self.log_file is None:
+            return
+
+        with self._lock, open(self.log_file, "a", encoding="utf-8") as log:
+            log.write(line + "\n")
+
+class _EscposStreamParser:
+    """Incremental ESC/POS parser for one connection: commands may be split across TCP reads"""
+    def __init__(self, simulator: PrinterSimulator):
+        self.simulator: PrinterSimulator = simulator
+        self.code_page: int = 0
+
+        self._buffer = bytearray()
+        self._line = bytearray()
+        self._line_code_pages: List[Tuple[int, bytearray]] = [] # text runs of the current line, by code page
+        self._printed_bytes: int = 0 # parsed, not yet taken from the paper roll
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        """Consumes received bytes, returns the status replies to send"""
+        self._buffer.extend(chunk)
+        replies = []
+        offset = 0
+
+        while offset < len(self._buffer):
+            consumed, reply = self._parse_at(offset)
+
+            if consumed == 0:
+                break # incomplete command, wait for more bytes
+
+            if reply is None:
+                self._printed_bytes += consumed
+            else:
+                replies.append(reply)
+
+            offset += consumed
+
+        del self._buffer[:offset]
+        self._settle_printed_bytes()
+
+        return replies
+
+    def _parse_at(self, offset: int) -> Tuple[int, Optional[bytes]]:
+        buffer = self._buffer
+        byte = buffer[offset]
+        available = len(buffer) - offset
+
+        if byte == DLE:
+            if available < 3:
+                return 0, None
+
+            if buffer[offset + 1] == 0x04: # DLE EOT n: real-time status, reflects everything printed before it
+                self._settle_printed_bytes()
+                return 3, self.simulator._reply_status(buffer[offset + 2])
+
+            return 3, None
+
+        if byte == ESC:
+            if available < 2:
+                return 0, None
+
+            command = buffer[offset + 1]
+            argument_count = ESC_ARGUMENT_COUNTS.get(command, 1)
+
+            if available < 2 + argument_count:
+                return 0, None
+
+            if command == b"t"[0]:
+                self._flush_text()
+                self.code_page = buffer[offset + 2]
+            elif command == b"d"[0]: # print and feed
+                self._end_line(is_newline=False)
+
+            return 2 + argument_count, None
+
+        if byte == GS:
+            return self._parse_gs_at(offset)
+
+        if byte == 0x0A:
+            self._end_line(is_newline=True)
+            return 1, None
+
+        self._line.append(byte)
+
+        return 1, None
+
+    def _parse_gs_at(self, offset: int) -> Tuple[int, Optional[bytes]]:
+        buffer = self._buffer
+        available = len(buffer) - offset
+
+        if available < 2:
+            return 0, None
+
+        command = buffer[offset + 1]
+        length = None
+
+        if command == b"V"[0]: # cut: GS V m, or GS V m n for feed-and-cut modes
+            if available < 3:
+                return 0, None
+
+            length = 4 if buffer[offset + 2] in (65, 66) else 3
+
+            if available < length:
+                return 0, None
+
+            self._end_line(is_newline=False)
+            self.simulator._cut()
+        elif command == b"("[0]: # GS ( k / GS ( L pL pH data: QR codes, graphics
+            if available < 5:
+                return 0, None
+
+            length = 5 + buffer[offset + 3] + buffer[offset + 4] * 256
+        elif command == b"v"[0]: # GS v 0 m xL xH yL yH data: raster image
+            if available < 8:
+                return 0, None
+
+            width_bytes = buffer[offset + 4] + buffer[offset + 5] * 256
+            height = buffer[offset + 6] + buffer[offset + 7] * 256
+            length = 8 + width_bytes * height
+        elif command == b"k"[0]: # GS k m ...: barcode
+            if available < 3:
+                return 0, None
+
+            barcode_type = buffer[offset + 2]
+
+            if barcode_type <= 6: # NUL-terminated data
+                terminator = buffer.find(b"\x00", offset + 3)
+
+                if terminator < 0:
+                    return 0, None
+
+                length = terminator - offset + 1
+            else:
+                if available < 4:
+                    return 0, None
+
+                length = 4 + buffer[offset + 3]
+        else:
+            length = 2 + GS_ARGUMENT_COUNTS.get(command, 1)
+
+        if available < length:
+            return 0, None
+
+        return length, None
+
+    def _settle_printed_bytes(self) -> None:
+        if self._printed_bytes > 0:
+            self.simulator._consume_paper(self._printed_bytes)
+            self._printed_bytes = 0
+
+    def _flush_text(self) -> None:
+        if len(self._line) > 0:
+            self._line_code_pages.append((self.code_page, self._line))
+            self._line = bytearray()
+
+    def _end_line(self, is_newline: bool) -> None:
+        """Records the pending text as a printed line, blank lines only on an explicit newline"""
+        self._flush_text()
+
+        if len(self._line_code_pages) == 0 and not is_newline:
+            return
+
+        line = "".join(self.simulator._decode_text(bytes(text), code_page) for code_page, text in self._line_code_pages)
+        self._line_code_pages = []
+        self.simulator._print_line(line)
@@ -0,0 +1,99 @@
+import contextlib
+import math
+import os
+import platform
+import time
+
+from datetime import datetime, timezone
+from typing import Callable, List, Optional
+
+class Benchmark:
+    """A timed operation. `setup` runs before every run and is not timed"""
+    def __init__(
+        self,
+        name: str,
+        run: Callable[[], None],
+        runs: int,
+        ops_per_run: int = 1,
+        warmup_runs: int = 3,
+        setup: Optional[Callable[[], None]] = None
+    ):
+        self.name: str = name
+        self.run: Callable[[], None] = run
+        self.runs: int = runs
+        self.ops_per_run: int = ops_per_run
+        self.warmup_runs: int = warmup_runs
+        self.setup: Optional[Callable[[], None]] = setup
+
+def run_benchmark(benchmark: Benchmark) -> dict:
+    """Runs a benchmark: throughput over all runs, p50/p99 latency per run"""
+    durations = []
+
+    # the measured code paths log with print, keep that out of the report
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for run_index in range(benchmark.warmup_runs + benchmark.runs):
+            if benchmark.setup is not None:
+                benchmark.setup()
+
+            started_at = time.perf_counter()
+            benchmark.run()
+            duration = time.perf_counter() - started_at
+
+            if run_index >= benchmark.warmup_runs:
+                durations.append(duration)
+
+    durations.sort()
+
+    return {
+        "name": benchmark.name,
+        "runs": benchmark.runs,
+        "opsPerRun": benchmark.ops_per_run,
+        "opsPerSec": benchmark.runs * benchmark.ops_per_run / sum(durations),
+        "p50Ms": percentile(durations, 50) * 1000,
+        "p99Ms": percentile(durations, 99) * 1000
+    }
+
+def build_report(results: List[dict]) -> dict:
+    return {
+        "createdAt": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results
+    }
+
+def find_regressions(report: dict, baseline: dict, max_regression: float) -> List[str]:
+    """Compares against a baseline report: lower throughput, higher p99 latency or, for startup benchmarks, higher
+    peak RSS beyond max_regression (0.2 = 20%)"""
+    baseline_results = {result["name"]: result for result in baseline.get("results", [])}
+    regressions = []
+
+    for result in report["results"]:
+        baseline_result = baseline_results.get(result["name"])
+
+        if baseline_result is None:
+            continue
+
+        if result["opsPerSec"] < baseline_result["opsPerSec"] * (1 - max_regression):
+            regressions.append(
+                f"{result['name']}: {result['opsPerSec']:,.1f} ops/s, "\
+                f"baseline {baseline_result['opsPerSec']:,.1f} ops/s"
+            )
+
+        if result["p99Ms"] > baseline_result["p99Ms"] * (1 + max_regression):
+            regressions.append(
+                f"{result['name']}: p99 {result['p99Ms']:.3f} ms, "\
+                f"baseline {baseline_result['p99Ms']:.3f} ms"
+            )
+
+        if "rssMb" in result and "rssMb" in baseline_result and result["rssMb"] > baseline_result["rssMb"] * (1 + max_regression):
+            regressions.append(
+                f"{result['name']}: RSS {result['rssMb']:.1f} MB, "\
+                f"baseline {baseline_result['rssMb']:.1f} MB"
+            )
+
+    return regressions
+
+def percentile(sorted_values: List[float], percent: float) -> float:
+    """Nearest-rank percentile"""
+    rank = max(math.ceil(percent / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
@@ -0,0 +1,283 @@
+import pika
+
+from collections import deque
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple
+from django.db import connection as db_connection
+from pocprintapi.models import QueueMessage
+from pocprintapi.services.databasebroker import DatabaseBroker
+
+class InMemoryBroker:
+    """Single-process stand-in for RabbitMQ, shaped like the parts of pika.BlockingConnection in use.
+
+    Pass `connect` wherever `pika.BlockingConnection` is expected. Queues,
+    acks, transactions and requeue-on-close behave like the broker's, but
+    without network or persistence costs, so benchmarks measure this
+    project's code only.
+    """
+    def __init__(self):
+        self.queues: Dict[str, Deque[Tuple[pika.BasicProperties, bytes]]] = {}
+        self.published_count: int = 0
+
+    def connect(self, parameters=None) -> "InMemoryConnection":
+        return InMemoryConnection(self)
+
+    def fill(self, queue_name: str, bodies: List[bytes], properties: Optional[pika.BasicProperties] = None) -> None:
+        queue = self.queues.setdefault(queue_name, deque())
+        properties = properties or pika.BasicProperties()
+
+        for body in bodies:
+            queue.append((properties, body))
+
+    def purge(self) -> None:
+        for queue in self.queues.values():
+            queue.clear()
+
+    def message_count(self, queue_name: str) -> int:
+        return len(self.queues.get(queue_name, ()))
+
+class InMemoryConnection:
+    def __init__(self, broker: InMemoryBroker):
+        self.broker: InMemoryBroker = broker
+        self.is_open: bool = True
+        self.is_closed: bool = False
+
+        self._channels: List["InMemoryChannel"] = []
+
+    def channel(self) -> "InMemoryChannel":
+        channel = InMemoryChannel(self.broker)
+        self._channels.append(channel)
+
+        return channel
+
+    def process_data_events(self, time_limit: float = 0) -> None:
+        for channel in self._channels:
+            channel._deliver_to_consumers()
+
+    def sleep(self, duration: float) -> None:
+        pass
+
+    def call_later(self, delay: float, callback) -> object:
+        return callback
+
+    def remove_timeout(self, timeout_id) -> None:
+        pass
+
+    def add_callback_threadsafe(self, callback) -> None:
+        callback()
+
+    def close(self) -> None:
+        for channel in self._channels:
+            channel.close()
+
+        self.is_open = False
+        self.is_closed = True
+
+class _QueueDeclareMethod:
+    def __init__(self, message_count: int):
+        self.message_count: int = message_count
+
+class _QueueDeclareResult:
+    def __init__(self, message_count: int):
+        self.method = _QueueDeclareMethod(message_count)
+
+class _DeliverMethod:
+    def __init__(self, delivery_tag: int, message_count: int = 0):
+        self.delivery_tag: int = delivery_tag
+        self.message_count: int = message_count # basic_get only: messages left in the queue
+
+class InMemoryChannel:
+    def __init__(self, broker: InMemoryBroker):
+        self.broker: InMemoryBroker = broker
+        self.is_open: bool = True
+        self.is_closed: bool = False
+
+        self._next_delivery_tag: int = 1
+        self._unacked: Dict[int, Tuple[str, pika.BasicProperties, bytes]] = {} # delivery tag -> queue, properties, body
+        self._is_transactional: bool = False
+        self._pending: List[Tuple[str, pika.BasicProperties, bytes]] = []
+        self._consumers: Dict[str, Callable] = {} # queue -> on message callback
+        self._consumer_prefetch_count: int = 0
+
+    def confirm_delivery(self) -> None:
+        pass
+
+    def tx_select(self) -> None:
+        self._is_transactional = True
+
+    def add_on_return_callback(self, callback: Callable) -> None:
+        pass # every queue is created on first publish, nothing is returned
+
+    def tx_commit(self) -> None:
+        for queue_name, properties, body in self._pending:
+            self._enqueue(queue_name, properties, body)
+
+        self._pending.clear()
+
+    def basic_qos(self, prefetch_count: int = 0) -> None:
+        self._consumer_prefetch_count = prefetch_count
+
+    def queue_declare(self, queue: str, durable: bool = False, passive: bool = False) -> _QueueDeclareResult:
+        if passive and queue not in self.broker.queues:
+            raise pika.exceptions.ChannelClosedByBroker(404, f"NOT_FOUND - no queue '{queue}'")
+
+        return _QueueDeclareResult(len(self.broker.queues.setdefault(queue, deque())))
+
+    def basic_publish(self, exchange: str, routing_key: str, body, properties=None, mandatory: bool = False) -> None:
+        if isinstance(body, str):
+            body = body.encode()
+
+        properties = properties or pika.BasicProperties()
+
+        if self._is_transactional:
+            self._pending.append((routing_key, properties, body))
+        else:
+            self._enqueue(routing_key, properties, body)
+
+    def consume(self, queue: str, inactivity_timeout: Optional[float] = None) -> Iterator[tuple]:
+        """Yields deliveries until the queue is empty, then (None, None, None) if an inactivity timeout is set"""
+        source = self.broker.queues.setdefault(queue, deque())
+
+        while True:
+            if len(source) == 0:
+                if inactivity_timeout is None:
+                    return
+
+                yield None, None, None
+                continue
+
+            properties, body = source.popleft()
+            yield self._deliver(queue, properties, body), properties, body
+
+    def basic_get(self, queue: str) -> tuple:
+        source = self.broker.queues.setdefault(queue, deque())
+
+        if len(source) == 0:
+            return None, None, None
+
+        properties, body = source.popleft()
+        method_frame = self._deliver(queue, properties, body)
+        method_frame.message_count = len(source)
+
+        return method_frame, properties, body
+
+    def basic_consume(self, queue: str, on_message_callback) -> None:
+        self._consumers[queue] = on_message_callback
+
+    def start_consuming(self) -> None:
+        """Delivers to the registered consumers until their queues are empty"""
+        while self._deliver_to_consumers():
+            pass
+
+    def stop_consuming(self) -> None:
+        self._consumers.clear()
+
+    def basic_ack(self, delivery_tag: int, multiple: bool = False) -> None:
+        if not multiple:
+            self._unacked.pop(delivery_tag, None)
+            return
+
+        for acked_tag in [tag for tag in self._unacked if tag <= delivery_tag]:
+            del self._unacked[acked_tag]
+
+    def basic_nack(self, delivery_tag: int, requeue: bool = True) -> None:
+        queue_name, properties, body = self._unacked.pop(delivery_tag)
+
+        if requeue:
+            self.broker.queues[queue_name].appendleft((properties, body))
+
+    def cancel(self) -> None:
+        pass
+
+    def close(self) -> None:
+        if self.is_closed:
+            return
+
+        # like the broker: unacked deliveries go back to their queue
+        for queue_name, properties, body in reversed(list(self._unacked.values())):
+            self.broker.queues[queue_name].appendleft((properties, body))
+
+        self._unacked.clear()
+        self._pending.clear()
+        self.is_open = False
+        self.is_closed = True
+
+    def _deliver_to_consumers(self) -> bool:
+        """Delivers what the prefetch window allows, like a broker push. Returns whether anything was delivered"""
+        delivered = False
+
+        for queue_name, on_message in list(self._consumers.items()):
+            source = self.broker.queues.setdefault(queue_name, deque())
+
+            while len(source) > 0 and (
+                self._consumer_prefetch_count <= 0 or self._unacked_count(queue_name) < self._consumer_prefetch_count
+            ):
+                properties, body = source.popleft()
+                on_message(self, self._deliver(queue_name, properties, body), properties, body)
+                delivered = True
+
+        return delivered
+
+    def _unacked_count(self, queue_name: str) -> int:
+        return sum(1 for unacked_queue_name, _, _ in self._unacked.values() if unacked_queue_name == queue_name)
+
+    def _deliver(self, queue_name: str, properties: pika.BasicProperties, body: bytes) -> _DeliverMethod:
+        delivery_tag = self._next_delivery_tag
+        self._next_delivery_tag += 1
+        self._unacked[delivery_tag] = (queue_name, properties, body)
+
+        return _DeliverMethod(delivery_tag)
+
+    def _enqueue(self, queue_name: str, properties: pika.BasicProperties, body: bytes) -> None:
+        self.broker.queues.setdefault(queue_name, deque()).append((properties, body))
+        self.broker.published_count += 1
+
+class DatabaseBenchmarkBroker(DatabaseBroker):
+    """The embedded database queue backend with the queue setup helpers of InMemoryBroker, to benchmark it on a real database.
+
+    Purges the whole queue table: point it at a scratch database.
+    """
+    def create_table(self) -> None:
+        if QueueMessage._meta.db_table in db_connection.introspection.table_names():
+            return
+
+        with db_connection.schema_editor() as schema_editor:
+            schema_editor.create_model(QueueMessage)
+
+    def fill(self, queue_name: str, bodies: List[bytes], properties: Optional[pika.BasicProperties] = None) -> None:
+        properties = properties or pika.BasicProperties()
+
+        QueueMessage.objects.bulk_create(
+            QueueMessage(
+                queue_name=queue_name,
+                body=body,
+                content_type=properties.content_type,
+                headers=properties.headers,
+                priority=properties.priority
+            ) for body in bodies
+        )
+
+    def purge(self) -> None:
+        QueueMessage.objects.all().delete()
+
+class InMemoryPrinter:
+    """Stand-in for escpos printer.Network: always online with plenty of paper, counts what it receives"""
+    def __init__(self, host: str = "", *args, **kwargs):
+        self.host: str = host
+        self.received_bytes: int = 0
+        self.received_jobs: int = 0
+
+    def open(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def is_online(self) -> bool:
+        return True
+
+    def paper_status(self) -> int:
+        return 2 # Plenty (Paper is adequate)
+
+    def _raw(self, msg: bytes) -> None:
+        self.received_bytes += len(msg)
+        self.received_jobs += 1
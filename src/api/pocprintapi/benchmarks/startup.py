@@ -0,0 +1,92 @@
+import json
+import os
+import subprocess
+import sys
+
+from typing import Dict
+from django.conf import settings
+from pocprintapi.benchmarks.runner import percentile
+
+# what each process loads before it serves its first request or task
+STARTUP_ENTRY_POINTS: Dict[str, str] = {
+    # gunicorn worker: the WSGI application, then the URLconf on the first request
+    "api": "\n".join([
+        "from pocprintapi.wsgi import application",
+        "from django.urls import get_resolver",
+        "get_resolver().url_patterns"
+    ]),
+    # celery beat: the app, then the loader's default modules (Django setup), without the system checks as deployed
+    "beat": "\n".join([
+        "import os",
+        "os.environ.setdefault('CELERY_SKIP_CHECKS', 'true')",
+        "from pocprintapi import celery_app",
+        "celery_app.loader.init_worker()",
+        "celery_app.finalize()"
+    ]),
+    # celery worker: same as beat, then worker_init, which loads the print stack before the pool forks
+    "worker": "\n".join([
+        "from pocprintapi import celery_app",
+        "from celery.signals import worker_init",
+        "celery_app.loader.init_worker()",
+        "celery_app.finalize()",
+        "worker_init.send(sender=None)"
+    ])
+}
+
+# runs an entry point in a fresh interpreter, reports its load time and peak RSS as JSON
+STARTUP_SCRIPT = """
+import json
+import os
+import resource
+import time
+
+started_at = time.perf_counter()
+exec({entry_point!r})
+duration = time.perf_counter() - started_at
+
+# ru_maxrss is carried over from the parent process on Linux, VmHWM is this process's own peak
+max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+if os.path.exists("/proc/self/status"):
+    with open("/proc/self/status") as status_file:
+        max_rss_kb = next(int(line.split()[1]) for line in status_file if line.startswith("VmHWM:"))
+
+print(json.dumps({{"durationSec": duration, "maxRssKb": max_rss_kb}}))
+"""
+
+def run_startup_benchmark(entry_point_name: str, runs: int = 5, warmup_runs: int = 1) -> dict:
+    """Starts an entry point in a new process per run: starts/s and p50/p99 load time, like run_benchmark, plus peak RSS"""
+    script = STARTUP_SCRIPT.format(entry_point=STARTUP_ENTRY_POINTS[entry_point_name])
+    durations = []
+    max_rss_kbs = []
+
+    for run_index in range(warmup_runs + runs):
+        completed = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, "DJANGO_SETTINGS_MODULE": "pocprintapi.settings"},
+            capture_output=True,
+            text=True,
+            check=True
+        )
+
+        if run_index < warmup_runs:
+            continue
+
+        # the entry point may print on its own, the measurement is the last line
+        measurement = json.loads(completed.stdout.strip().splitlines()[-1])
+        durations.append(measurement["durationSec"])
+        max_rss_kbs.append(measurement["maxRssKb"])
+
+    durations.sort()
+    max_rss_kbs.sort()
+
+    return {
+        "name": f"startup_{entry_point_name}",
+        "runs": runs,
+        "opsPerRun": 1,
+        "opsPerSec": runs / sum(durations),
+        "p50Ms": percentile(durations, 50) * 1000,
+        "p99Ms": percentile(durations, 99) * 1000,
+        "rssMb": percentile(max_rss_kbs, 50) / 1024
+    }
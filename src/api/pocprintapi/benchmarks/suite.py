@@ -0,0 +1,188 @@
+import json
+import os
+import tempfile
+
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import connection as db_connection
+from django.test import RequestFactory, override_settings
+from escpos import printer
+from pocprintapi import endpoints
+from pocprintapi.benchmarks.printersimulator import PrinterSimulator
+from pocprintapi.benchmarks.runner import Benchmark
+from pocprintapi.benchmarks.standins import InMemoryBroker, InMemoryPrinter
+from pocprintapi.models import NotificationMessage, TenantAuthConfig, TenantRole
+from pocprintapi.services.authcache import credential_cache
+from pocprintapi.services.authservice import AuthService
+from pocprintapi.services.messagecodec import message_codec
+from pocprintapi.services.printerstatus import printer_status_snapshot
+from pocprintapi.services.printservice import PrintService
+from pocprintapi.services.publishspool import publish_spool
+from pocprintapi.services.rastercache import raster_cache
+from pocprintapi.services.rabbitpublisher import RabbitPublisher
+from pocprintapi.services.republishprogress import republish_progress
+
+BENCHMARK_TENANT_ID = "benchmark-tenant"
+BENCHMARK_TENANT_TOKEN = "benchmark-token"
+
+SAMPLE_REQUEST_BODY = json.dumps({
+    "title": "test-title",
+    "body": "{ \"prop1\": \"value1\", \"prop2\": \"value2\" }",
+    "bodyType": "KeyValue",
+    "origin": "test-origin",
+    "timestamp": "2025-01-01T00:01:00.000Z"
+}).encode()
+
+@contextmanager
+def standins_installed(broker: InMemoryBroker, printer_simulator: Optional[PrinterSimulator] = None) -> Iterator[None]:
+    """Routes RabbitMQ, the printer and shared state files to local stand-ins.
+
+    The printer is in-memory, or the given simulator over TCP for realistic drain rates.
+    The benchmark tenant is a row of the configured database, looked up as in production.
+    """
+    network_printer = InMemoryPrinter
+
+    if printer_simulator is not None:
+        network_class = printer.Network
+
+        def network_printer(host: str, *args, **kwargs) -> printer.Network:
+            return network_class(printer_simulator.host, port=printer_simulator.port)
+
+    with tempfile.TemporaryDirectory() as state_dir, \
+            benchmark_tenant_created(), \
+            override_settings(POC_PRINT_HUB_TENANT_AUTH_ENABLED=True), \
+            mock.patch("pika.BlockingConnection", broker.connect), \
+            mock.patch.object(printer, "Network", network_printer), \
+            mock.patch.object(republish_progress, "file_path", os.path.join(state_dir, "republish_progress.json")), \
+            mock.patch.object(printer_status_snapshot, "file_path", os.path.join(state_dir, "printer_status.json")), \
+            mock.patch.object(publish_spool, "directory", os.path.join(state_dir, "publish_spool")), \
+            mock.patch.object(raster_cache, "directory", os.path.join(state_dir, "raster_cache")):
+        RabbitPublisher._instance = None
+        credential_cache.clear()
+
+        try:
+            yield
+        finally:
+            publish_spool.close()
+            raster_cache.clear()
+            RabbitPublisher._instance = None
+            credential_cache.clear()
+
+@contextmanager
+def benchmark_tenant_created() -> Iterator[None]:
+    """Adds the benchmark tenant to the configured database, its table too if missing: point it at a scratch database"""
+    if TenantAuthConfig._meta.db_table not in db_connection.introspection.table_names():
+        with db_connection.schema_editor() as schema_editor:
+            schema_editor.create_model(TenantAuthConfig)
+
+    # real hashers. Bulk created: save() hashes the token only once the tracker sees it changed
+    TenantAuthConfig.objects.filter(tenant_id=BENCHMARK_TENANT_ID).delete()
+    TenantAuthConfig.objects.bulk_create([
+        TenantAuthConfig(
+            tenant_id=BENCHMARK_TENANT_ID,
+            role=TenantRole.ADMIN,
+            token=make_password(BENCHMARK_TENANT_TOKEN)
+        )
+    ])
+
+    try:
+        yield
+    finally:
+        TenantAuthConfig.objects.filter(tenant_id=BENCHMARK_TENANT_ID).delete()
+
+def build_benchmarks(broker: InMemoryBroker, republish_depth: int) -> List[Benchmark]:
+    print_service = PrintService()
+    auth_service = AuthService()
+    request_factory = RequestFactory()
+
+    message, _ = NotificationMessage.parse_request(json.loads(SAMPLE_REQUEST_BODY))
+    queue_body = message_codec.encode(message)
+    qr_code_message, _ = NotificationMessage.parse_request({
+        **json.loads(SAMPLE_REQUEST_BODY),
+        "body": "https://grafana.example.com/d/print-hub/overview?orgId=1&from=now-6h",
+        "bodyType": "QrCode"
+    })
+    qr_code_queue_body = message_codec.encode(qr_code_message)
+    queue_properties = print_service._build_message_properties()
+    drain_batch_size = settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_BATCH_SIZE
+
+    def publish() -> None:
+        request = request_factory.post(
+            "/api/queues/publish",
+            data=SAMPLE_REQUEST_BODY,
+            content_type="application/json",
+            headers={
+                settings.POC_PRINT_HUB_TENANT_ID_HEADER: BENCHMARK_TENANT_ID,
+                settings.POC_PRINT_HUB_TENANT_TOKEN_HEADER: BENCHMARK_TENANT_TOKEN
+            }
+        )
+        endpoints.publish(request).render()
+
+    def fill_print_queue() -> None:
+        broker.purge()
+        broker.fill(settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_NAME, [queue_body] * drain_batch_size, queue_properties)
+
+    def fill_dead_queue() -> None:
+        broker.purge()
+        broker.fill(settings.POC_PRINT_HUB_RABBIT_MQ_DEAD_QUEUE_NAME, [queue_body] * republish_depth, queue_properties)
+
+    def authorize() -> None:
+        auth_service.is_authorized(BENCHMARK_TENANT_ID, BENCHMARK_TENANT_TOKEN, [TenantRole.ADMIN, TenantRole.USER])
+
+    return [
+        Benchmark(
+            "parse_request",
+            lambda: NotificationMessage.parse_request(json.loads(SAMPLE_REQUEST_BODY)),
+            runs=20000
+        ),
+        Benchmark("publish", publish, runs=2000, setup=broker.purge),
+        # appended to the local spool, forwarded to the broker by the flusher thread meanwhile
+        Benchmark("publish_spooled", mock.patch.object(publish_spool, "enabled", True)(publish), runs=2000, setup=broker.purge),
+        Benchmark(
+            "render",
+            lambda: print_service._print_message(InMemoryPrinter(), queue_body, message_codec.content_type),
+            runs=5000
+        ),
+        Benchmark(
+            "render_qr_code",
+            lambda: print_service._print_message(InMemoryPrinter(), qr_code_queue_body, message_codec.content_type),
+            runs=5000
+        ),
+        # every run rasterizes the QR code: the cost of a raster cache miss
+        Benchmark(
+            "render_qr_code_uncached",
+            mock.patch.object(raster_cache, "disk_max_bytes", 0)(
+                lambda: print_service._print_message(InMemoryPrinter(), qr_code_queue_body, message_codec.content_type)
+            ),
+            runs=200,
+            setup=raster_cache.clear
+        ),
+        Benchmark(
+            "drain",
+            print_service.process_queue_messages,
+            runs=200,
+            ops_per_run=drain_batch_size,
+            setup=fill_print_queue
+        ),
+        Benchmark(
+            "drain_digest",
+            override_settings(POC_PRINT_HUB_DIGEST_ENABLED=True)(print_service.process_queue_messages),
+            runs=200,
+            ops_per_run=drain_batch_size,
+            setup=fill_print_queue
+        ),
+        Benchmark(
+            "republish",
+            print_service.republish_dead_queue_messages,
+            runs=3,
+            ops_per_run=republish_depth,
+            warmup_runs=1,
+            setup=fill_dead_queue
+        ),
+        Benchmark("auth_cached", authorize, runs=20000),
+        # every run hashes the token: the cost of a credential cache miss
+        Benchmark("auth_uncached", authorize, runs=5, warmup_runs=1, setup=credential_cache.clear)
+    ]
@@ -5,7 +5,8 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pocprintapi.settings')
 from django.conf import settings
 from celery import Celery
 from celery.exceptions import MaxRetriesExceededError
-from pocprintapi.services.printservice import PrintService
+from celery.signals import worker_init, worker_process_shutdown
+from pocprintapi.services.metrics import mark_process_dead
 
 app = Celery('pocprintapi')
 app.config_from_object('django.conf:settings', namespace='CELERY')
@@ -21,6 +22,17 @@ def setup_periodic_tasks(sender: Celery, **kwargs):
         name=f'Process print queue messages every {settings.POC_PRINT_HUB_QUEUE_SCHEDULE_SEC}s'
     )
 
+@worker_init.connect
+def on_worker_init(**kwargs):
+    # beat only schedules tasks and never imports the print stack; a worker imports it
+    # in its main process, before the pool forks, so that the children share it
+    import escpos.printer
+    import pocprintapi.services.printservice
+
+@worker_process_shutdown.connect
+def on_worker_process_shutdown(pid: int = None, **kwargs):
+    mark_process_dead(pid or os.getpid())
+
 @app.task(
     bind=True, 
     ignore_result=True, 
@@ -29,6 +41,8 @@ def setup_periodic_tasks(sender: Celery, **kwargs):
 )
 def process_queue_messages(self):
     try:
+        from pocprintapi.services.printservice import PrintService
+
         print("Processing print queue messages")
         PrintService().process_queue_messages()
     except Exception as ex:
@@ -36,4 +50,15 @@ def process_queue_messages(self):
             print(f"Retrying task: {self.name}")
             self.retry(exc=ex)
         except MaxRetriesExceededError:
-            print(f"Max task retries hit: {self.name}")
\ No newline at end of file
+            print(f"Max task retries hit: {self.name}")
+
+@app.task(
+    bind=True, 
+    ignore_result=True, 
+    time_limit=settings.POC_PRINT_HUB_REPUBLISH_TIME_LIMIT_SEC
+)
+def republish_dead_queue_messages(self, rate_limit_per_sec: float):
+    from pocprintapi.services.printservice import PrintService
+
+    print("Republishing dead letter queue messages")
+    PrintService().republish_dead_queue_messages(rate_limit_per_sec)
\ No newline at end of file
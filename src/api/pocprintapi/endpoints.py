@@ -8,12 +8,26 @@ from rest_framework.response import Response
 from rest_framework import status as response_status
 from pocprintapi.services.printservice import PrintService
 from pocprintapi.services.authservice import AuthService
+from pocprintapi.services.metrics import PUBLISH_SECONDS
 from pocprintapi.models import TenantRole
 
 @api_view(['POST'])
 def publish(request: HttpRequest):
     if _is_request_authorized(request, [TenantRole.ADMIN, TenantRole.USER]):
-        return PrintService().publish(request.body)
+        with PUBLISH_SECONDS.labels("publish").time():
+            return PrintService().publish(request.body, request.headers.get(settings.POC_PRINT_HUB_TENANT_ID_HEADER))
+    
+    return _response_unauthorized()
+
+@api_view(['POST'])
+def publish_batch(request: HttpRequest):
+    if _is_request_authorized(request, [TenantRole.ADMIN, TenantRole.USER]):
+        with PUBLISH_SECONDS.labels("publish_batch").time():
+            return PrintService().publish_batch(
+                request.body, 
+                request.content_type, 
+                request.headers.get(settings.POC_PRINT_HUB_TENANT_ID_HEADER)
+            )
     
     return _response_unauthorized()
 
@@ -29,21 +43,31 @@ def feed(request: HttpRequest):
     if _is_request_authorized(request, [TenantRole.ADMIN]):
         body_dict = json.loads(request.body)
         n_times = body_dict.get("nTimes", "5")
-        return PrintService().feed(n_times)
+        return PrintService().feed(n_times, body_dict.get("printer"))
     
     return _response_unauthorized()
 
 @api_view(['POST'])
 def cut(request: HttpRequest):
     if _is_request_authorized(request, [TenantRole.ADMIN]):
-        return PrintService().cut()
+        body_dict = json.loads(request.body or "{}")
+        return PrintService().cut(body_dict.get("printer"))
 
     return _response_unauthorized()
 
 @api_view(['POST'])
 def republish(request: HttpRequest):
     if _is_request_authorized(request, [TenantRole.ADMIN]):
-        return PrintService().republish_dead_queue_messages()
+        body_dict = json.loads(request.body or "{}")
+        rate_limit_per_sec = body_dict.get("ratePerSec", settings.POC_PRINT_HUB_REPUBLISH_RATE_LIMIT_PER_SEC)
+        return PrintService().start_republish_dead_queue_messages(rate_limit_per_sec)
+
+    return _response_unauthorized()
+
+@api_view(['GET'])
+def republish_status(request: HttpRequest):
+    if _is_request_authorized(request, [TenantRole.ADMIN]):
+        return PrintService().get_republish_status()
 
     return _response_unauthorized()
 
@@ -54,6 +78,13 @@ def queue_status(request: HttpRequest):
     
     return _response_unauthorized()
 
+@api_view(['GET'])
+def metrics(request: HttpRequest):
+    if not settings.POC_PRINT_HUB_METRICS_AUTH_ENABLED or _is_request_authorized(request, [TenantRole.ADMIN]):
+        return PrintService().metrics()
+    
+    return _response_unauthorized()
+
 @api_view(['POST'])
 def tenant_role(request: HttpRequest):
     if _is_request_authorized(request, [TenantRole.ADMIN, TenantRole.USER]):
@@ -0,0 +1,95 @@
+import json
+import timeit
+import uuid
+
+from datetime import datetime
+from django.core.management.base import BaseCommand
+from pocprintapi.models import NotificationBodyType, NotificationMessage
+
+# the two timestamp forms clients send: the queries example and the web UI (toISOString)
+SAMPLE_REQUEST_BODIES = {
+    "plain timestamp": {
+        "title": "test-title",
+        "body": "{ \"prop1\": \"value1\", \"prop2\": \"value2\" }",
+        "bodyType": "KeyValue",
+        "origin": "test-origin",
+        "timestamp": "2025-01-01 00:01:00"
+    },
+    "ISO timestamp": {
+        "title": "test-title",
+        "body": "{ \"prop1\": \"value1\", \"prop2\": \"value2\" }",
+        "bodyType": "KeyValue",
+        "origin": "test-origin",
+        "timestamp": "2025-01-01T00:01:00.000Z"
+    }
+}
+
+class Command(BaseCommand):
+    help = "Measures publish request parsing (bytes to validated message) against the previous parsing path"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--number", type=int, default=20000, help="Messages parsed per run")
+        parser.add_argument("--repeat", type=int, default=5, help="Runs, the fastest one is reported")
+
+    def handle(self, *args, **options):
+        number = options["number"]
+        repeat = options["repeat"]
+
+        for sample_name, sample in SAMPLE_REQUEST_BODIES.items():
+            request_body = json.dumps(sample).encode()
+
+            previous_sec = min(timeit.repeat(lambda: _parse_previous(request_body), number=number, repeat=repeat))
+            current_sec = min(timeit.repeat(lambda: _parse_current(request_body), number=number, repeat=repeat))
+
+            self.stdout.write(
+                f"{sample_name}: "\
+                f"previous {number / previous_sec:,.0f} msg/s, "\
+                f"current {number / current_sec:,.0f} msg/s, "\
+                f"speedup x{previous_sec / current_sec:.2f}"
+            )
+
+def _parse_current(request_body: bytes) -> NotificationMessage:
+    message, _ = NotificationMessage.parse_request(json.loads(request_body))
+    return message
+
+def _parse_previous(request_body: bytes) -> "_PreviousNotificationMessage":
+    # the parsing path before NotificationMessage.parse_request, kept as the reference
+    body_dict = {k.lower(): v for k, v in json.loads(request_body).items()}
+
+    message = _PreviousNotificationMessage(
+        body_dict.get("id"),
+        body_dict.get("title"),
+        body_dict.get("body"),
+        body_dict.get("bodytype"),
+        body_dict.get("origin"),
+        body_dict.get("timestamp")
+    )
+    message.id = uuid.uuid4()
+    message.validate()
+
+    return message
+
+class _PreviousNotificationMessage:
+    def __init__(self, id, title, body, body_type, origin, timestamp):
+        self.id = id
+        self.title = title
+        self.body = body
+        self.body_type = body_type
+        self.origin = origin
+
+        try:
+            self.timestamp = datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
+        except:
+            self.timestamp = datetime.fromisoformat(timestamp)
+
+    def validate(self):
+        errors = []
+
+        for value, name in [(self.title, "title"), (self.body, "body"), (self.body_type, "bodyType"), (self.origin, "origin")]:
+            if value is None or value.strip() == "":
+                errors.append(f"Required: '{name}'")
+
+        if self.body_type.upper() not in NotificationBodyType.string_values():
+            errors.append("Invalid 'bodyType': should be 'PlainText' or 'KeyValue'")
+
+        return errors
@@ -0,0 +1,21 @@
+import signal
+
+from django.core.management.base import BaseCommand
+from pocprintapi.services.printservice import PrintService
+
+class Command(BaseCommand):
+    help = "Consumes the print queue continuously, printing messages as they arrive (an alternative to Celery beat polling)"
+
+    def handle(self, *args, **options):
+        print_service = PrintService()
+
+        def stop(signum, frame):
+            print(f"Received signal {signum}, stopping print queue consumer")
+            print_service.stop_consuming()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        print("Consuming print queue messages")
+        print_service.consume_queue_messages()
+        print("Print queue consumer stopped")
@@ -0,0 +1,27 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from pocprintapi.services.printerpool import printer_pool
+from pocprintapi.services.printerstatus import PrinterStatusProber, printer_status_snapshot
+
+class Command(BaseCommand):
+    help = "Probes the pool printers at a fixed interval and shares their status with API workers and the print queue consumer"
+
+    def handle(self, *args, **options):
+        prober = PrinterStatusProber(
+            printer_status_snapshot, 
+            [(pool_printer.name, pool_printer.host) for pool_printer in printer_pool.printers], 
+            settings.POC_PRINT_HUB_PRINTER_STATUS_PROBE_INTERVAL_SEC
+        )
+
+        def stop(signum, frame):
+            print(f"Received signal {signum}, stopping printer status prober")
+            prober.stop()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        print(f"Probing printer status every {prober.interval_sec}s into {printer_status_snapshot.file_path}")
+        prober.run()
+        print("Printer status prober stopped")
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from pocprintapi.services.printservice import PrintService
+
+class Command(BaseCommand):
+    help = "Republishes all messages from the error to the print queue in the foreground"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=settings.POC_PRINT_HUB_REPUBLISH_RATE_LIMIT_PER_SEC,
+            help="Max messages republished per second, 0 means unlimited"
+        )
+
+    def handle(self, *args, **options):
+        PrintService().republish_dead_queue_messages(options["rate"])
@@ -0,0 +1,112 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from pocprintapi.benchmarks.printersimulator import PrinterSimulator
+from pocprintapi.benchmarks.runner import build_report, find_regressions, run_benchmark
+from pocprintapi.benchmarks.standins import DatabaseBenchmarkBroker, InMemoryBroker
+from pocprintapi.benchmarks.startup import STARTUP_ENTRY_POINTS, run_startup_benchmark
+from pocprintapi.benchmarks.suite import build_benchmarks, standins_installed
+from pocprintapi.services.jsonfile import read_json_file, write_json_file_atomically
+
+class Command(BaseCommand):
+    help = "Benchmarks the publish, render, drain, republish and auth hot paths against local stand-ins, and process startup"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--only", nargs="+", help="Benchmark names to run, all by default")
+        parser.add_argument("--output", help="Saves the results as JSON")
+        parser.add_argument("--baseline", help="Baseline results JSON to compare against, fails on regressions")
+        parser.add_argument(
+            "--max-regression",
+            type=float,
+            default=0.2,
+            help="Tolerated throughput drop / p99 latency increase vs the baseline, 0.2 = 20%%"
+        )
+        parser.add_argument(
+            "--printer-simulator",
+            action="store_true",
+            help="Prints over TCP to a local printer simulator instead of an in-memory stand-in"
+        )
+        parser.add_argument("--printer-bytes-per-sec", type=float, default=0, help="Simulated print throughput, 0 means unlimited")
+        parser.add_argument("--republish-depth", type=int, default=50000, help="Error queue depth for the republish benchmark")
+        parser.add_argument("--startup-runs", type=int, default=5, help="Process starts per startup benchmark")
+        parser.add_argument(
+            "--queue-backend",
+            choices=["rabbitmq", "database"],
+            default="rabbitmq",
+            help="Queue backend to run against: an in-memory RabbitMQ stand-in, or the embedded database queue on the configured "\
+                "database, whose queue table is purged"
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+
+        if options["baseline"] is not None:
+            baseline = read_json_file(options["baseline"])
+
+            if baseline is None:
+                raise CommandError(f"Baseline not found: {options['baseline']}")
+
+        broker = InMemoryBroker()
+        printer_simulator = None
+
+        if options["queue_backend"] == "database":
+            broker = DatabaseBenchmarkBroker(
+                settings.POC_PRINT_HUB_DATABASE_QUEUE_POLL_INTERVAL_SEC,
+                settings.POC_PRINT_HUB_DATABASE_QUEUE_LEASE_SEC
+            )
+            broker.create_table()
+        results = []
+
+        if options["printer_simulator"]:
+            printer_simulator = PrinterSimulator(bytes_per_sec=options["printer_bytes_per_sec"]).start()
+
+        with standins_installed(broker, printer_simulator), \
+                override_settings(POC_PRINT_HUB_QUEUE_BACKEND=options["queue_backend"]):
+            for benchmark in build_benchmarks(broker, options["republish_depth"]):
+                if options["only"] is not None and benchmark.name not in options["only"]:
+                    continue
+
+                result = run_benchmark(benchmark)
+                results.append(result)
+
+                self.stdout.write(
+                    f"{result['name']:<24}"\
+                    f"{result['opsPerSec']:>14,.1f} ops/s"\
+                    f"{result['p50Ms']:>12.3f} ms p50"\
+                    f"{result['p99Ms']:>12.3f} ms p99"
+                )
+
+        # fresh processes, no stand-ins: the real entry points as deployed
+        for entry_point_name in STARTUP_ENTRY_POINTS:
+            if options["only"] is not None and f"startup_{entry_point_name}" not in options["only"]:
+                continue
+
+            result = run_startup_benchmark(entry_point_name, options["startup_runs"])
+            results.append(result)
+
+            self.stdout.write(
+                f"{result['name']:<24}"\
+                f"{result['opsPerSec']:>14,.1f} ops/s"\
+                f"{result['p50Ms']:>12.3f} ms p50"\
+                f"{result['p99Ms']:>12.3f} ms p99"\
+                f"{result['rssMb']:>12.1f} MB RSS"
+            )
+
+        if printer_simulator is not None:
+            printer_simulator.stop()
+            self.stdout.write(f"Printer simulator: {printer_simulator.stats()}")
+
+        report = build_report(results)
+
+        if options["output"] is not None:
+            write_json_file_atomically(options["output"], report)
+
+        if baseline is None:
+            return
+
+        regressions = find_regressions(report, baseline, options["max_regression"])
+
+        if len(regressions) > 0:
+            raise CommandError("Regressions against the baseline:\n" + "\n".join(regressions))
+
+        self.stdout.write("No regressions against the baseline")
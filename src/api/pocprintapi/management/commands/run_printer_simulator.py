@@ -0,0 +1,45 @@
+import signal
+
+from django.core.management.base import BaseCommand
+from pocprintapi.benchmarks.printersimulator import PrinterSimulator
+
+class Command(BaseCommand):
+    help = "Runs a local ESC/POS network printer simulator, point POC_PRINT_HUB_PRINTER_HOST at it"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=9100)
+        parser.add_argument("--bytes-per-sec", type=float, default=0, help="Print throughput, 0 means unlimited")
+        parser.add_argument("--connect-latency-ms", type=float, default=0, help="Delay before a new connection is served")
+        parser.add_argument("--disconnect-probability", type=float, default=0, help="Chance to drop the connection per received chunk")
+        parser.add_argument("--paper-status", type=int, choices=[0, 1, 2], default=2, help="2: Plenty, 1: Near End, 0: Empty")
+        parser.add_argument("--paper-capacity-bytes", type=int, default=0, help="Paper roll size: near end at 90%%, empty at 100%%, 0 means endless")
+        parser.add_argument("--offline", action="store_true", help="Report the printer as offline")
+        parser.add_argument("--max-connections", type=int, default=1, help="Connections served at once, others wait")
+        parser.add_argument("--log-file", help="Appends printed lines and cuts to this file")
+        parser.add_argument("--seed", type=int, help="Random seed for reproducible disconnects")
+
+    def handle(self, *args, **options):
+        simulator = PrinterSimulator(
+            host=options["host"],
+            port=options["port"],
+            bytes_per_sec=options["bytes_per_sec"],
+            connect_latency_sec=options["connect_latency_ms"] / 1000,
+            disconnect_probability=options["disconnect_probability"],
+            paper_status=options["paper_status"],
+            paper_capacity_bytes=options["paper_capacity_bytes"],
+            is_online=not options["offline"],
+            max_connections=options["max_connections"],
+            log_file=options["log_file"],
+            seed=options["seed"]
+        )
+
+        def stop(signum, frame):
+            simulator.stop()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        simulator.serve_forever()
+
+        print(f"Printer simulator stopped, stats: {simulator.stats()}")
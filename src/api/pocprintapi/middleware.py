@@ -0,0 +1,97 @@
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpRequest, HttpResponse
+from pocprintapi.services.profiling import RequestSpans, activate_spans, deactivate_spans, dump_profile, start_profiler
+
+class RequestProfilingMiddleware:
+    """Records timing spans of each request phase (auth stages, parsing, AMQP connect/publish, printer I/O).
+
+    Adds a `Server-Timing` header, logs requests slower than the threshold
+    along with their span breakdown and samples requests into cProfile dumps.
+    Removed from the middleware chain altogether when profiling is disabled,
+    spans are then no-ops.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.POC_PRINT_HUB_PROFILING_ENABLED:
+            raise MiddlewareNotUsed()
+
+        self.get_response = get_response
+        self.slow_request_sec: float = settings.POC_PRINT_HUB_PROFILING_SLOW_REQUEST_MS / 1000
+        self.sample_rate: float = settings.POC_PRINT_HUB_PROFILING_SAMPLE_RATE
+        self.dump_dir: str = settings.POC_PRINT_HUB_PROFILING_DUMP_DIR
+
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        spans = RequestSpans()
+        token = activate_spans(spans)
+        profiler = self._start_sampled_profiler()
+
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            self._stop_profiler(profiler)
+            raise
+        finally:
+            deactivate_spans(token)
+
+        return self._complete(request, response, spans, profiler)
+
+    async def __acall__(self, request: HttpRequest):
+        spans = RequestSpans()
+        token = activate_spans(spans)
+        # the event loop thread serves other requests meanwhile: their calls end up in the dump as well
+        profiler = self._start_sampled_profiler()
+
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            self._stop_profiler(profiler)
+            raise
+        finally:
+            deactivate_spans(token)
+
+        return self._complete(request, response, spans, profiler)
+
+    def _start_sampled_profiler(self):
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+
+        return start_profiler()
+
+    def _stop_profiler(self, profiler) -> None:
+        # left enabled, it would keep profiling the thread and no later request could be sampled on it
+        if profiler is not None:
+            profiler.disable()
+
+    def _complete(self, request: HttpRequest, response: HttpResponse, spans: RequestSpans, profiler) -> HttpResponse:
+        total_sec = spans.elapsed_sec()
+
+        if profiler is not None:
+            profiler.disable()
+
+            try:
+                file_path = dump_profile(profiler, self.dump_dir, request.method, request.path, total_sec)
+                print(f"Request profile saved: {file_path}")
+            except OSError as ex:
+                print(f"Failed to save request profile, error: {ex}")
+
+        response["Server-Timing"] = spans.server_timing(total_sec)
+
+        if total_sec >= self.slow_request_sec:
+            print(
+                f"Slow request: {request.method} {request.path} {response.status_code}, "\
+                f"{total_sec * 1000:.1f} ms ({spans.breakdown() or 'no spans'})"
+            )
+
+        return response
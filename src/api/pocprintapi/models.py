@@ -1,33 +1,61 @@
+import base64
+import binascii
+import io
+import json
 import uuid
-import os
-import django
-
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pocprintapi.settings')
-django.setup()
 
 from datetime import datetime
-from typing import Union, List
+from typing import Optional, Union, List, Tuple
 from enum import Enum
+from django.conf import settings
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.contrib import admin
 from django.contrib.auth.hashers import make_password, check_password
 from model_utils.tracker import FieldTracker
+from pocprintapi.services.authcache import credential_cache
 
 class NotificationMessage:
-    def __init__(self, id: uuid.UUID, title: str, body: str, body_type: str, origin: str, timestamp: Union[str, datetime]):
+    """Print job notification. Slotted, since one is built per published and per printed message"""
+    __slots__ = (
+        "id", "title", "body", "body_type", "origin", "timestamp", "body_items", "priority", "printer", 
+        "copies", "first_seen_at", "last_seen_at"
+    )
+
+    def __init__(
+        self, 
+        id: uuid.UUID, 
+        title: str, 
+        body: str, 
+        body_type: str, 
+        origin: str, 
+        timestamp: Union[str, datetime], 
+        body_items: Optional[List[Tuple[str, str]]] = None,
+        priority: Optional["NotificationPriority"] = None,
+        printer: Optional[str] = None,
+        copies: int = 1,
+        first_seen_at: Optional[datetime] = None,
+        last_seen_at: Optional[datetime] = None
+    ):
         self.id: uuid.UUID = id
         self.title: str = title
         self.body: str = body
         self.body_type: str = body_type
         self.origin: str = origin
+        self.body_items: Optional[List[Tuple[str, str]]] = body_items # pre-parsed key/value body, if decoded from binary
+        self.priority: NotificationPriority = priority or NotificationPriority.NORMAL # print queue lane
+        self.printer: Optional[str] = printer # explicit pool printer target, publish time routing only
+        # identical messages coalesced into this one by the dedup stage, and when the first and last of them arrived
+        self.copies: int = copies
+        self.first_seen_at: Optional[datetime] = first_seen_at
+        self.last_seen_at: Optional[datetime] = last_seen_at
 
         if timestamp is None or isinstance(timestamp, datetime):
             self.timestamp: datetime = timestamp
         else:
-            try:
-                self.timestamp: datetime = datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
-            except:
-                self.timestamp: datetime = datetime.fromisoformat(timestamp)
+            # also covers the "%Y-%m-%d %H:%M:%S" form
+            self.timestamp: datetime = datetime.fromisoformat(timestamp)
 
     def __str__(self):
         return f"origin: {self.origin}, title: {self.title}"
@@ -40,35 +68,138 @@ class NotificationMessage:
             json_dict.get("body"),
             json_dict.get("bodytype"),
             json_dict.get("origin"),
-            json_dict.get("timestamp")
+            json_dict.get("timestamp"),
+            priority=NotificationPriority.from_name(json_dict.get("priority")),
+            copies=json_dict.get("copies", 1),
+            first_seen_at=_parse_optional_datetime(json_dict.get("firstSeenAt")),
+            last_seen_at=_parse_optional_datetime(json_dict.get("lastSeenAt"))
         )
+
+    @staticmethod
+    def has_image_body(request_dict) -> bool:
+        """Whether a publish request object is of the Image body type, whose validation decodes the image"""
+        if not isinstance(request_dict, dict):
+            return False
+
+        body_type = None
+
+        for key, value in request_dict.items():
+            if isinstance(key, str) and _REQUEST_FIELDS.get(key.lower()) == "body_type":
+                body_type = value
+
+        return isinstance(body_type, str) and body_type.upper() == NotificationBodyType.IMAGE.name
+
+    @staticmethod
+    def parse_request(request_dict) -> Tuple[Optional["NotificationMessage"], List[str]]:
+        """Builds a new message from a publish request object in one pass.
+
+        Keys are case-insensitive and unknown keys are ignored. Returns the
+        message with a new id, or None and the validation errors.
+        """
+        if not isinstance(request_dict, dict):
+            return None, ["Invalid message: should be a JSON object"]
+
+        fields = {}
+
+        for key, value in request_dict.items():
+            field = _REQUEST_FIELDS.get(key)
+
+            if field is None and isinstance(key, str):
+                field = _REQUEST_FIELDS.get(key.lower())
+
+            if field is not None:
+                fields[field] = value
+
+        title = fields.get("title")
+        body = fields.get("body")
+        body_type = fields.get("body_type")
+        origin = fields.get("origin")
+        timestamp = fields.get("timestamp")
+        priority = fields.get("priority")
+        printer = fields.get("printer")
+
+        errors = []
+
+        if _is_none_or_empty(title):
+            errors.append("Required: 'title'")
+
+        if _is_none_or_empty(body):
+            errors.append("Required: 'body'")
+
+        if _is_none_or_empty(body_type):
+            errors.append("Required: 'bodyType'")
+        elif body_type.upper() not in _BODY_TYPE_NAMES:
+            errors.append(_INVALID_BODY_TYPE_ERROR)
+        elif not _is_none_or_empty(body) and body_type.upper() in RASTER_BODY_TYPE_NAMES:
+            body_error = _validate_raster_body(body_type, body)
+
+            if body_error is not None:
+                errors.append(body_error)
+
+        if _is_none_or_empty(origin):
+            errors.append("Required: 'origin'")
+
+        if timestamp is None:
+            errors.append("Required: 'timestamp'")
+        elif not isinstance(timestamp, datetime):
+            try:
+                timestamp = datetime.fromisoformat(timestamp)
+            except (TypeError, ValueError):
+                errors.append("Invalid 'timestamp': should be an ISO 8601 date and time")
+
+        if priority is not None:
+            priority = NotificationPriority.from_name(priority)
+
+            if priority is None:
+                errors.append("Invalid 'priority': should be 'High', 'Normal' or 'Low'")
+
+        if printer is not None and _is_none_or_empty(printer):
+            errors.append("Invalid 'printer': should be a printer name")
+
+        if len(errors) > 0:
+            return None, errors
+
+        return NotificationMessage(uuid.uuid4(), title, body, body_type, origin, timestamp, priority=priority, printer=printer), errors
     
     def to_dict(self):
-        return {
+        message_dict = {
             "id": str(self.id),
             "title": self.title,
-            "body": self.body,
+            "body": self.body if self.body_items is None else json.dumps(dict(self.body_items)),
             "bodytype": self.body_type,
             "origin": self.origin,
-            "timestamp": str(self.timestamp)
+            "timestamp": str(self.timestamp),
+            "priority": self.priority.name
         }
+
+        if self.copies > 1:
+            message_dict["copies"] = self.copies
+            message_dict["firstSeenAt"] = self.first_seen_at.isoformat()
+            message_dict["lastSeenAt"] = self.last_seen_at.isoformat()
+
+        return message_dict
     
     def validate(self) -> List[str]:
         errors = []
 
-        if self._is_none_or_empty(self.title):
+        if _is_none_or_empty(self.title):
             errors.append("Required: 'title'")
 
-        if self._is_none_or_empty(self.body):
+        if _is_none_or_empty(self.body):
             errors.append("Required: 'body'")
 
-        if self._is_none_or_empty(self.body_type):
+        if _is_none_or_empty(self.body_type):
             errors.append("Required: 'bodyType'")
 
-        if not self._is_none_or_empty(self.body_type) and self.body_type.upper() not in NotificationBodyType.string_values():
-            errors.append("Invalid 'bodyType': should be 'PlainText' or 'KeyValue'")
+        if not _is_none_or_empty(self.body_type) and self.body_type.upper() not in _BODY_TYPE_NAMES:
+            errors.append(_INVALID_BODY_TYPE_ERROR)
+        elif not _is_none_or_empty(self.body) and self.body_type.upper() in RASTER_BODY_TYPE_NAMES:
+            body_error = _validate_raster_body(self.body_type, self.body)
 
-        if self._is_none_or_empty(self.origin):
+            if body_error is not None:
+                errors.append(body_error)
+
+        if _is_none_or_empty(self.origin):
             errors.append("Required: 'origin'")
 
         if self.timestamp is None:
@@ -76,19 +207,96 @@ class NotificationMessage:
 
         return errors
 
-    def _is_none_or_empty(self, string: str) -> bool:
-        return string is None or string.strip() == ""
-
 class NotificationBodyType(Enum):
     PLAINTEXT = 1
     KEYVALUE = 2
+    IMAGE = 3 # base64-encoded PNG, JPEG, ...
+    QRCODE = 4 # QR code content, e.g. a dashboard link
+    BARCODE = 5 # Code128 barcode content
     
     @staticmethod
     def string_values():
         return [
             NotificationBodyType.PLAINTEXT.name.upper(),
-            NotificationBodyType.KEYVALUE.name.upper()
+            NotificationBodyType.KEYVALUE.name.upper(),
+            NotificationBodyType.IMAGE.name.upper(),
+            NotificationBodyType.QRCODE.name.upper(),
+            NotificationBodyType.BARCODE.name.upper()
         ]
+
+class NotificationPriority(Enum):
+    LOW = 0
+    NORMAL = 1
+    HIGH = 2
+
+    @staticmethod
+    def from_name(name: Optional[str]) -> Optional["NotificationPriority"]:
+        """Case-insensitive lookup, None for a missing or unknown name"""
+        if not isinstance(name, str):
+            return None
+
+        return NotificationPriority.__members__.get(name.upper())
+
+# publish request key -> NotificationMessage field, matched as sent first, then lower-cased
+_REQUEST_FIELDS = {
+    "title": "title",
+    "body": "body",
+    "bodytype": "body_type",
+    "bodyType": "body_type",
+    "origin": "origin",
+    "timestamp": "timestamp",
+    "priority": "priority",
+    "printer": "printer"
+}
+
+_BODY_TYPE_NAMES = frozenset(NotificationBodyType.string_values())
+_INVALID_BODY_TYPE_ERROR = "Invalid 'bodyType': should be 'PlainText', 'KeyValue', 'Image', 'QrCode' or 'Barcode'"
+
+# body types printed as a raster image rather than as text
+RASTER_BODY_TYPE_NAMES = frozenset([
+    NotificationBodyType.IMAGE.name,
+    NotificationBodyType.QRCODE.name,
+    NotificationBodyType.BARCODE.name
+])
+QR_CODE_MAX_BYTES = 2331 # version 40 at error correction level M
+
+def decode_image_body(body: str) -> bytes:
+    """Image bytes of an IMAGE body: base64, optionally as a data URL. Raises ValueError if it is not valid base64"""
+    _, separator, data = body.partition(";base64,")
+
+    try:
+        return base64.b64decode(data if separator != "" else body, validate=True)
+    except binascii.Error as ex:
+        raise ValueError(f"{ex}")
+
+def _validate_raster_body(body_type: str, body: str) -> Optional[str]:
+    match body_type.upper():
+        case NotificationBodyType.IMAGE.name:
+            # Pillow is only needed by messages with images
+            from PIL import Image, UnidentifiedImageError
+
+            try:
+                # reads the header only
+                Image.open(io.BytesIO(decode_image_body(body)))
+            except (ValueError, UnidentifiedImageError):
+                return "Invalid 'body': should be a base64-encoded image (PNG, JPEG, ...)"
+        case NotificationBodyType.QRCODE.name:
+            if len(body.encode()) > QR_CODE_MAX_BYTES:
+                return f"Invalid 'body': too long for a QR code, should be at most {QR_CODE_MAX_BYTES} bytes"
+        case NotificationBodyType.BARCODE.name:
+            # Code128: 11 modules per character plus 35 for start, check and stop symbols, at least 1 dot per module
+            max_length = (settings.POC_PRINT_HUB_PRINTER_WIDTH_DOTS - 35) // 11
+
+            if not body.isascii() or not body.isprintable() or len(body) > max_length:
+                return f"Invalid 'body': should be at most {max_length} printable ASCII characters for a barcode"
+
+    return None
+
+def _parse_optional_datetime(value: Optional[str]) -> Optional[datetime]:
+    return None if value is None else datetime.fromisoformat(value)
+
+def _is_none_or_empty(string: str) -> bool:
+    return not isinstance(string, str) or string.strip() == ""
     
 class TenantRole(models.TextChoices):
     ADMIN = "ADMIN", "Admin"
@@ -123,5 +331,37 @@ class TenantAuthConfig(models.Model):
 
     def __str__(self):
         return f"{self.role} - {self.tenant_id}"
-    
-admin.site.register(TenantAuthConfig)
\ No newline at end of file
+
+@receiver([post_save, post_delete], sender=TenantAuthConfig)
+def invalidate_tenant_credentials(sender, instance: TenantAuthConfig, **kwargs):
+    """Drops this process's cached credentials of a saved or deleted tenant, admin bulk deletes included.
+    Other processes look the tenant up again once their cached credentials expire"""
+    credential_cache.invalidate(instance.tenant_id)
+
+    # renamed
+    previous_tenant_id = instance.tracker.previous('tenant_id')
+
+    if previous_tenant_id is not None and previous_tenant_id != instance.tenant_id:
+        credential_cache.invalidate(previous_tenant_id)
+
+class QueueMessage(models.Model):
+    """Message of the embedded queue backend, see services/databasebroker.py"""
+    id = models.BigAutoField(primary_key=True) # delivery order within a queue
+    queue_name = models.TextField()
+    body = models.BinaryField()
+    content_type = models.TextField(null=True)
+    headers = models.JSONField(null=True)
+    priority = models.IntegerField(null=True)
+    claimed_by = models.UUIDField(null=True) # channel the message is delivered to, unacked
+    claimed_until = models.FloatField(null=True) # epoch sec, the claim lease of a dead channel expires
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["queue_name", "id"]),
+            models.Index(fields=["claimed_by"])
+        ]
+
+    def __str__(self):
+        return f"{self.queue_name} - {self.id}"
+
+admin.site.register(TenantAuthConfig)
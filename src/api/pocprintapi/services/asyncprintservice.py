@@ -0,0 +1,163 @@
+import asyncio
+import json
+
+from typing import Optional
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from rest_framework import status
+from pocprintapi.models import NotificationMessage
+from pocprintapi.services.asyncrabbitpublisher import AsyncRabbitPublisher
+from pocprintapi.services.messagecodec import message_codec
+from pocprintapi.services.messagededuplicator import message_deduplicator
+from pocprintapi.services.metrics import PRINTER_PROBE_SECONDS, record_queue_depths
+from pocprintapi.services.printerpool import PoolPrinter, printer_pool
+from pocprintapi.services.printerstatus import aprobe_printer_status, printer_status_snapshot
+from pocprintapi.services.printservice import PrintService
+from pocprintapi.services.prioritylanes import priority_lanes
+from pocprintapi.services.publishspool import publish_spool
+from pocprintapi.services.profiling import span
+from pocprintapi.services.queuestatuscache import queue_status_cache
+from pocprintapi.services.rabbitpublisher import RabbitPublisher
+from pocprintapi.services.tenantscheduler import tenant_scheduler
+
+class AsyncPrintService(PrintService):
+    """Native async versions of the publish, printer status and queue status paths, served under ASGI"""
+
+    async def apublish(self, request_body: bytes, tenant_id: Optional[str] = None) -> JsonResponse:
+        """Publishes notification messages to RabbitMQ"""
+        with span("parse"):
+            request_dict = json.loads(request_body)
+
+            # decoding an image takes milliseconds, it would hold up every other request on the event loop meanwhile
+            if NotificationMessage.has_image_body(request_dict):
+                message, errors = await asyncio.to_thread(NotificationMessage.parse_request, request_dict)
+            else:
+                message, errors = NotificationMessage.parse_request(request_dict)
+
+        if message is not None:
+            errors = self._validate_printer_target(message)
+
+        if len(errors) > 0:
+            return JsonResponse(
+                {
+                    "message": "Invalid request",
+                    "errors": ", ".join(errors)
+                }, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # the sync routing finds the tenants cached, without querying the database on the event loop
+        await tenant_scheduler.arefresh()
+
+        queue_name, printer_name = self._route_message(message, tenant_id)
+        response_body = {
+            "messageId": message.id,
+            "lane": priority_lanes.lane_name(message.priority),
+            "printer": printer_name
+        }
+
+        if message_deduplicator.is_applied("publish"):
+            self._start_coalesced_message_flusher()
+            duplicate_of = self._suppress_duplicate(message, queue_name, "publish")
+
+            if duplicate_of is not None:
+                response_body["duplicateOf"] = duplicate_of
+                return JsonResponse(response_body, status=status.HTTP_200_OK)
+
+        try:
+            await self._apublish_message(message, queue_name, tenant_id)
+        except Exception as ex:
+            if message_deduplicator.is_applied("publish"):
+                message_deduplicator.discard(message)
+
+            return JsonResponse(
+                {
+                    "message": "Failed to publish message to RabbitMQ",
+                    "errors": f"{ex}"
+                }, 
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        
+        return JsonResponse(response_body, status=status.HTTP_200_OK)
+
+    async def _apublish_message(self, message: NotificationMessage, queue_name: str, tenant_id: Optional[str] = None) -> None:
+        with span("encode"):
+            body = message_codec.encode(message)
+
+        # appending to the spool only waits on the disk with a zero fsync interval
+        if publish_spool.enabled and self._spool_messages([
+            (queue_name, body, self._build_message_properties(message.priority, tenant_id))
+        ]):
+            return
+
+        # the database backend has no async client: the sync publish runs in a worker thread
+        if settings.POC_PRINT_HUB_QUEUE_BACKEND == "database":
+            await sync_to_async(self._publish_message)(
+                message, 
+                queue_name, 
+                settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_DURABLE, 
+                tenant_id
+            )
+            return
+
+        await AsyncRabbitPublisher.instance().publish(
+            queue_name,
+            settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_DURABLE,
+            body,
+            message_codec.content_type,
+            message.priority.value,
+            self._build_message_headers(tenant_id)
+        )
+
+    async def astatus(self) -> JsonResponse:
+        """Fetches the status of every pool printer: name, online, paper status. Served from the shared snapshot when it is fresh"""
+        printer_statuses = await asyncio.gather(
+            *(self._aget_printer_status(pool_printer) for pool_printer in printer_pool.printers)
+        )
+
+        return JsonResponse(
+            self._build_printer_pool_status_body(list(printer_statuses)), 
+            status=status.HTTP_200_OK
+        )
+
+    async def _aget_printer_status(self, pool_printer: PoolPrinter) -> dict:
+        snapshot = printer_status_snapshot.read(pool_printer.name)
+
+        if snapshot is not None:
+            return self._build_printer_status_snapshot_body(pool_printer, snapshot)
+
+        try:
+            with PRINTER_PROBE_SECONDS.labels("status").time(), span("printer_probe"):
+                is_online, paper_status = await aprobe_printer_status(pool_printer.host)
+        except Exception as ex:
+            return self._build_printer_status_body(pool_printer, False, None)
+
+        return self._build_printer_status_body(pool_printer, is_online, paper_status)
+
+    async def aget_queue_status(self) -> JsonResponse:
+        """Fetches queue status: is online, message count. Cached for a short TTL"""
+        await tenant_scheduler.arefresh()
+
+        if settings.POC_PRINT_HUB_QUEUE_BACKEND == "database":
+            return await sync_to_async(self._build_queue_status_response)()
+
+        publisher = AsyncRabbitPublisher.instance()
+        queue_statuses = await queue_status_cache.aget(
+            lambda: publisher.get_message_counts(self._get_status_queue_names())
+        )
+        record_queue_depths(queue_statuses)
+
+        return JsonResponse(
+            self._build_queue_status_body(queue_statuses, publisher.stats()), 
+            status=status.HTTP_200_OK
+        )
+
+    def _build_queue_status_response(self) -> JsonResponse:
+        queue_statuses = queue_status_cache.get(self._get_queue_message_counts)
+        record_queue_depths(queue_statuses)
+
+        return JsonResponse(
+            self._build_queue_status_body(queue_statuses, RabbitPublisher.instance().stats()), 
+            status=status.HTTP_200_OK
+        )
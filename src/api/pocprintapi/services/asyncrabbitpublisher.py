@@ -0,0 +1,144 @@
+import asyncio
+import os
+import aio_pika
+
+from typing import Dict, List, Optional, Set, Tuple
+from django.conf import settings
+from pocprintapi.services.metrics import AMQP_CONNECT_SECONDS, AMQP_PUBLISH_SECONDS
+from pocprintapi.services.profiling import span
+
+class AsyncRabbitPublisher:
+    """Non-blocking RabbitMQ publisher, one per event loop (ASGI worker process).
+
+    Uses a single robust connection (reconnects on its own) and one
+    confirm-mode channel. Concurrent publishes share the channel, so their
+    publisher confirms are pipelined instead of awaited one by one.
+    """
+    _instance: Optional["AsyncRabbitPublisher"] = None
+    _instance_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @classmethod
+    def instance(cls) -> "AsyncRabbitPublisher":
+        """Returns the publisher bound to the running event loop"""
+        loop = asyncio.get_running_loop()
+
+        if cls._instance is None or cls._instance_loop is not loop:
+            cls._instance = AsyncRabbitPublisher()
+            cls._instance_loop = loop
+
+        return cls._instance
+
+    def __init__(self):
+        self.connects: int = 0
+
+        self._connect_lock = asyncio.Lock()
+        self._connection: Optional[aio_pika.abc.AbstractRobustConnection] = None
+        self._channel: Optional[aio_pika.abc.AbstractRobustChannel] = None
+        self._declared_queues: Set[str] = set()
+
+    async def publish(
+        self,
+        queue_name: str,
+        queue_durable: bool,
+        body: bytes,
+        content_type: str,
+        priority: Optional[int] = None,
+        headers: Optional[dict] = None
+    ) -> None:
+        """Publishes a message and waits for the broker confirm"""
+        channel = await self._get_channel()
+        await self._declare_queue(channel, queue_name, queue_durable)
+
+        for attempt in range(2):
+            try:
+                with AMQP_PUBLISH_SECONDS.labels("async_confirm").time(), span("amqp_publish"):
+                    await channel.default_exchange.publish(
+                        aio_pika.Message(
+                            body,
+                            content_type=content_type,
+                            headers=headers,
+                            priority=priority,
+                            delivery_mode=aio_pika.DeliveryMode.PERSISTENT
+                        ),
+                        routing_key=queue_name,
+                        mandatory=True
+                    )
+
+                return
+            except aio_pika.exceptions.PublishError:
+                if attempt > 0:
+                    raise
+
+                # the queue was deleted since this publisher declared it, e.g. from the management UI
+                print(f"RabbitMQ queue {queue_name} not found, declaring it again")
+                self._declared_queues.discard(queue_name)
+                await self._declare_queue(channel, queue_name, queue_durable)
+
+    async def get_message_counts(self, queue_names: List[str]) -> Dict[str, Tuple[bool, int]]: # queue name -> is success, count
+        connection = await self._get_connection()
+        queue_statuses = {}
+
+        for queue_name in queue_names:
+            try:
+                # a passive declare of a missing queue closes the channel, so it never touches the publishing one
+                async with connection.channel() as channel:
+                    queue = await channel.declare_queue(queue_name, passive=True)
+
+                queue_statuses[queue_name] = ( True, queue.declaration_result.message_count )
+            except Exception as ex:
+                print(f"Failed to fetch {queue_name} queue status, error: {ex}")
+                queue_statuses[queue_name] = ( False, 0 )
+
+        return queue_statuses
+
+    def stats(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "connects": self.connects,
+            "isConnected": self._connection is not None and not self._connection.is_closed
+        }
+
+    async def close(self) -> None:
+        if self._connection is not None:
+            await self._connection.close()
+
+        self._connection = None
+        self._channel = None
+        self._declared_queues.clear()
+
+    async def _get_channel(self) -> aio_pika.abc.AbstractRobustChannel:
+        if self._channel is not None and not self._channel.is_closed:
+            return self._channel
+
+        connection = await self._get_connection()
+
+        async with self._connect_lock:
+            if self._channel is None or self._channel.is_closed:
+                # a returned (unroutable) message raises instead of passing for confirmed
+                self._channel = await connection.channel(publisher_confirms=True, on_return_raises=True)
+                self._declared_queues.clear()
+
+            return self._channel
+
+    async def _get_connection(self) -> aio_pika.abc.AbstractRobustConnection:
+        if self._connection is not None:
+            return self._connection
+
+        async with self._connect_lock:
+            if self._connection is None:
+                with AMQP_CONNECT_SECONDS.labels("async").time(), span("amqp_connect"):
+                    self._connection = await aio_pika.connect_robust(
+                        host=settings.POC_PRINT_HUB_RABBIT_MQ_HOST,
+                        login=settings.POC_PRINT_HUB_RABBIT_MQ_USERNAME,
+                        password=settings.POC_PRINT_HUB_RABBIT_MQ_PASSWORD
+                    )
+                self.connects += 1
+
+            return self._connection
+
+    async def _declare_queue(self, channel: aio_pika.abc.AbstractRobustChannel, queue_name: str, queue_durable: bool) -> None:
+        if queue_name in self._declared_queues:
+            return
+
+        await channel.declare_queue(queue_name, durable=queue_durable)
+        self._declared_queues.add(queue_name)
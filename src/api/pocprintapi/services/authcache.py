@@ -0,0 +1,94 @@
+import hashlib
+import hmac
+import threading
+import time
+
+from collections import OrderedDict
+from typing import Optional, Tuple
+from django.conf import settings
+from pocprintapi.services.metrics import AUTH_CACHE_LOOKUPS
+
+class CredentialCache:
+    """Bounded, in-process LRU cache of verified tenant credentials.
+
+    Maps (tenant id, token fingerprint) to the role of the tenant, so repeat
+    callers skip both the tenant lookup and the password hasher. A tenant
+    saved or deleted in this process is dropped right away (see
+    invalidate_tenant_credentials); changed by another process, even through
+    QuerySet.update(), it is looked up again once its entries expire, after at
+    most `ttl_sec`. Raw tokens are never stored: the fingerprint is an HMAC
+    keyed with `SECRET_KEY`.
+    """
+    def __init__(self, max_size: int, ttl_sec: float):
+        self.max_size: int = max_size
+        self.ttl_sec: float = ttl_sec
+        self.hits: int = 0
+        self.misses: int = 0
+
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Tuple[str, str], Tuple[str, float]] = OrderedDict() # key -> tenant role, expires at
+
+    @property
+    def is_enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl_sec > 0
+
+    def get_role(self, tenant_id: str, tenant_token: str) -> Optional[str]:
+        """Role of the tenant if the token was verified within the TTL, None otherwise"""
+        if not self.is_enabled:
+            return None
+
+        key = (tenant_id, self._fingerprint(tenant_token))
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+
+                self.misses += 1
+                AUTH_CACHE_LOOKUPS.labels("miss").inc()
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            AUTH_CACHE_LOOKUPS.labels("hit").inc()
+
+            return entry[0]
+
+    def set(self, tenant_id: str, tenant_token: str, role: str) -> None:
+        if not self.is_enabled:
+            return
+
+        key = (tenant_id, self._fingerprint(tenant_token))
+
+        with self._lock:
+            self._entries[key] = (role, time.monotonic() + self.ttl_sec)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, tenant_id: str) -> None:
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == tenant_id]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+    def _fingerprint(self, tenant_token: str) -> str:
+        return hmac.new(settings.SECRET_KEY.encode(), tenant_token.encode(), hashlib.sha256).hexdigest()
+
+credential_cache = CredentialCache(
+    settings.POC_PRINT_HUB_TENANT_AUTH_CACHE_SIZE,
+    settings.POC_PRINT_HUB_TENANT_AUTH_CACHE_TTL_SEC
+)
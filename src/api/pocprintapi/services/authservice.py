@@ -1,5 +1,9 @@
-from typing import List
+from typing import List, Union
+from asgiref.sync import sync_to_async
 from pocprintapi.models import TenantAuthConfig, TenantRole
+from pocprintapi.services.authcache import credential_cache
+from pocprintapi.services.metrics import AUTH_CHECK_SECONDS
+from pocprintapi.services.profiling import span
 from django.conf import settings
 from rest_framework import status
 from rest_framework.response import Response
@@ -9,33 +13,61 @@ class AuthService:
         if not settings.POC_PRINT_HUB_TENANT_AUTH_ENABLED:
             return True
         
-        if self._is_none_or_empty(target_tenant_id):
-            print("Empty tenant id")
-            return False
-        
-        if self._is_none_or_empty(tenant_token):
-            print("Empty tenant token")
+        if not self._is_credential_present(target_tenant_id, tenant_token):
             return False
         
+        # a verified credential skips both the tenant lookup and the token hash until it expires: a changed
+        # token or role, or a deleted tenant, takes effect in other processes within the cache TTL
+        with AUTH_CHECK_SECONDS.labels("cache").time(), span("auth_cache"):
+            role = credential_cache.get_role(target_tenant_id, tenant_token)
+
+        if role is not None:
+            return self._is_role_allowed(role, allowed_roles)
+
         try:
-            tenant = TenantAuthConfig.objects.get(tenant_id=target_tenant_id)
+            with AUTH_CHECK_SECONDS.labels("db").time(), span("auth_db"):
+                tenant = TenantAuthConfig.objects.get(tenant_id=target_tenant_id)
+        except TenantAuthConfig.DoesNotExist:
+            print(f"Tenant not found: {target_tenant_id}.")
+            return False
+
+        with AUTH_CHECK_SECONDS.labels("hash").time(), span("auth_hash"):
+            is_token_valid = tenant.check_token(tenant_token)
+
+        if not is_token_valid:
+            return False
 
-            if not tenant.check_token(tenant_token):
-                return False
+        return self._is_role_allowed(self._cache_tenant_role(tenant, tenant_token), allowed_roles)
 
-            if self._is_none_or_empty(tenant.role):
-                print(f"Invalid tenant role, tenant id: {target_tenant_id}.")
-                return False
-            
-            str_allowed_roles = []
+    async def ais_authorized(self, target_tenant_id: str, tenant_token: str, allowed_roles: List[TenantRole]) -> bool:
+        """Async version of is_authorized: async tenant lookup. The token hash runs in a thread of its own,
+        acheck_password would run it on the event loop and hold up every other request meanwhile"""
+        if not settings.POC_PRINT_HUB_TENANT_AUTH_ENABLED:
+            return True
+        
+        if not self._is_credential_present(target_tenant_id, tenant_token):
+            return False
+        
+        with AUTH_CHECK_SECONDS.labels("cache").time(), span("auth_cache"):
+            role = credential_cache.get_role(target_tenant_id, tenant_token)
 
-            for role in allowed_roles:
-                str_allowed_roles.append(role.name.upper())
+        if role is not None:
+            return self._is_role_allowed(role, allowed_roles)
 
-            return tenant.role in str_allowed_roles
+        try:
+            with AUTH_CHECK_SECONDS.labels("db").time(), span("auth_db"):
+                tenant = await TenantAuthConfig.objects.aget(tenant_id=target_tenant_id)
         except TenantAuthConfig.DoesNotExist:
             print(f"Tenant not found: {target_tenant_id}.")
             return False
+
+        with AUTH_CHECK_SECONDS.labels("hash").time(), span("auth_hash"):
+            is_token_valid = await sync_to_async(tenant.check_token, thread_sensitive=False)(tenant_token)
+
+        if not is_token_valid:
+            return False
+
+        return self._is_role_allowed(self._cache_tenant_role(tenant, tenant_token), allowed_roles)
         
     def get_tenant_role(self, target_tenant_id: str) -> Response:
         if self._is_none_or_empty(target_tenant_id):
@@ -64,5 +96,34 @@ class AuthService:
                 status.HTTP_404_NOT_FOUND
             )
         
+    def _is_credential_present(self, target_tenant_id: str, tenant_token: str) -> bool:
+        if self._is_none_or_empty(target_tenant_id):
+            print("Empty tenant id")
+            return False
+        
+        if self._is_none_or_empty(tenant_token):
+            print("Empty tenant token")
+            return False
+
+        return True
+
+    def _cache_tenant_role(self, tenant: TenantAuthConfig, tenant_token: str) -> Union[str, None]:
+        """Role of a tenant whose token was verified, cached along with the credential. None if the role is invalid"""
+        if self._is_none_or_empty(tenant.role):
+            print(f"Invalid tenant role, tenant id: {tenant.tenant_id}.")
+            return None
+
+        credential_cache.set(tenant.tenant_id, tenant_token, tenant.role)
+
+        return tenant.role
+
+    def _is_role_allowed(self, role: Union[str, None], allowed_roles: List[TenantRole]) -> bool:
+        str_allowed_roles = []
+
+        for role_option in allowed_roles:
+            str_allowed_roles.append(role_option.name.upper())
+
+        return role in str_allowed_roles
+
     def _is_none_or_empty(self, string: str) -> bool:
         return string is None or string.strip() == ""
\ No newline at end of file
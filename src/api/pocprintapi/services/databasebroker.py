@@ -0,0 +1,380 @@
+import itertools
+import time
+import uuid
+import pika
+
+from collections import deque
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple
+from django.conf import settings
+from django.db import close_old_connections, connection as db_connection, transaction
+from django.db.models import Q
+from pocprintapi.models import QueueMessage
+
+class DatabaseBroker:
+    """Embedded queue backend on the Django database (PostgreSQL or SQLite), for deployments without RabbitMQ.
+
+    Shaped like the parts of pika.BlockingConnection in use, same as the
+    benchmark stand-in: `connect` goes wherever pika.BlockingConnection is
+    expected (see open_connection), so PrintService publishes, drains,
+    consumes and republishes through it unchanged.
+
+    A queue is the QueueMessage rows of its name, in id order. Delivering a
+    message claims its row for the channel, with a lease that is renewed while
+    the channel is in use. Acking deletes the row, nacking or closing the
+    channel releases it. The claims of a channel whose process died expire with
+    their lease, like the unacked messages of a lost RabbitMQ connection.
+    Concurrent consumers claim with SELECT ... FOR UPDATE SKIP LOCKED where the
+    database supports it; SQLite serializes writers instead.
+    """
+    MIN_POLL_INTERVAL_SEC: float = 0.01
+
+    def __init__(self, poll_interval_sec: float, lease_sec: float):
+        self.poll_interval_sec: float = poll_interval_sec # longest wait between polls of an idle queue
+        self.lease_sec: float = lease_sec
+
+    def connect(self, parameters: Optional[pika.ConnectionParameters] = None) -> "DatabaseConnection":
+        # a connection of a long-running consumer thread may have been dropped by the database meanwhile
+        close_old_connections()
+
+        return DatabaseConnection(self)
+
+    def message_count(self, queue_name: str) -> int:
+        """Messages ready in a queue: not delivered, or whose claim expired"""
+        return QueueMessage.objects.filter(queue_name=queue_name).filter(self.ready_filter()).count()
+
+    def ready_filter(self) -> Q:
+        return Q(claimed_by__isnull=True) | Q(claimed_until__lt=time.time())
+
+    def poll_intervals(self) -> Iterator[float]:
+        """Waits between polls of an idle queue: short at first, so a message published right after is picked
+        up in milliseconds, then doubling up to poll_interval_sec, so a queue that stays idle costs few queries"""
+        interval = min(self.MIN_POLL_INTERVAL_SEC, self.poll_interval_sec)
+
+        while True:
+            yield interval
+            interval = min(interval * 2, self.poll_interval_sec)
+
+class DatabaseConnection:
+    def __init__(self, broker: DatabaseBroker):
+        self.broker: DatabaseBroker = broker
+        self.is_open: bool = True
+        self.is_closed: bool = False
+
+        self._channels: List["DatabaseChannel"] = []
+        self._callbacks: Deque[Callable] = deque() # added from other threads, run by the connection's thread
+        self._timers: Dict[int, Tuple[float, Callable]] = {} # timer id -> due monotonic time, callback
+        self._timer_ids = itertools.count(1)
+
+    def channel(self) -> "DatabaseChannel":
+        channel = DatabaseChannel(self.broker)
+        self._channels.append(channel)
+
+        return channel
+
+    def process_data_events(self, time_limit: float = 0) -> None:
+        """Runs due callbacks and delivers to consumers, waits up to time_limit for deliveries if there are none"""
+        deadline = time.monotonic() + (time_limit or 0)
+        poll_intervals = self.broker.poll_intervals()
+
+        while True:
+            self._run_callbacks()
+
+            is_delivered = False
+
+            for channel in self._channels:
+                if channel.is_open:
+                    channel._renew_claims_if_due()
+                    is_delivered = channel._deliver_to_consumers() or is_delivered
+
+            remaining_sec = deadline - time.monotonic()
+
+            if is_delivered or remaining_sec <= 0:
+                return
+
+            time.sleep(min(next(poll_intervals), remaining_sec))
+
+    def sleep(self, duration: float) -> None:
+        deadline = time.monotonic() + duration
+
+        while time.monotonic() < deadline:
+            self.process_data_events(time_limit=deadline - time.monotonic())
+
+    def call_later(self, delay: float, callback: Callable) -> int:
+        timer_id = next(self._timer_ids)
+        self._timers[timer_id] = (time.monotonic() + delay, callback)
+
+        return timer_id
+
+    def remove_timeout(self, timer_id: int) -> None:
+        self._timers.pop(timer_id, None)
+
+    def add_callback_threadsafe(self, callback: Callable) -> None:
+        self._callbacks.append(callback)
+
+    def close(self) -> None:
+        for channel in self._channels:
+            channel.close()
+
+        self.is_open = False
+        self.is_closed = True
+
+    def _run_callbacks(self) -> None:
+        while len(self._callbacks) > 0:
+            self._callbacks.popleft()()
+
+        now = time.monotonic()
+
+        for timer_id, (due_at, callback) in list(self._timers.items()):
+            if due_at <= now:
+                del self._timers[timer_id]
+                callback()
+
+class _QueueDeclareMethod:
+    def __init__(self, message_count: int):
+        self.message_count: int = message_count
+
+class _QueueDeclareResult:
+    def __init__(self, message_count: int):
+        self.method = _QueueDeclareMethod(message_count)
+
+class _DeliverMethod:
+    def __init__(self, delivery_tag: int, message_count: int = 0):
+        self.delivery_tag: int = delivery_tag
+        self.message_count: int = message_count # basic_get only: messages left in the queue
+
+    def __str__(self):
+        return f"<Basic.Deliver(delivery_tag={self.delivery_tag})>"
+
+class DatabaseChannel:
+    CLAIM_BATCH_SIZE: int = 100
+
+    def __init__(self, broker: DatabaseBroker):
+        self.broker: DatabaseBroker = broker
+        self.is_open: bool = True
+        self.is_closed: bool = False
+
+        self._id: uuid.UUID = uuid.uuid4() # claim owner
+        self._next_delivery_tag: int = 1
+        self._unacked: Dict[int, Tuple[str, int]] = {} # delivery tag -> queue name, row id
+        self._is_transactional: bool = False
+        self._pending: List[QueueMessage] = []
+        self._prefetch_count: int = 0
+        self._consumers: Dict[str, Tuple[Callable, int]] = {} # queue name -> on message callback, prefetch count
+        self._claims_renewed_at: float = time.monotonic()
+
+    def confirm_delivery(self) -> None:
+        pass # every publish is committed before basic_publish returns
+
+    def tx_select(self) -> None:
+        self._is_transactional = True
+
+    def add_on_return_callback(self, callback: Callable) -> None:
+        pass # queues exist as long as they have rows, nothing is returned
+
+    def tx_commit(self) -> None:
+        # a single INSERT: all of the transaction's messages or none
+        QueueMessage.objects.bulk_create(self._pending)
+        self._pending.clear()
+
+    def basic_qos(self, prefetch_count: int = 0) -> None:
+        # like RabbitMQ, applies to the consumers started afterwards
+        self._prefetch_count = prefetch_count
+
+    def queue_declare(self, queue: str, durable: bool = False, passive: bool = False) -> _QueueDeclareResult:
+        # queues exist as long as they have rows, nothing to declare
+        return _QueueDeclareResult(self.broker.message_count(queue))
+
+    def basic_publish(self, exchange: str, routing_key: str, body, properties=None, mandatory: bool = False) -> None:
+        if isinstance(body, str):
+            body = body.encode()
+
+        properties = properties or pika.BasicProperties()
+        queue_message = QueueMessage(
+            queue_name=routing_key,
+            body=body,
+            content_type=properties.content_type,
+            headers=properties.headers,
+            priority=properties.priority
+        )
+
+        if self._is_transactional:
+            self._pending.append(queue_message)
+        else:
+            queue_message.save()
+
+    def basic_get(self, queue: str) -> tuple:
+        self._renew_claims_if_due()
+        queue_messages = self._claim(queue, 1)
+
+        if len(queue_messages) == 0:
+            return None, None, None
+
+        method_frame, properties, body = self._deliver(queue_messages[0])
+        method_frame.message_count = self.broker.message_count(queue)
+
+        return method_frame, properties, body
+
+    def consume(self, queue: str, inactivity_timeout: Optional[float] = None) -> Iterator[tuple]:
+        """Yields deliveries within the prefetch window, then (None, None, None) after inactivity_timeout without any.
+
+        Like pika, without inactivity_timeout it waits for the next message for as long as the channel is open.
+        """
+        while self.is_open:
+            self._renew_claims_if_due()
+            queue_messages = self._claim(queue, self._get_window_size(self._prefetch_count, len(self._unacked)))
+
+            for queue_message in queue_messages:
+                yield self._deliver(queue_message)
+
+            if len(queue_messages) > 0:
+                continue
+
+            queue_messages = self._wait_for_messages(queue, inactivity_timeout)
+
+            if len(queue_messages) == 0 and inactivity_timeout is not None:
+                yield None, None, None
+
+            for queue_message in queue_messages:
+                yield self._deliver(queue_message)
+
+    def basic_consume(self, queue: str, on_message_callback: Callable) -> None:
+        self._consumers[queue] = (on_message_callback, self._prefetch_count)
+
+    def stop_consuming(self) -> None:
+        self._consumers.clear()
+
+    def basic_ack(self, delivery_tag: int, multiple: bool = False) -> None:
+        acked_tags = [tag for tag in self._unacked if tag <= delivery_tag] if multiple else [delivery_tag]
+        row_ids = [self._unacked.pop(tag)[1] for tag in acked_tags if tag in self._unacked]
+
+        QueueMessage.objects.filter(id__in=row_ids, claimed_by=self._id).delete()
+
+    def basic_nack(self, delivery_tag: int, requeue: bool = True) -> None:
+        _, row_id = self._unacked.pop(delivery_tag)
+        queue_messages = QueueMessage.objects.filter(id=row_id, claimed_by=self._id)
+
+        # back to its place in the queue, the row keeps its id
+        if requeue:
+            queue_messages.update(claimed_by=None, claimed_until=None)
+        else:
+            queue_messages.delete()
+
+    def cancel(self) -> None:
+        pass
+
+    def close(self) -> None:
+        if self.is_closed:
+            return
+
+        # like the broker: unacked deliveries go back to their queue
+        if len(self._unacked) > 0:
+            QueueMessage.objects.filter(claimed_by=self._id).update(claimed_by=None, claimed_until=None)
+
+        self._unacked.clear()
+        self._pending.clear()
+        self._consumers.clear()
+        self.is_open = False
+        self.is_closed = True
+
+    def _deliver_to_consumers(self) -> bool:
+        """Delivers what the prefetch windows allow, like a broker push. Returns whether anything was delivered"""
+        is_delivered = False
+
+        for queue_name, (on_message, prefetch_count) in list(self._consumers.items()):
+            unacked_count = sum(1 for unacked_queue_name, _ in self._unacked.values() if unacked_queue_name == queue_name)
+            window_size = self._get_window_size(prefetch_count, unacked_count)
+
+            if window_size == 0:
+                continue
+
+            for queue_message in self._claim(queue_name, window_size):
+                method_frame, properties, body = self._deliver(queue_message)
+                on_message(self, method_frame, properties, body)
+                is_delivered = True
+
+        return is_delivered
+
+    def _get_window_size(self, prefetch_count: int, unacked_count: int) -> int:
+        if prefetch_count <= 0:
+            return self.CLAIM_BATCH_SIZE
+
+        return min(max(prefetch_count - unacked_count, 0), self.CLAIM_BATCH_SIZE)
+
+    def _wait_for_messages(self, queue: str, timeout: Optional[float]) -> List[QueueMessage]:
+        """Polls with backoff until messages are claimed, timeout passes or, without a timeout, the channel is closed"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        poll_intervals = self.broker.poll_intervals()
+
+        while self.is_open:
+            remaining_sec = deadline - time.monotonic() if deadline is not None else float("inf")
+
+            if remaining_sec <= 0:
+                return []
+
+            time.sleep(min(next(poll_intervals), remaining_sec))
+            self._renew_claims_if_due()
+            queue_messages = self._claim(queue, self._get_window_size(self._prefetch_count, len(self._unacked)))
+
+            if len(queue_messages) > 0:
+                return queue_messages
+
+        return []
+
+    def _claim(self, queue_name: str, limit: int) -> List[QueueMessage]:
+        """Claims the next ready messages of a queue for this channel, oldest first"""
+        if limit == 0:
+            return []
+
+        with transaction.atomic():
+            candidates = QueueMessage.objects.filter(queue_name=queue_name).filter(self.broker.ready_filter()).order_by("id")
+
+            # concurrent consumers skip each other's candidates instead of waiting on them
+            if db_connection.features.has_select_for_update_skip_locked:
+                candidates = candidates.select_for_update(skip_locked=True)
+
+            queue_messages = list(candidates[:limit])
+
+            if len(queue_messages) == 0:
+                return []
+
+            # re-checked on update, for databases without row locks
+            claimed_count = QueueMessage.objects.filter(id__in=[queue_message.id for queue_message in queue_messages]) \
+                .filter(self.broker.ready_filter()) \
+                .update(claimed_by=self._id, claimed_until=time.time() + self.broker.lease_sec)
+
+        # some were claimed by another consumer in between
+        if claimed_count < len(queue_messages):
+            return list(
+                QueueMessage.objects.filter(id__in=[queue_message.id for queue_message in queue_messages], claimed_by=self._id).order_by("id")
+            )
+
+        return queue_messages
+
+    def _renew_claims_if_due(self) -> None:
+        if len(self._unacked) == 0 or time.monotonic() - self._claims_renewed_at < self.broker.lease_sec / 3:
+            return
+
+        QueueMessage.objects.filter(claimed_by=self._id).update(claimed_until=time.time() + self.broker.lease_sec)
+        self._claims_renewed_at = time.monotonic()
+
+    def _deliver(self, queue_message: QueueMessage) -> Tuple[_DeliverMethod, pika.BasicProperties, bytes]:
+        delivery_tag = self._next_delivery_tag
+        self._next_delivery_tag += 1
+        self._unacked[delivery_tag] = (queue_message.queue_name, queue_message.id)
+
+        if len(self._unacked) == 1:
+            self._claims_renewed_at = time.monotonic()
+
+        properties = pika.BasicProperties(
+            content_type=queue_message.content_type,
+            headers=queue_message.headers,
+            priority=queue_message.priority,
+            delivery_mode=pika.DeliveryMode.Persistent
+        )
+
+        return _DeliverMethod(delivery_tag), properties, bytes(queue_message.body)
+
+database_broker = DatabaseBroker(
+    settings.POC_PRINT_HUB_DATABASE_QUEUE_POLL_INTERVAL_SEC,
+    settings.POC_PRINT_HUB_DATABASE_QUEUE_LEASE_SEC
+)
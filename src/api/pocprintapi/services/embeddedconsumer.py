@@ -0,0 +1,87 @@
+import atexit
+import fcntl
+import os
+import threading
+import time
+
+from typing import Optional
+from django.conf import settings
+from pocprintapi.services.printservice import PrintService
+
+class EmbeddedConsumer:
+    """Print queue consumer run in a thread of an API worker process, for the database queue backend.
+
+    Every worker started with it enabled (see gunicorn.conf.py) waits on a lock
+    file, and the one holding it consumes the print queues like the
+    consume_print_queue command does. When that worker exits, the lock is
+    released and another worker takes over, the messages it had claimed are
+    delivered again once their lease expires. Only ever one consumer prints,
+    whatever the number of workers.
+    """
+    def __init__(self, enabled: bool, lock_path: str):
+        self.enabled: bool = enabled
+        self.lock_path: str = lock_path
+
+        self._pid: Optional[int] = None # the process running the consumer thread, a forked child starts its own
+        self._thread: Optional[threading.Thread] = None
+        self._print_service: Optional[PrintService] = None
+        self._is_stopping: bool = False
+
+    def start(self) -> None:
+        """Starts the thread that takes over consuming once the lock is free, if not done yet"""
+        if self._pid == os.getpid():
+            return
+
+        self._pid = os.getpid()
+        self._is_stopping = False
+        self._thread = threading.Thread(target=self._run, name="embedded-print-queue-consumer", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """Stops consuming once the messages being printed are done, and releases the lock"""
+        if self._pid != os.getpid():
+            return
+
+        self._is_stopping = True
+
+        if self._print_service is not None:
+            self._print_service.stop_consuming()
+
+            # a thread still waiting on the lock holds nothing: only wait for one that consumes
+            self._thread.join(timeout=settings.POC_PRINT_HUB_QUEUE_RETRY_DELAY_SEC)
+
+        self._pid = None
+
+    def _run(self) -> None:
+        lock_fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT)
+
+        try:
+            # blocks until the worker holding it exits, the lock goes with its file descriptor
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+
+            if self._is_stopping:
+                return
+
+            print(f"Consuming print queue messages in worker {os.getpid()}")
+            self._print_service = PrintService()
+
+            while not self._is_stopping:
+                try:
+                    self._print_service.consume_queue_messages()
+                except Exception as ex:
+                    # e.g. the database is unreachable: consume_queue_messages only reconnects on broker errors
+                    print(
+                        f"Embedded print queue consumer failed, error: {ex}. "\
+                        f"Restarting in {settings.POC_PRINT_HUB_QUEUE_RETRY_DELAY_SEC}s."
+                    )
+                    time.sleep(settings.POC_PRINT_HUB_QUEUE_RETRY_DELAY_SEC)
+
+            print("Embedded print queue consumer stopped")
+        finally:
+            os.close(lock_fd)
+
+embedded_consumer = EmbeddedConsumer(
+    settings.POC_PRINT_HUB_QUEUE_BACKEND == "database" and settings.POC_PRINT_HUB_DATABASE_QUEUE_EMBEDDED_CONSUMER,
+    settings.POC_PRINT_HUB_DATABASE_QUEUE_EMBEDDED_CONSUMER_LOCK_PATH
+)
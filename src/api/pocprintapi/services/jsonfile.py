@@ -0,0 +1,30 @@
+import json
+import os
+import tempfile
+
+from typing import Optional
+
+def read_json_file(file_path: str) -> Optional[dict]:
+    """Returns the parsed file, or None if it is missing or unreadable"""
+    try:
+        with open(file_path, "r") as json_file:
+            return json.load(json_file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as ex:
+        print(f"Failed to read {file_path}, error: {ex}")
+        return None
+
+def write_json_file_atomically(file_path: str, data: dict) -> None:
+    """Write-then-rename, so readers in other processes never see a partially written file"""
+    directory = os.path.dirname(os.path.abspath(file_path))
+    file_descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+
+    try:
+        with os.fdopen(file_descriptor, "w") as temp_file:
+            json.dump(data, temp_file)
+
+        os.replace(temp_path, file_path)
+    except Exception:
+        os.unlink(temp_path)
+        raise
@@ -0,0 +1,219 @@
+import json
+import struct
+import uuid
+import zlib
+
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+from django.conf import settings
+from pocprintapi.models import NotificationMessage, NotificationBodyType, NotificationPriority
+
+class NotificationMessageCodec:
+    """Encodes notification messages for the print queue, negotiated through the AMQP content type.
+
+    Binary v1 layout, little-endian: version (B), flags (B), id (16s), timestamp wall
+    time in microseconds since epoch (q), UTC offset in seconds (i), then title,
+    body type and origin as length-prefixed (I) UTF-8. The rest is the body section:
+    UTF-8 text, or key/value pairs (I count, then length-prefixed key and value),
+    zlib-compressed when large. A non-normal priority is a flag. A coalesced message
+    (flag) has its copy count (I) and first/last seen UTC times in microseconds
+    since epoch (qq) right after the origin. Messages of any other content type
+    decode as JSON.
+    """
+    JSON_CONTENT_TYPE: str = "application/json"
+    BINARY_CONTENT_TYPE: str = "application/vnd.pocprinthub.notification+binary"
+    VERSION: int = 1
+
+    FLAG_KEY_VALUE: int = 0x01
+    FLAG_COMPRESSED: int = 0x02
+    FLAG_NAIVE_TIMESTAMP: int = 0x04
+    FLAG_PRIORITY_HIGH: int = 0x08
+    FLAG_PRIORITY_LOW: int = 0x10
+    FLAG_COALESCED: int = 0x20
+
+    _HEADER = struct.Struct("<BB16sqi")
+    _LENGTH = struct.Struct("<I")
+    _COALESCED = struct.Struct("<Iqq")
+    _EPOCH = datetime(1970, 1, 1)
+    _UTC_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    _MICROSECOND = timedelta(microseconds=1)
+
+    def __init__(self, codec_name: str, compression_min_bytes: int):
+        self.codec_name: str = codec_name
+        self.compression_min_bytes: int = compression_min_bytes
+
+    @property
+    def content_type(self) -> str:
+        return self.BINARY_CONTENT_TYPE if self.codec_name == "binary" else self.JSON_CONTENT_TYPE
+
+    def encode(self, message: NotificationMessage) -> bytes:
+        """Encodes a message with the configured codec, see content_type"""
+        if self.codec_name != "binary":
+            return json.dumps(message.to_dict()).encode()
+
+        flags = 0
+        timestamp = message.timestamp
+        utc_offset = timestamp.utcoffset()
+
+        if utc_offset is None:
+            flags |= self.FLAG_NAIVE_TIMESTAMP
+            utc_offset = timedelta(0)
+
+        if message.priority is NotificationPriority.HIGH:
+            flags |= self.FLAG_PRIORITY_HIGH
+        elif message.priority is NotificationPriority.LOW:
+            flags |= self.FLAG_PRIORITY_LOW
+
+        coalesced_section = b""
+
+        if message.copies > 1:
+            flags |= self.FLAG_COALESCED
+            coalesced_section = self._COALESCED.pack(
+                message.copies,
+                (message.first_seen_at - self._UTC_EPOCH) // self._MICROSECOND,
+                (message.last_seen_at - self._UTC_EPOCH) // self._MICROSECOND
+            )
+
+        body_items = self.get_key_value_items(message)
+
+        if body_items is None:
+            body_section = message.body.encode()
+        else:
+            flags |= self.FLAG_KEY_VALUE
+            body_section = self._encode_key_value_items(body_items)
+
+        if len(body_section) >= self.compression_min_bytes:
+            flags |= self.FLAG_COMPRESSED
+            body_section = zlib.compress(body_section)
+
+        message_id = message.id if isinstance(message.id, uuid.UUID) else uuid.UUID(message.id)
+
+        return b"".join([
+            self._HEADER.pack(
+                self.VERSION,
+                flags,
+                message_id.bytes,
+                (timestamp.replace(tzinfo=None) - self._EPOCH) // self._MICROSECOND,
+                utc_offset // timedelta(seconds=1)
+            ),
+            self._encode_string(message.title),
+            self._encode_string(message.body_type),
+            self._encode_string(message.origin),
+            coalesced_section,
+            body_section
+        ])
+
+    def decode(self, body: bytes, content_type: Optional[str]) -> NotificationMessage:
+        if content_type != self.BINARY_CONTENT_TYPE:
+            return NotificationMessage.from_json(json.loads(body))
+
+        version, flags, message_id, timestamp_us, utc_offset_sec = self._HEADER.unpack_from(body, 0)
+
+        if version != self.VERSION:
+            raise ValueError(f"Unsupported message version: {version}")
+
+        offset = self._HEADER.size
+        title, offset = self._decode_string(body, offset)
+        body_type, offset = self._decode_string(body, offset)
+        origin, offset = self._decode_string(body, offset)
+
+        copies, first_seen_at, last_seen_at = 1, None, None
+
+        if flags & self.FLAG_COALESCED:
+            copies, first_seen_us, last_seen_us = self._COALESCED.unpack_from(body, offset)
+            offset += self._COALESCED.size
+            first_seen_at = self._UTC_EPOCH + first_seen_us * self._MICROSECOND
+            last_seen_at = self._UTC_EPOCH + last_seen_us * self._MICROSECOND
+
+        body_section = body[offset:]
+
+        if flags & self.FLAG_COMPRESSED:
+            body_section = zlib.decompress(body_section)
+
+        timestamp = self._EPOCH + timestamp_us * self._MICROSECOND
+
+        if not flags & self.FLAG_NAIVE_TIMESTAMP:
+            timestamp = timestamp.replace(tzinfo=timezone(timedelta(seconds=utc_offset_sec)))
+
+        priority = NotificationPriority.NORMAL
+
+        if flags & self.FLAG_PRIORITY_HIGH:
+            priority = NotificationPriority.HIGH
+        elif flags & self.FLAG_PRIORITY_LOW:
+            priority = NotificationPriority.LOW
+
+        if flags & self.FLAG_KEY_VALUE:
+            message_body = None
+            body_items = self._decode_key_value_items(body_section)
+        else:
+            message_body = body_section.decode()
+            body_items = None
+
+        return NotificationMessage(
+            uuid.UUID(bytes=message_id),
+            title,
+            message_body,
+            body_type,
+            origin,
+            timestamp,
+            body_items,
+            priority,
+            copies=copies,
+            first_seen_at=first_seen_at,
+            last_seen_at=last_seen_at
+        )
+
+    def get_key_value_items(self, message: NotificationMessage) -> Optional[List[Tuple[str, str]]]:
+        """Key/value lines as printed, or None if the body is not a key/value object"""
+        if message.body_type.upper() != NotificationBodyType.KEYVALUE.name:
+            return None
+
+        # decoded from binary, being re-encoded
+        if message.body_items is not None:
+            return message.body_items
+
+        try:
+            body_messages = json.loads(message.body)
+        except ValueError:
+            return None
+
+        if not isinstance(body_messages, dict):
+            return None
+
+        return [(f"{key}", f"{value}") for key, value in body_messages.items()]
+
+    def _encode_key_value_items(self, body_items: List[Tuple[str, str]]) -> bytes:
+        parts = [self._LENGTH.pack(len(body_items))]
+
+        for key, value in body_items:
+            parts.append(self._encode_string(key))
+            parts.append(self._encode_string(value))
+
+        return b"".join(parts)
+
+    def _decode_key_value_items(self, body_section: bytes) -> List[Tuple[str, str]]:
+        (count,) = self._LENGTH.unpack_from(body_section, 0)
+        offset = self._LENGTH.size
+        body_items = []
+
+        for _ in range(count):
+            key, offset = self._decode_string(body_section, offset)
+            value, offset = self._decode_string(body_section, offset)
+            body_items.append((key, value))
+
+        return body_items
+
+    def _encode_string(self, string: str) -> bytes:
+        encoded = string.encode()
+        return self._LENGTH.pack(len(encoded)) + encoded
+
+    def _decode_string(self, buffer: bytes, offset: int) -> Tuple[str, int]:
+        (length,) = self._LENGTH.unpack_from(buffer, offset)
+        offset += self._LENGTH.size
+
+        return buffer[offset:offset + length].decode(), offset + length
+
+message_codec = NotificationMessageCodec(
+    settings.POC_PRINT_HUB_MESSAGE_CODEC,
+    settings.POC_PRINT_HUB_MESSAGE_COMPRESSION_MIN_BYTES
+)
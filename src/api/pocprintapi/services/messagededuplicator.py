@@ -0,0 +1,236 @@
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable, List, Optional
+from django.conf import settings
+from pocprintapi.models import NotificationMessage
+from pocprintapi.services.jsonfile import read_json_file, write_json_file_atomically
+from pocprintapi.services.messagecodec import message_codec
+
+class DedupEntry:
+    """First copy of a message seen within the current window, and how many identical ones followed"""
+    __slots__ = ("key", "message", "queue_name", "first_seen", "last_seen", "copies")
+
+    def __init__(self, key: str, message: NotificationMessage, queue_name: str, first_seen: float):
+        self.key: str = key
+        self.message: NotificationMessage = message
+        self.queue_name: str = queue_name # lane queue the coalesced message goes to
+        self.first_seen: float = first_seen # epoch sec
+        self.last_seen: float = first_seen
+        self.copies: int = 1
+
+    def build_coalesced_message(self) -> NotificationMessage:
+        return NotificationMessage(
+            uuid.uuid4(),
+            self.message.title,
+            self.message.body,
+            self.message.body_type,
+            self.message.origin,
+            self.message.timestamp,
+            self.message.body_items,
+            self.message.priority,
+            copies=self.copies,
+            first_seen_at=datetime.fromtimestamp(self.first_seen, timezone.utc),
+            last_seen_at=datetime.fromtimestamp(self.last_seen, timezone.utc)
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "key": self.key,
+            "message": self.message.to_dict(),
+            "queueName": self.queue_name,
+            "firstSeen": self.first_seen,
+            "lastSeen": self.last_seen,
+            "copies": self.copies
+        }
+
+    @staticmethod
+    def from_dict(entry_dict: dict) -> "DedupEntry":
+        entry = DedupEntry(
+            entry_dict["key"],
+            NotificationMessage.from_json(entry_dict["message"]),
+            entry_dict["queueName"],
+            entry_dict["firstSeen"]
+        )
+        entry.last_seen = entry_dict["lastSeen"]
+        entry.copies = entry_dict["copies"]
+
+        return entry
+
+class MessageDeduplicator:
+    """Suppresses identical messages, same origin, title and body, within a time window.
+
+    The first copy goes through right away. The copies that follow within the
+    window are suppressed and counted. Once the window closes, a single
+    coalesced message carrying the copy count and the first/last seen times
+    is queued in their place (see take_closed). The index of content hashes is
+    bounded, oldest first: an entry evicted early has its window closed early.
+
+    Applied at publish time by every API worker, each with its own index, or
+    at drain time by the print queue consumer, see `mode`. At publish time, a
+    flusher thread queues the coalesced messages as windows close, and closes
+    the windows still open when the process exits.
+    """
+    MODES = ("off", "publish", "drain")
+    FLUSHER_INTERVAL_SEC: float = 1.0
+
+    def __init__(self, mode: str, window_sec: float, max_entries: int, file_path: str):
+        if mode not in self.MODES:
+            raise ValueError(f"Invalid dedup mode: '{mode}', should be one of {', '.join(self.MODES)}")
+
+        self.mode: str = mode
+        self.window_sec: float = window_sec
+        self.max_entries: int = max_entries
+        self.file_path: str = file_path # drain time index, shared by the Celery worker processes
+
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, DedupEntry] = OrderedDict() # by content hash, oldest first
+        self._closed: List[DedupEntry] = [] # closed windows with suppressed copies, to be queued
+        self._flusher_pid: Optional[int] = None # the process running the flusher, a forked child starts its own
+
+    def is_applied(self, stage: str) -> bool:
+        return self.mode == stage
+
+    def observe(self, message: NotificationMessage, queue_name: str) -> Optional[str]:
+        """Records a message, returns the id of the first copy if it is a duplicate to suppress"""
+        # coalesced messages go through as is
+        if message.copies > 1:
+            return None
+
+        key = self._get_content_key(message)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and now - entry.first_seen < self.window_sec:
+                entry.copies += 1
+                entry.last_seen = now
+
+                return str(entry.message.id)
+
+            if entry is not None:
+                del self._entries[key]
+                self._close(entry)
+
+            self._entries[key] = DedupEntry(key, message, queue_name, now)
+
+            while len(self._entries) > self.max_entries:
+                _, evicted_entry = self._entries.popitem(last=False)
+                self._close(evicted_entry)
+
+        return None
+
+    def discard(self, message: NotificationMessage) -> None:
+        """Forgets a first copy that failed to be queued, so that the next one goes through"""
+        key = self._get_content_key(message)
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and entry.message is message:
+                del self._entries[key]
+                self._close(entry)
+
+    def take_closed(self) -> List[DedupEntry]:
+        """Entries of the windows closed since the last call that had copies suppressed"""
+        now = time.time()
+
+        with self._lock:
+            while len(self._entries) > 0:
+                entry = next(iter(self._entries.values()))
+
+                if now - entry.first_seen < self.window_sec:
+                    break
+
+                del self._entries[entry.key]
+                self._close(entry)
+
+            closed_entries, self._closed = self._closed, []
+
+        return closed_entries
+
+    def close_all(self) -> None:
+        """Closes every window right away, e.g. before the index goes away with the process"""
+        with self._lock:
+            for entry in self._entries.values():
+                self._close(entry)
+
+            self._entries.clear()
+
+    def start_flusher(self, publish_closed: Callable[[], None]) -> None:
+        """Calls publish_closed every FLUSHER_INTERVAL_SEC from a thread, and once more at exit with every window closed.
+        Once per process: later calls do nothing"""
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+
+            self._flusher_pid = os.getpid()
+
+        threading.Thread(target=self._flush, args=(publish_closed,), name="dedup-flusher", daemon=True).start()
+        atexit.register(self._flush_at_exit, publish_closed)
+
+    def restore_closed(self, entries: List[DedupEntry]) -> None:
+        """Puts back closed entries whose coalesced message could not be queued, for the next take_closed"""
+        with self._lock:
+            self._closed = entries + self._closed
+
+    def load(self) -> None:
+        """Picks up the index saved by the previous drain, which may have run in another process"""
+        state = read_json_file(self.file_path)
+
+        if state is None:
+            return
+
+        with self._lock:
+            self._entries = OrderedDict(
+                (entry_dict["key"], DedupEntry.from_dict(entry_dict)) for entry_dict in state["entries"]
+            )
+            self._closed = [DedupEntry.from_dict(entry_dict) for entry_dict in state["closed"]]
+
+    def save(self) -> None:
+        with self._lock:
+            state = {
+                "entries": [entry.to_dict() for entry in self._entries.values()],
+                "closed": [entry.to_dict() for entry in self._closed]
+            }
+
+        write_json_file_atomically(self.file_path, state)
+
+    def _flush(self, publish_closed: Callable[[], None]) -> None:
+        while True:
+            time.sleep(self.FLUSHER_INTERVAL_SEC)
+            publish_closed()
+
+    def _flush_at_exit(self, publish_closed: Callable[[], None]) -> None:
+        if self._flusher_pid != os.getpid():
+            return
+
+        self.close_all()
+        publish_closed()
+
+    def _close(self, entry: DedupEntry) -> None:
+        if entry.copies > 1:
+            self._closed.append(entry)
+
+    def _get_content_key(self, message: NotificationMessage) -> str:
+        # key/value bodies by their lines as printed, whether decoded from JSON or binary
+        body_items = message_codec.get_key_value_items(message)
+        body = message.body if body_items is None else json.dumps(body_items)
+        content = "\x00".join([message.origin, message.title, body])
+
+        return hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+
+message_deduplicator = MessageDeduplicator(
+    settings.POC_PRINT_HUB_DEDUP_MODE,
+    settings.POC_PRINT_HUB_DEDUP_WINDOW_SEC,
+    settings.POC_PRINT_HUB_DEDUP_MAX_ENTRIES,
+    settings.POC_PRINT_HUB_DEDUP_INDEX_FILE
+)
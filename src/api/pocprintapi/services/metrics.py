@@ -0,0 +1,123 @@
+import os
+
+from typing import Dict, Tuple
+from django.conf import settings
+
+# prometheus_client picks multiprocess mode at import time: every gunicorn worker, the print queue
+# consumer and the Celery worker write their samples to this directory, the exporter sums them up
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", settings.POC_PRINT_HUB_METRICS_DIR)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+# sub-millisecond cache hits up to multi-second printer round-trips
+LATENCY_BUCKETS_SEC = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# a message picked right away up to a backlog of several minutes
+WAIT_BUCKETS_SEC = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+
+PUBLISH_SECONDS = Histogram(
+    "pocprinthub_publish_seconds",
+    "Publish request handling time, auth excluded",
+    ["endpoint"],
+    buckets=LATENCY_BUCKETS_SEC
+)
+AUTH_CHECK_SECONDS = Histogram(
+    "pocprinthub_auth_check_seconds",
+    "Tenant auth check time by stage: credential cache lookup, tenant DB lookup, token hash check",
+    ["stage"],
+    buckets=LATENCY_BUCKETS_SEC
+)
+AUTH_CACHE_LOOKUPS = Counter(
+    "pocprinthub_auth_cache_lookups_total",
+    "Tenant credentials looked up in the credential cache, by whether they were found",
+    ["result"]
+)
+AMQP_CONNECT_SECONDS = Histogram(
+    "pocprinthub_amqp_connect_seconds",
+    "RabbitMQ publisher connection setup time",
+    ["client"],
+    buckets=LATENCY_BUCKETS_SEC
+)
+AMQP_PUBLISH_SECONDS = Histogram(
+    "pocprinthub_amqp_publish_seconds",
+    "RabbitMQ publish time until confirmed or committed by the broker",
+    ["mode"],
+    buckets=LATENCY_BUCKETS_SEC
+)
+PRINT_MESSAGE_SECONDS = Histogram(
+    "pocprinthub_print_message_seconds",
+    "Time to decode, render and send one queue message to the printer",
+    buckets=LATENCY_BUCKETS_SEC
+)
+PRINT_DIGEST_SECONDS = Histogram(
+    "pocprinthub_print_digest_seconds",
+    "Time to render and send one digest job, all the messages of a drain pass, to the printer",
+    buckets=LATENCY_BUCKETS_SEC
+)
+PRINTED_MESSAGES = Counter("pocprinthub_printed_messages_total", "Queue messages sent to the printer")
+PRINTER_BYTES_SENT = Counter("pocprinthub_printer_bytes_sent_total", "ESC/POS bytes sent to the printer for queue messages")
+PRINTER_PROBE_SECONDS = Histogram(
+    "pocprinthub_printer_probe_seconds",
+    "Printer online and paper status query time",
+    ["source"],
+    buckets=LATENCY_BUCKETS_SEC
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "pocprinthub_queue_wait_seconds",
+    "Time queue messages waited from publish until picked for printing, by publishing tenant",
+    ["tenant"],
+    buckets=WAIT_BUCKETS_SEC
+)
+DEAD_LETTERED_MESSAGES = Counter("pocprinthub_dead_lettered_messages_total", "Queue messages moved to the error queue")
+DEDUP_SUPPRESSED_MESSAGES = Counter(
+    "pocprinthub_dedup_suppressed_messages_total",
+    "Duplicate messages suppressed by the dedup stage, coalesced into a single printout",
+    ["stage"]
+)
+DEDUP_COALESCED_MESSAGES = Counter(
+    "pocprinthub_dedup_coalesced_messages_total",
+    "Coalesced messages (with a copy count) queued by the dedup stage once their window closed",
+    ["stage"]
+)
+PUBLISH_SPOOL_FLUSHED_MESSAGES = Counter(
+    "pocprinthub_publish_spool_flushed_messages_total",
+    "Spooled messages forwarded to RabbitMQ by the publish spool flusher"
+)
+PUBLISH_SPOOL_BYTES = Gauge(
+    "pocprinthub_publish_spool_bytes",
+    "Disk use of the publish spool, summed over live processes",
+    multiprocess_mode="livesum"
+)
+RASTER_CACHE_LOOKUPS = Counter(
+    "pocprinthub_raster_cache_lookups_total",
+    "Image, QR code and barcode body renders looked up in the raster cache, by where they were found",
+    ["result"]
+)
+RASTER_SECONDS = Histogram(
+    "pocprinthub_raster_seconds",
+    "Image, QR code and barcode body rasterization time, on raster cache misses",
+    ["body_type"],
+    buckets=LATENCY_BUCKETS_SEC
+)
+QUEUE_DEPTH = Gauge(
+    "pocprinthub_queue_depth",
+    "Messages ready in a RabbitMQ queue, as last fetched by any live process",
+    ["queue"],
+    multiprocess_mode="livemostrecent"
+)
+
+def record_queue_depths(queue_statuses: Dict[str, Tuple[bool, int]]) -> None: # queue name -> is success, count
+    for queue_name, (is_success, message_count) in queue_statuses.items():
+        if is_success:
+            QUEUE_DEPTH.labels(queue_name).set(message_count)
+
+def export_metrics() -> Tuple[bytes, str]: # body, content type
+    """Metrics of all processes sharing the multiprocess directory, in Prometheus text format"""
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+def mark_process_dead(pid: int) -> None:
+    """Drops the live gauges of an exited worker process, its counters and histograms are kept"""
+    multiprocess.mark_process_dead(pid)
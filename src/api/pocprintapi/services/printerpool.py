@@ -0,0 +1,156 @@
+import re
+import threading
+import time
+
+from typing import Dict, List, Optional, Tuple
+from django.conf import settings
+from pocprintapi.models import NotificationMessage
+from pocprintapi.services.printerstatus import printer_status_snapshot
+from pocprintapi.services.prioritylanes import PriorityLanes, priority_lanes
+
+PRINTER_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+ROUTE_KINDS = ("tenant", "origin")
+
+class PoolPrinter:
+    """A printer of the pool, with its own print queue lanes for the messages routed to it"""
+    def __init__(self, name: str, host: str, queue_name: str, starvation_limit: int):
+        self.name: str = name
+        self.host: str = host
+        self.lanes: PriorityLanes = PriorityLanes(f"{queue_name}_printer_{name}", starvation_limit)
+
+class PrinterPool:
+    """Printers the print queue is dispatched to.
+
+    Messages routed to a printer (explicit `printer` target, then tenant,
+    then origin routes) go to that printer's own lanes. All others go to the
+    shared lanes, which every printer consumes from: whichever printer is
+    free takes the next message. A printer unavailable for longer than the
+    failover delay is skipped when routing, and its consumer moves the
+    messages already routed to it over to the shared lanes.
+    """
+    def __init__(
+        self,
+        printers: List[Tuple[str, str]], # name, host
+        routes: Dict[Tuple[str, str], str], # kind, value -> printer name
+        queue_name: str,
+        starvation_limit: int,
+        failover_after_sec: float
+    ):
+        self.printers: List[PoolPrinter] = [
+            PoolPrinter(name, host, queue_name, starvation_limit) for name, host in printers
+        ]
+        self.routes: Dict[Tuple[str, str], str] = routes
+        self.failover_after_sec: float = failover_after_sec
+
+        self._printers_by_name: Dict[str, PoolPrinter] = { pool_printer.name: pool_printer for pool_printer in self.printers }
+        self._lock = threading.Lock()
+        self._unavailable_since: Dict[str, float] = {}
+
+        for route, printer_name in routes.items():
+            if printer_name not in self._printers_by_name:
+                raise ValueError(f"Printer route {route[0]}:{route[1]} targets an unknown printer: {printer_name}")
+
+    @property
+    def default(self) -> PoolPrinter:
+        """The first configured printer, target of feed/cut and of the top level `api/printer/status` fields"""
+        return self.printers[0]
+
+    def get(self, name: Optional[str]) -> Optional[PoolPrinter]:
+        if name is None:
+            return self.default
+
+        return self._printers_by_name.get(name)
+
+    def route(self, message: NotificationMessage, tenant_id: Optional[str]) -> Optional[PoolPrinter]:
+        """Printer a message is routed to, or None to load-balance it over the shared lanes"""
+        if len(self.printers) == 1:
+            return None
+
+        printer_name = message.printer \
+            or self.routes.get(("tenant", tenant_id)) \
+            or self.routes.get(("origin", message.origin))
+
+        if printer_name is None:
+            return None
+
+        pool_printer = self._printers_by_name[printer_name]
+
+        if self._is_failed_over_by_snapshot(pool_printer.name):
+            return None
+
+        return pool_printer
+
+    def lanes_of(self, pool_printer: Optional[PoolPrinter]) -> PriorityLanes:
+        return priority_lanes if pool_printer is None else pool_printer.lanes
+
+    def report_availability(self, pool_printer: PoolPrinter, is_available: bool) -> None:
+        """Tracks how long a printer has been unavailable, as seen by its consumer in this process"""
+        with self._lock:
+            if is_available:
+                self._unavailable_since.pop(pool_printer.name, None)
+            else:
+                self._unavailable_since.setdefault(pool_printer.name, time.monotonic())
+
+    def is_failed_over(self, pool_printer: PoolPrinter) -> bool:
+        """Whether the share of an unavailable printer should go to the others"""
+        if len(self.printers) == 1:
+            return False
+
+        with self._lock:
+            unavailable_since = self._unavailable_since.get(pool_printer.name)
+
+        return unavailable_since is not None and time.monotonic() - unavailable_since >= self.failover_after_sec
+
+    def _is_failed_over_by_snapshot(self, printer_name: str) -> bool:
+        printer_status = printer_status_snapshot.read(printer_name)
+
+        if printer_status is None or printer_status.get("unavailableSince") is None:
+            return False
+
+        return time.time() - printer_status["unavailableSince"] >= self.failover_after_sec
+
+def parse_printers(printers: str, default_name: str, default_host: str) -> List[Tuple[str, str]]: # name, host
+    """Parses `name=host` comma-separated entries, a single default printer if none"""
+    if printers.strip() == "":
+        return [(default_name, default_host)]
+
+    parsed_printers = []
+
+    for entry in printers.split(","):
+        name, separator, host = entry.strip().partition("=")
+
+        if separator == "" or not PRINTER_NAME_PATTERN.match(name) or host.strip() == "":
+            raise ValueError(f"Invalid printer entry: '{entry}', should be name=host with name of [A-Za-z0-9_-]")
+
+        parsed_printers.append((name, host.strip()))
+
+    if len({ name for name, _ in parsed_printers }) != len(parsed_printers):
+        raise ValueError("Printer names should be unique")
+
+    return parsed_printers
+
+def parse_routes(routes: str) -> Dict[Tuple[str, str], str]: # kind, value -> printer name
+    """Parses `kind:value=printer` comma-separated entries, kind being tenant or origin"""
+    parsed_routes = {}
+
+    for entry in routes.split(","):
+        if entry.strip() == "":
+            continue
+
+        route, separator, printer_name = entry.strip().rpartition("=")
+        kind, _, value = route.partition(":")
+
+        if separator == "" or kind not in ROUTE_KINDS or value == "" or printer_name == "":
+            raise ValueError(f"Invalid printer route: '{entry}', should be tenant:<id>=printer or origin:<origin>=printer")
+
+        parsed_routes[(kind, value)] = printer_name
+
+    return parsed_routes
+
+printer_pool = PrinterPool(
+    parse_printers(settings.POC_PRINT_HUB_PRINTERS, settings.POC_PRINT_HUB_PRINTER_NAME, settings.POC_PRINT_HUB_PRINTER_HOST),
+    parse_routes(settings.POC_PRINT_HUB_PRINTER_ROUTES),
+    settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_NAME,
+    settings.POC_PRINT_HUB_PRIORITY_LANE_STARVATION_LIMIT,
+    settings.POC_PRINT_HUB_PRINTER_FAILOVER_AFTER_SEC
+)
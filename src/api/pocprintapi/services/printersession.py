@@ -0,0 +1,115 @@
+import functools
+import socket
+
+from typing import TYPE_CHECKING, Callable, Optional
+from escpos.exceptions import DeviceNotFoundError
+from pocprintapi.services.metrics import PRINTER_PROBE_SECONDS
+
+if TYPE_CHECKING:
+    from escpos import printer
+
+# errors that mean the printer connection is gone and a reconnect is worth a retry
+RECONNECT_ERRORS = (OSError, DeviceNotFoundError)
+
+def network_printer(host: str, **kwargs) -> "printer.Network":
+    """escpos printer.Network, imported on first use: loading the printer capability database takes ~0.2s"""
+    from escpos import printer
+
+    return printer.Network(host, **kwargs)
+
+class PrinterSession:
+    """Printer connection kept open across several print jobs.
+
+    Opened lazily on first use and reopened only when a job fails with a
+    connection error, so draining a batch costs one TCP handshake instead
+    of one per message. Jobs are retried only if none of their bytes were
+    sent: a job cut off midway would print twice.
+    """
+    def __init__(self, host: str):
+        self.host: str = host
+        self.connects: int = 0
+        self.sent_bytes: int = 0 # handed to the printer connection, of every job and status query
+
+        self._printer: Optional["printer.Network"] = None
+
+    def __enter__(self) -> "PrinterSession":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    @property
+    def is_open(self) -> bool:
+        return self._printer is not None
+
+    @property
+    def printer(self) -> "printer.Network":
+        if self._printer is None:
+            net_print = network_printer(self.host)
+            net_print.open()
+            # every ESC/POS command goes through _raw
+            net_print._raw = functools.partial(self._send, net_print._raw)
+
+            self._printer = net_print
+            self.connects += 1
+
+        return self._printer
+
+    def is_available(self, check_paper_status: bool) -> bool:
+        try:
+            with PRINTER_PROBE_SECONDS.labels("session").time():
+                is_online = self.printer.is_online()
+
+                if not check_paper_status:
+                    return is_online
+
+                is_paper_plenty = self.printer.paper_status() == 2 # Plenty (Paper is adequate)
+
+            return is_online and is_paper_plenty
+        except Exception as ex:
+            print(f"Failed to fetch printer availability status, error: {ex}")
+            self.close()
+            return False
+
+    def run(self, job: Callable[..., None], *args) -> None:
+        """Runs job(printer, *args) on the open connection, reconnects and retries once on connection loss
+        if nothing of the job was sent yet, raises otherwise"""
+        sent_bytes = self.sent_bytes
+
+        try:
+            job(self.printer, *args)
+        except RECONNECT_ERRORS as ex:
+            self.close()
+
+            if self.sent_bytes > sent_bytes:
+                print(f"Printer connection lost after {self.sent_bytes - sent_bytes} bytes of the job were sent, not retrying, error: {ex}")
+                raise
+
+            print(f"Printer connection lost, reconnecting, error: {ex}")
+            job(self.printer, *args)
+
+    def close(self) -> None:
+        if self._printer is None:
+            return
+
+        try:
+            self._printer.close()
+        finally:
+            self._printer = None
+
+    def _send(self, raw: Callable[[bytes], None], msg: bytes) -> None:
+        device = getattr(self._printer, "device", None)
+
+        # stand-ins without a socket take all of it or nothing
+        if not isinstance(device, socket.socket):
+            raw(msg)
+            self.sent_bytes += len(msg)
+            return
+
+        # sendall, counting what the socket took: a send that fails after some of the bytes does not tell how many
+        msg_view = memoryview(msg)
+
+        while len(msg_view) > 0:
+            sent_count = device.send(msg_view)
+            self.sent_bytes += sent_count
+            msg_view = msg_view[sent_count:]
@@ -0,0 +1,162 @@
+import asyncio
+import contextlib
+import os
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from django.conf import settings
+from escpos.constants import (
+    RT_MASK_LOWPAPER, RT_MASK_NOPAPER, RT_MASK_ONLINE, RT_MASK_PAPER, RT_STATUS_ONLINE, RT_STATUS_PAPER
+)
+from pocprintapi.services.jsonfile import read_json_file, write_json_file_atomically
+from pocprintapi.services.metrics import PRINTER_PROBE_SECONDS
+from pocprintapi.services.printersession import network_printer
+
+class PrinterStatusSnapshot:
+    """Status of every pool printer shared between processes through a small JSON file, by printer name.
+
+    Written by `PrinterStatusProber`, read by every API worker and the print
+    queue consumer. The parsed file is cached per process and only re-read
+    when its modification time changes.
+    """
+    def __init__(self, file_path: str, max_age_sec: float):
+        self.file_path: str = file_path
+        self.max_age_sec: float = max_age_sec
+
+        self._lock = threading.Lock()
+        self._mtime_ns: Optional[int] = None
+        self._snapshot: Optional[dict] = None
+
+    def read(self, printer_name: str) -> Optional[dict]:
+        """Returns the latest status of a printer: isOnline, paperStatus, checkedAt and unavailableSince
+        (epoch sec, None while available), or None if missing or stale
+        """
+        try:
+            mtime_ns = os.stat(self.file_path).st_mtime_ns
+        except OSError:
+            return None
+
+        with self._lock:
+            if mtime_ns != self._mtime_ns:
+                self._snapshot = read_json_file(self.file_path)
+                self._mtime_ns = mtime_ns
+
+            snapshot = self._snapshot
+
+        if not isinstance(snapshot, dict):
+            return None
+
+        printer_status = snapshot.get(printer_name)
+
+        # also skips a single printer snapshot written before printer pools
+        if not isinstance(printer_status, dict) or time.time() - printer_status.get("checkedAt", 0) > self.max_age_sec:
+            return None
+
+        return printer_status
+
+    def write(self, printer_statuses: Dict[str, dict]) -> None: # printer name -> status
+        write_json_file_atomically(self.file_path, printer_statuses)
+
+class PrinterStatusProber:
+    """Refreshes the shared printer status snapshot at a fixed interval, probing all printers concurrently"""
+    def __init__(self, snapshot: PrinterStatusSnapshot, printers: List[Tuple[str, str]], interval_sec: float): # name, host
+        self.snapshot: PrinterStatusSnapshot = snapshot
+        self.printers: List[Tuple[str, str]] = printers
+        self.interval_sec: float = interval_sec
+
+        self._stop_event = threading.Event()
+        self._unavailable_since: Dict[str, float] = {}
+
+    def run(self) -> None:
+        """Probes the printer until stopped"""
+        self._stop_event.clear()
+
+        while not self._stop_event.is_set():
+            self.probe()
+            self._stop_event.wait(self.interval_sec)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def probe(self) -> None:
+        with ThreadPoolExecutor(max_workers=len(self.printers)) as executor:
+            probe_results = list(executor.map(lambda name_host: self._probe_printer(name_host[1]), self.printers))
+
+        checked_at = time.time()
+        printer_statuses = {}
+
+        for (name, _), (is_online, paper_status) in zip(self.printers, probe_results):
+            if is_printer_ready(is_online, paper_status):
+                self._unavailable_since.pop(name, None)
+            else:
+                self._unavailable_since.setdefault(name, checked_at)
+
+            printer_statuses[name] = {
+                "isOnline": is_online,
+                "paperStatus": paper_status,
+                "checkedAt": checked_at,
+                "unavailableSince": self._unavailable_since.get(name)
+            }
+
+        self.snapshot.write(printer_statuses)
+
+    def _probe_printer(self, host: str) -> Tuple[bool, int]: # is online, paper status
+        is_online = False
+        paper_status = -1 # unknown
+
+        net_print = network_printer(host, timeout=self.interval_sec)
+
+        try:
+            with PRINTER_PROBE_SECONDS.labels("prober").time():
+                is_online = net_print.is_online()
+                paper_status = net_print.paper_status()
+        except Exception as ex:
+            print(f"Failed to probe printer {host} status, error: {ex}")
+        finally:
+            net_print.close()
+
+        return is_online, paper_status
+
+def is_printer_ready(is_online: bool, paper_status: int) -> bool:
+    """Whether a printer can take print jobs, paper status counts if POC_PRINT_HUB_PRINTER_CHECK_PAPER_STATUS is enabled"""
+    if not settings.POC_PRINT_HUB_PRINTER_CHECK_PAPER_STATUS:
+        return is_online
+
+    return is_online and paper_status == 2 # Plenty (Paper is adequate)
+
+async def aprobe_printer_status(host: str, port: int = 9100, timeout: float = 5.0) -> Tuple[bool, int]: # is online, paper status
+    """Queries printer status over a non-blocking connection, same semantics as escpos is_online/paper_status"""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+
+    try:
+        writer.write(RT_STATUS_ONLINE)
+        online_status = await asyncio.wait_for(reader.read(16), timeout)
+
+        writer.write(RT_STATUS_PAPER)
+        paper_status = await asyncio.wait_for(reader.read(16), timeout)
+    finally:
+        writer.close()
+
+        # the socket is closed once the transport is done with it, a reset or unresponsive printer does not change the status read
+        with contextlib.suppress(OSError, asyncio.TimeoutError):
+            await asyncio.wait_for(writer.wait_closed(), timeout)
+
+    is_online = len(online_status) > 0 and not (online_status[0] & RT_MASK_ONLINE)
+
+    if len(paper_status) == 0:
+        return ( is_online, 2 )
+    if paper_status[0] & RT_MASK_NOPAPER == RT_MASK_NOPAPER:
+        return ( is_online, 0 )
+    if paper_status[0] & RT_MASK_LOWPAPER == RT_MASK_LOWPAPER:
+        return ( is_online, 1 )
+    if paper_status[0] & RT_MASK_PAPER == RT_MASK_PAPER:
+        return ( is_online, 2 )
+
+    return ( is_online, 0 )
+
+printer_status_snapshot = PrinterStatusSnapshot(
+    settings.POC_PRINT_HUB_PRINTER_STATUS_FILE,
+    settings.POC_PRINT_HUB_PRINTER_STATUS_MAX_AGE_SEC
+)
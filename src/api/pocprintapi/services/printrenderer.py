@@ -0,0 +1,224 @@
+import io
+import json
+
+from typing import Dict, List
+from django.conf import settings
+from pocprintapi.models import NotificationMessage, NotificationBodyType, RASTER_BODY_TYPE_NAMES, decode_image_body
+from pocprintapi.services.metrics import RASTER_SECONDS
+from pocprintapi.services.rastercache import raster_cache
+
+class PrintRenderer:
+    """Renders notification messages into ESC/POS bytes without a printer.
+
+    A rendered job is one contiguous buffer, so it can be sent to the
+    printer with a single write. Image, QR code and barcode bodies are
+    rasterized to the printer's width once, then found in the raster cache.
+    """
+    RASTER_VERSION: str = "1" # part of the raster cache key, bumped when rasterizing changes
+    QR_CODE_MAX_MODULE_DOTS: int = 8
+    QR_CODE_BORDER_MODULES: int = 2
+    BARCODE_MAX_MODULE_DOTS: int = 3
+    BARCODE_HEIGHT_DOTS: int = 80
+
+    def __init__(self):
+        # escpos.printer is slow to import, only processes that print need it
+        from escpos import printer
+
+        self._buffer = printer.Dummy()
+
+        # the default profile has no media width, needed to center and to reject oversized images
+        self._raster_buffer = printer.Dummy()
+        self._raster_buffer.profile.profile_data = {
+            **self._raster_buffer.profile.profile_data,
+            "media": {"width": {"pixels": settings.POC_PRINT_HUB_PRINTER_WIDTH_DOTS}}
+        }
+
+    def render(self, message: NotificationMessage, cut: bool = False) -> bytes:
+        self._buffer.clear()
+
+        # every job starts with an unknown printer code page, same as on a fresh connection
+        self._buffer.magic.encoding = None
+
+        # header
+        self._buffer.textln(settings.POC_PRINT_HUB_PRINTER_MESSAGE_SEPARATOR)
+        self._buffer.textln(f"title: {message.title}" if message.copies == 1 else f"title: {message.title} ×{message.copies}")
+
+        # body
+        if message.body_type.upper() in RASTER_BODY_TYPE_NAMES:
+            self._buffer._raw(self._get_raster(message))
+        else:
+            for body_print_line in self._build_body_print_lines(message):
+                self._buffer.textln(body_print_line)
+
+        # attributes
+        self._buffer.textln(f"origin: {message.origin}")
+        self._buffer.textln(f"timestamp: {message.timestamp}")
+
+        if message.copies > 1:
+            self._buffer.textln(f"first seen: {message.first_seen_at}")
+            self._buffer.textln(f"last seen: {message.last_seen_at}")
+
+        if cut:
+            self._buffer.cut()
+
+        return self._buffer.output
+
+    def render_digest(self, messages: List[NotificationMessage], group_by_origin: bool = False, cut: bool = False) -> bytes:
+        """Renders several messages as one job: a shared header, then a compact entry per message.
+
+        Grouped by origin, the origin is printed once per group instead of
+        on every entry. Groups are in order of their first message.
+        """
+        self._buffer.clear()
+        self._buffer.magic.encoding = None
+
+        # shared header
+        self._buffer.textln(settings.POC_PRINT_HUB_PRINTER_MESSAGE_SEPARATOR)
+        self._buffer.textln(f"digest: {len(messages)} messages")
+
+        if group_by_origin:
+            origin_messages: Dict[str, List[NotificationMessage]] = {}
+
+            for message in messages:
+                origin_messages.setdefault(message.origin, []).append(message)
+
+            for origin, messages_of_origin in origin_messages.items():
+                self._buffer.textln(f"origin: {origin} ({len(messages_of_origin)})")
+
+                for message in messages_of_origin:
+                    self._render_digest_entry(message, f"{self._get_digest_time(message)} {message.title}")
+        else:
+            for message in messages:
+                self._render_digest_entry(message, f"{self._get_digest_time(message)} {message.origin} | {message.title}")
+
+        self._buffer.textln(settings.POC_PRINT_HUB_PRINTER_MESSAGE_SEPARATOR)
+
+        if cut:
+            self._buffer.cut()
+
+        return self._buffer.output
+
+    def _render_digest_entry(self, message: NotificationMessage, entry_line: str) -> None:
+        self._buffer.textln(entry_line if message.copies == 1 else f"{entry_line} ×{message.copies}")
+
+        if message.body_type.upper() in RASTER_BODY_TYPE_NAMES:
+            self._buffer._raw(self._get_raster(message))
+            return
+
+        for body_print_line in self._build_body_print_lines(message):
+            self._buffer.textln(f"  {body_print_line}")
+
+    def _get_digest_time(self, message: NotificationMessage) -> str:
+        return f"[{message.timestamp:%H:%M:%S}]"
+
+    def _build_body_print_lines(self, message: NotificationMessage) -> List[str]:
+        match message.body_type.upper():
+            case NotificationBodyType.KEYVALUE.name:
+                return self._build_key_value_body_messages(message)
+            case NotificationBodyType.PLAINTEXT.name:
+                return [self._build_plain_text_body_message(message)]
+            case _:
+                return [self._build_plain_text_body_message(message)]
+
+    def _get_raster(self, message: NotificationMessage) -> bytes:
+        """ESC/POS bytes of an image, QR code or barcode body, from the raster cache if rendered before"""
+        body_type = message.body_type.upper()
+        key = raster_cache.key(self.RASTER_VERSION, body_type, f"{settings.POC_PRINT_HUB_PRINTER_WIDTH_DOTS}", message.body)
+        raster = raster_cache.get(key)
+
+        if raster is None:
+            with RASTER_SECONDS.labels(body_type.lower()).time():
+                raster = self._rasterize(body_type, message.body)
+
+            raster_cache.set(key, raster)
+
+        return raster
+
+    def _rasterize(self, body_type: str, body: str) -> bytes:
+        self._raster_buffer.clear()
+
+        match body_type:
+            case NotificationBodyType.IMAGE.name:
+                self._raster_buffer.image(self._build_image(body), center=True)
+            case NotificationBodyType.QRCODE.name:
+                self._raster_buffer.image(self._build_qr_code_image(body), center=True)
+            case NotificationBodyType.BARCODE.name:
+                self._raster_buffer.image(self._build_barcode_image(body), center=True)
+
+                # human-readable content under the bars
+                self._raster_buffer.set(align="center")
+                self._raster_buffer.textln(body)
+                self._raster_buffer.set(align="left")
+
+        return self._raster_buffer.output
+
+    def _build_image(self, body: str):
+        from PIL import Image, ImageOps, UnidentifiedImageError
+
+        try:
+            image = Image.open(io.BytesIO(decode_image_body(body)))
+            image = ImageOps.exif_transpose(image)
+        except UnidentifiedImageError as ex:
+            # an OSError, which would otherwise pass for a printer connection error
+            raise ValueError(f"{ex}")
+
+        # only scaled down; escpos flattens transparency on white, then dithers it to black and white
+        if image.width > settings.POC_PRINT_HUB_PRINTER_WIDTH_DOTS:
+            height = max(round(image.height * settings.POC_PRINT_HUB_PRINTER_WIDTH_DOTS / image.width), 1)
+            image = image.resize((settings.POC_PRINT_HUB_PRINTER_WIDTH_DOTS, height), Image.Resampling.LANCZOS)
+
+        return image
+
+    def _build_qr_code_image(self, body: str):
+        import qrcode
+
+        qr_code = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, border=self.QR_CODE_BORDER_MODULES)
+        qr_code.add_data(body)
+        qr_code.make(fit=True)
+
+        # whole dots per module, as large as fits
+        modules = qr_code.modules_count + 2 * self.QR_CODE_BORDER_MODULES
+        qr_code.box_size = min(settings.POC_PRINT_HUB_PRINTER_WIDTH_DOTS // modules, self.QR_CODE_MAX_MODULE_DOTS)
+
+        if qr_code.box_size < 1:
+            raise ValueError(f"QR code of {modules} modules wider than the printer")
+
+        return qr_code.make_image().get_image()
+
+    def _build_barcode_image(self, body: str):
+        from barcode import Code128
+        from PIL import Image, ImageDraw
+
+        # drawn from the module pattern: whole dots per module, as wide as fits
+        modules = Code128(body).build()[0]
+        module_dots = min(settings.POC_PRINT_HUB_PRINTER_WIDTH_DOTS // len(modules), self.BARCODE_MAX_MODULE_DOTS)
+
+        if module_dots < 1:
+            raise ValueError(f"Barcode of {len(modules)} modules wider than the printer")
+
+        image = Image.new("1", (len(modules) * module_dots, self.BARCODE_HEIGHT_DOTS), 1)
+        draw = ImageDraw.Draw(image)
+
+        for module_index, module in enumerate(modules):
+            if module == "1":
+                draw.rectangle(
+                    (module_index * module_dots, 0, (module_index + 1) * module_dots - 1, self.BARCODE_HEIGHT_DOTS - 1),
+                    fill=0
+                )
+
+        return image
+
+    def _build_key_value_body_messages(self, message: NotificationMessage) -> List[str]:
+        if message.body_items is not None:
+            return [f"{key}: {value}" for key, value in message.body_items]
+
+        body_print_lines = []
+        body_messages = json.loads(message.body)
+
+        for key, value in body_messages.items():
+            body_print_lines.append(f"{key}: {value}")
+
+        return body_print_lines
+
+    def _build_plain_text_body_message(self, message: NotificationMessage) -> str:
+        return f"body: {message.body}"
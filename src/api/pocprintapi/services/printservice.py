@@ -1,28 +1,61 @@
 import json
 import pika
-import uuid
+import threading
+import time
 
-from typing import List, Tuple
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Callable, Deque, Dict, List, Optional, Tuple, Union
+from celery import current_app
 from django.conf import settings
-from escpos import printer
+from django.http import HttpResponse
+from pika.adapters.blocking_connection import BlockingChannel
 from rest_framework import status
 from rest_framework.response import Response
-from pocprintapi.models import NotificationMessage, NotificationBodyType
+from pocprintapi.models import NotificationMessage, NotificationPriority
+from pocprintapi.services.messagecodec import message_codec
+from pocprintapi.services.messagededuplicator import message_deduplicator
+from pocprintapi.services.metrics import (
+    DEAD_LETTERED_MESSAGES, DEDUP_COALESCED_MESSAGES, DEDUP_SUPPRESSED_MESSAGES, PRINT_DIGEST_SECONDS, PRINT_MESSAGE_SECONDS, 
+    PRINTED_MESSAGES, PRINTER_BYTES_SENT, PRINTER_PROBE_SECONDS, QUEUE_WAIT_SECONDS, export_metrics, record_queue_depths
+)
+from pocprintapi.services.printerpool import PoolPrinter, printer_pool
+from pocprintapi.services.printersession import PrinterSession, network_printer
+from pocprintapi.services.printerstatus import is_printer_ready, printer_status_snapshot
+from pocprintapi.services.profiling import span
+from pocprintapi.services.printrenderer import PrintRenderer
+from pocprintapi.services.prioritylanes import PriorityLanes, priority_lanes
+from pocprintapi.services.publishspool import PublishSpoolFullError, SpoolMessage, publish_spool
+from pocprintapi.services.republishprogress import republish_progress
+from pocprintapi.services.queuestatuscache import queue_status_cache
+from pocprintapi.services.rabbitpublisher import RECONNECT_ERRORS, RabbitPublisher, build_connection_parameters, open_connection
+from pocprintapi.services.tenantscheduler import tenant_scheduler
+
+if TYPE_CHECKING:
+    from escpos import printer
 
 class PrintService:
     MIN_FEED_N: int = 5
     MAX_FEED_N: int = 255
-    PRINTER_NAME: str = "RP326"
+    REPUBLISH_TASK_NAME: str = "pocprintapi.celery.republish_dead_queue_messages"
+    REPUBLISH_INACTIVITY_TIMEOUT_SEC: float = 1.0
+    REPUBLISH_PROGRESS_INTERVAL_SEC: float = 1.0
+    CONSUMER_POLL_INTERVAL_SEC: float = 1.0
 
-    def publish(self, request_body: bytes) -> Response:
-        """Publishes notification messages to RabbitMQ"""
-        initial_body_dict = json.loads(request_body)
-        body_dict = {k.lower(): v for k, v in initial_body_dict.items()}
+    def __init__(self):
+        self._renderer: PrintRenderer = None
+        self._is_consuming: bool = False
+        self._consumers: Dict[str, Tuple[pika.BlockingConnection, BlockingChannel]] = {} # by printer name
+
+    def publish(self, request_body: bytes, tenant_id: Optional[str] = None) -> Response:
+        """Publishes notification messages to RabbitMQ, to the lane of their priority and pool printer"""
+        with span("parse"):
+            message, errors = NotificationMessage.parse_request(json.loads(request_body))
+
+        if message is not None:
+            errors = self._validate_printer_target(message)
 
-        message = NotificationMessage.from_json(body_dict)
-        message.id = uuid.uuid4()
-        
-        errors = message.validate()
         if len(errors) > 0:
             return Response(
                 {
@@ -32,13 +65,32 @@ class PrintService:
                 status.HTTP_400_BAD_REQUEST
             )
         
+        queue_name, printer_name = self._route_message(message, tenant_id)
+        response_body = {
+            "messageId": message.id,
+            "lane": priority_lanes.lane_name(message.priority),
+            "printer": printer_name
+        }
+
+        if message_deduplicator.is_applied("publish"):
+            self._start_coalesced_message_flusher()
+            duplicate_of = self._suppress_duplicate(message, queue_name, "publish")
+
+            if duplicate_of is not None:
+                response_body["duplicateOf"] = duplicate_of
+                return Response(response_body, status.HTTP_200_OK)
+
         try:
             self._publish_message(
                 message,
-                settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_NAME,
-                settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_DURABLE
+                queue_name,
+                settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_DURABLE,
+                tenant_id
             )
         except Exception as ex:
+            if message_deduplicator.is_applied("publish"):
+                message_deduplicator.discard(message)
+
             return Response(
                 {
                     "message": "Failed to publish message to RabbitMQ",
@@ -47,56 +99,143 @@ class PrintService:
                 status.HTTP_500_INTERNAL_SERVER_ERROR
             )
         
-        return Response(
-            {
-                "messageId": message.id
-            }, 
-            status.HTTP_200_OK
-        )
+        return Response(response_body, status.HTTP_200_OK)
     
-    def status(self) -> Response:
-        """Fetches printer status: name, online, paper status"""
+    def publish_batch(self, request_body: bytes, content_type: str, tenant_id: Optional[str] = None) -> Response:
+        """Publishes a JSON array or an NDJSON stream of notification messages to RabbitMQ in one batch"""
         try:
-            net_print = printer.Network(settings.POC_PRINT_HUB_PRINTER_HOST)
-
-            is_online = net_print.is_online()
-            paper_status = net_print.paper_status()
-
-            paper_status_text = ""
-            match paper_status:
-                case 0:
-                    paper_status_text = "Empty"
-                case 1:
-                    paper_status_text = "Near End"
-                case 2:
-                    paper_status_text = "Plenty"
-                case _:
-                    paper_status_text = "Invalid"
+            with span("parse"):
+                items = self._parse_batch_items(request_body, content_type)
+        except ValueError as ex:
+            return Response(
+                {
+                    "message": "Invalid request",
+                    "errors": f"{ex}"
+                }, 
+                status.HTTP_400_BAD_REQUEST
+            )
 
-        except Exception as ex:
+        if len(items) == 0 or len(items) > settings.POC_PRINT_HUB_PUBLISH_BATCH_MAX_SIZE:
             return Response(
                 {
-                    "name": self.PRINTER_NAME,
-                    "isOnline": False,
-                    "paperStatus": "N/A"
+                    "message": "Invalid request",
+                    "errors": f"Batch size out of range: should be 1 <= n <= {settings.POC_PRINT_HUB_PUBLISH_BATCH_MAX_SIZE}"
                 }, 
-                status.HTTP_200_OK
+                status.HTTP_400_BAD_REQUEST
             )
-        finally:
-            if net_print is not None:
-                net_print.close()
+
+        is_deduplicating = message_deduplicator.is_applied("publish")
+
+        if is_deduplicating:
+            self._start_coalesced_message_flusher()
+
+        results = []
+        # queue name -> priority, printer name, [(result, message)]
+        queue_items: Dict[str, Tuple[NotificationPriority, Optional[str], List[Tuple[dict, NotificationMessage]]]] = {}
+
+        for index, item in enumerate(items):
+            result = { "index": index }
+            results.append(result)
+
+            message, errors = NotificationMessage.parse_request(item)
+
+            if message is not None:
+                errors = self._validate_printer_target(message)
+
+            if len(errors) > 0:
+                result["errors"] = ", ".join(errors)
+                continue
+
+            queue_name, printer_name = self._route_message(message, tenant_id)
+
+            if is_deduplicating:
+                duplicate_of = self._suppress_duplicate(message, queue_name, "publish")
+
+                if duplicate_of is not None:
+                    result["messageId"] = message.id
+                    result["lane"] = priority_lanes.lane_name(message.priority)
+                    result["printer"] = printer_name
+                    result["duplicateOf"] = duplicate_of
+                    continue
+
+            queue_items.setdefault(queue_name, (message.priority, printer_name, []))[2].append((result, message))
+
+        response_status = status.HTTP_200_OK
+
+        # one transaction per queue: a lane that fails to publish does not affect the others
+        for queue_name, (priority, printer_name, valid_items) in queue_items.items():
+            with span("encode"):
+                bodies = [message_codec.encode(message) for _, message in valid_items]
+
+            properties = self._build_message_properties(priority, tenant_id)
+
+            try:
+                returned_indexes = set()
+
+                if not self._spool_messages([(queue_name, body, properties) for body in bodies]):
+                    returned_indexes = set(RabbitPublisher.instance().publish_batch(
+                        queue_name,
+                        settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_DURABLE,
+                        bodies,
+                        properties
+                    ))
+
+                for index, (result, message) in enumerate(valid_items):
+                    # unroutable even after declaring the queue again: dropped by the broker
+                    if index in returned_indexes:
+                        response_status = status.HTTP_500_INTERNAL_SERVER_ERROR
+                        result["errors"] = f"Failed to publish message to RabbitMQ: returned as unroutable from queue {queue_name}"
+
+                        if is_deduplicating:
+                            message_deduplicator.discard(message)
+
+                        continue
+
+                    result["messageId"] = message.id
+                    result["lane"] = priority_lanes.lane_name(priority)
+                    result["printer"] = printer_name
+            except Exception as ex:
+                response_status = status.HTTP_500_INTERNAL_SERVER_ERROR
+
+                for result, message in valid_items:
+                    result["errors"] = f"Failed to publish message to RabbitMQ: {ex}"
+
+                    if is_deduplicating:
+                        message_deduplicator.discard(message)
+
+        suppressed_count = sum(1 for result in results if "duplicateOf" in result)
+        published_count = sum(1 for result in results if "messageId" in result) - suppressed_count
 
         return Response(
             {
-                "name": self.PRINTER_NAME,
-                "isOnline": is_online,
-                "paperStatus": paper_status_text
+                "published": published_count,
+                "suppressed": suppressed_count,
+                "failed": len(results) - published_count - suppressed_count,
+                "results": results
             }, 
+            response_status
+        )
+    
+    def status(self) -> Response:
+        """Fetches the status of every pool printer: name, online, paper status. Served from the shared snapshot when it is fresh"""
+        if len(printer_pool.printers) == 1:
+            printer_statuses = [self._get_printer_status(printer_pool.default)]
+        else:
+            with ThreadPoolExecutor(max_workers=len(printer_pool.printers)) as executor:
+                printer_statuses = list(executor.map(self._get_printer_status, printer_pool.printers))
+
+        return Response(
+            self._build_printer_pool_status_body(printer_statuses), 
             status.HTTP_200_OK
         )
 
-    def feed(self, n_times: str) -> Response:
-        """Feeds printer paper *n* times (5 <= n <= 255)"""
+    def feed(self, n_times: str, printer_name: Optional[str] = None) -> Response:
+        """Feeds printer paper *n* times (5 <= n <= 255), on the default pool printer unless named"""
+        pool_printer = printer_pool.get(printer_name)
+
+        if pool_printer is None:
+            return self._response_unknown_printer()
+
         try:
             n_times_int = int(n_times)
         except ValueError:
@@ -117,8 +256,10 @@ class PrintService:
                 status.HTTP_400_BAD_REQUEST
             )
 
+        net_print = None
+
         try:
-            net_print = printer.Network(settings.POC_PRINT_HUB_PRINTER_HOST)
+            net_print = network_printer(pool_printer.host)
             net_print.print_and_feed(n_times_int)
         except Exception as ex:
             return Response(
@@ -139,10 +280,17 @@ class PrintService:
             status.HTTP_200_OK
         )
 
-    def cut(self) -> Response:
-        """Cuts printer paper. Paper is fed n*6 times before being cut"""
+    def cut(self, printer_name: Optional[str] = None) -> Response:
+        """Cuts printer paper, on the default pool printer unless named. Paper is fed n*6 times before being cut"""
+        pool_printer = printer_pool.get(printer_name)
+
+        if pool_printer is None:
+            return self._response_unknown_printer()
+
+        net_print = None
+
         try:
-            net_print = printer.Network(settings.POC_PRINT_HUB_PRINTER_HOST)
+            net_print = network_printer(pool_printer.host)
             net_print.cut()
         except Exception as ex:
             return Response(
@@ -164,27 +312,67 @@ class PrintService:
         )
 
     def process_queue_messages(self) -> None:
-        """Processes all messages from the RabbitMQ print queue"""
-        if not self._is_printer_available():
-            print(f'Failed to process messages, error: printer not available')
+        """Processes messages from the RabbitMQ print queues, each pool printer concurrently over its own printer session"""
+        is_deduplicating = message_deduplicator.is_applied("drain")
+
+        if is_deduplicating:
+            # the previous drain may have run in another Celery worker process
+            message_deduplicator.load()
+            self._publish_coalesced_messages("drain")
+
+        self._move_retired_tenant_queue_messages()
+
+        try:
+            if len(printer_pool.printers) == 1:
+                self._process_printer_queue_messages(printer_pool.default)
+            else:
+                with ThreadPoolExecutor(max_workers=len(printer_pool.printers)) as executor:
+                    list(executor.map(self._process_printer_queue_messages, printer_pool.printers))
+        finally:
+            if is_deduplicating:
+                message_deduplicator.save()
+
+    def _process_printer_queue_messages(self, pool_printer: PoolPrinter) -> None:
+        with PrinterSession(pool_printer.host) as printer_session:
+            self._process_queue_messages(printer_session, pool_printer)
+
+    def _process_queue_messages(self, printer_session: PrinterSession, pool_printer: PoolPrinter) -> None:
+        is_available = self._is_printer_available(printer_session, pool_printer)
+        printer_pool.report_availability(pool_printer, is_available)
+
+        if not is_available and not printer_pool.is_failed_over(pool_printer):
+            print(f'Failed to process messages, error: printer {pool_printer.name} not available')
             return
         
         parameters = self._build_connection_parameters()
+        connection = None
 
         try:
-            connection = pika.BlockingConnection(parameters)
+            connection = open_connection(parameters)
             channel = connection.channel()
 
-            print_queue = channel.queue_declare(
-                queue=settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_NAME, 
-                durable=settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_DURABLE
-            )
+            if not is_available:
+                self._fail_over_printer_queue_messages(channel, pool_printer)
+                return
+
+            consumed_lanes = self._get_consumed_lanes(pool_printer)
+            queue_message_counts = {}
+
+            for lanes in consumed_lanes:
+                for priority in PriorityLanes.PRIORITIES:
+                    for queue_name in self._get_lane_queue_names(lanes, priority):
+                        lane_queue = channel.queue_declare(
+                            queue=queue_name, 
+                            durable=settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_DURABLE
+                        )
+                        queue_message_counts[queue_name] = lane_queue.method.message_count
 
-            message_count = print_queue.method.message_count
             processed_message_count = 0
+            # in digest mode, messages are printed once the pass is drained: queue name, method frame, properties, body
+            digest_deliveries: List[Tuple[str, object, pika.BasicProperties, bytes]] = []
 
-            if message_count == 0:
-                print(f"Nothing to process: {settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_NAME} queue is empty")
+            if sum(queue_message_counts.values()) == 0:
+                print(f"Nothing to process: {pool_printer.name} printer queues are empty")
                 return
 
             channel.queue_declare(
@@ -192,240 +380,948 @@ class PrintService:
                 durable=settings.POC_PRINT_HUB_RABBIT_MQ_DEAD_QUEUE_DURABLE
             )
 
-            for method_frame, properties, body in channel.consume(settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_NAME):
-                try:
-                    self._print_message(body)
-                except Exception as ex:
-                    print(
-                        f"Failed to process {settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_NAME} queue message: {ex}. "\
-                        f"Delivery properties: {method_frame}. Publishing to the error queue."
-                    )
-                    channel.basic_publish(
-                        exchange="",
-                        routing_key=settings.POC_PRINT_HUB_RABBIT_MQ_DEAD_QUEUE_NAME,
-                        body=json.dumps(json.loads(body)),
-                        properties=pika.BasicProperties(
-                            delivery_mode=pika.DeliveryMode.Persistent
-                        )
-                    )
+            # one message at a time, so that every message comes from the lane picked for it
+            while processed_message_count < settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_BATCH_SIZE:
+                queue_name = self._pick_queue(
+                    pool_printer, 
+                    consumed_lanes, 
+                    lambda queue_name: queue_message_counts.get(queue_name, 0) > 0
+                )
 
-                channel.basic_ack(method_frame.delivery_tag)
+                if queue_name is None:
+                    break
+
+                method_frame, properties, body = channel.basic_get(queue_name)
+
+                if method_frame is None:
+                    queue_message_counts[queue_name] = 0
+                    continue
+
+                queue_message_counts[queue_name] = method_frame.message_count # remaining in the lane
+
+                if settings.POC_PRINT_HUB_DIGEST_ENABLED:
+                    digest_deliveries.append((queue_name, method_frame, properties, body))
+                else:
+                    self._process_queue_message(channel, printer_session, queue_name, method_frame, properties, body)
 
                 processed_message_count += 1
-                message_count -= 1
 
-                if message_count == 0 or processed_message_count >= settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_BATCH_SIZE:
-                    break
-            
-            channel.cancel()
+            if len(digest_deliveries) >= settings.POC_PRINT_HUB_DIGEST_MIN_MESSAGES:
+                self._process_digest_queue_messages(channel, printer_session, digest_deliveries)
+            else:
+                for queue_name, method_frame, properties, body in digest_deliveries:
+                    self._process_queue_message(channel, printer_session, queue_name, method_frame, properties, body)
         finally:
-            if connection is not None:
-                channel.close()
+            if connection is not None and connection.is_open:
                 connection.close()
 
-    def republish_dead_queue_messages(self) -> Response:
-        """Republishes all messages from the error to the print RabbitMQ queue"""
-        parameters = self._build_connection_parameters()
+    def consume_queue_messages(self) -> None:
+        """Consumes the RabbitMQ print queues continuously, printing messages as they arrive, until stopped.
 
-        try:
-            connection = pika.BlockingConnection(parameters)
-            channel = connection.channel()
+        Runs a consumer loop per pool printer, each on its own connections.
+        """
+        self._is_consuming = True
 
-            dead_letter_queue = channel.queue_declare(
-                queue=settings.POC_PRINT_HUB_RABBIT_MQ_DEAD_QUEUE_NAME, 
-                durable=settings.POC_PRINT_HUB_RABBIT_MQ_DEAD_QUEUE_DURABLE
-            )
+        if message_deduplicator.is_applied("drain"):
+            message_deduplicator.load()
 
-            message_count = dead_letter_queue.method.message_count
-            republished_message_count = 0
+        try:
+            self._consume_pool_queue_messages()
+        finally:
+            if message_deduplicator.is_applied("drain"):
+                message_deduplicator.save()
 
-            if message_count == 0:
-                return Response(
-                    {
-                        "message": f"Nothing to process: {settings.POC_PRINT_HUB_RABBIT_MQ_DEAD_QUEUE_NAME} queue is empty"
-                    }, 
-                    status.HTTP_200_OK
-            )
+    def _consume_pool_queue_messages(self) -> None:
+        if len(printer_pool.printers) == 1:
+            self._consume_printer_queue_messages(printer_pool.default)
+            return
 
-            channel.queue_declare(
-                queue=settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_NAME, 
-                durable=settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_DURABLE
-            )
+        consumer_threads = [
+            threading.Thread(target=self._consume_printer_queue_messages, args=(pool_printer,), daemon=True)
+            for pool_printer in printer_pool.printers
+        ]
 
-            failed_messages = []
+        for consumer_thread in consumer_threads:
+            consumer_thread.start()
 
-            for method_frame, properties, body in channel.consume(settings.POC_PRINT_HUB_RABBIT_MQ_DEAD_QUEUE_NAME):
+        # joins with a timeout, so that the main thread keeps handling stop signals
+        while any(consumer_thread.is_alive() for consumer_thread in consumer_threads):
+            for consumer_thread in consumer_threads:
+                consumer_thread.join(timeout=0.5)
+
+    def _consume_printer_queue_messages(self, pool_printer: PoolPrinter) -> None:
+        with PrinterSession(pool_printer.host) as printer_session:
+            while self._is_consuming:
                 try:
-                    channel.basic_publish(
-                        exchange="",
-                        routing_key=settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_NAME,
-                        body=json.dumps(json.loads(body)),
-                        properties=pika.BasicProperties(
-                            delivery_mode=pika.DeliveryMode.Persistent
-                        )
-                    )
-                    republished_message_count += 1
-                except Exception as ex:
+                    self._consume_queue_messages(printer_session, pool_printer)
+                except RECONNECT_ERRORS as ex:
+                    if not self._is_consuming:
+                        break
+
                     print(
-                        f"Failed to process {settings.POC_PRINT_HUB_RABBIT_MQ_DEAD_QUEUE_NAME} queue message: {ex}. "\
-                        f"Delivery properties: {method_frame}. Republishing to the error queue."
+                        f"Print queue consumer connection lost ({pool_printer.name} printer), error: {ex}. "\
+                        f"Reconnecting in {settings.POC_PRINT_HUB_QUEUE_RETRY_DELAY_SEC}s."
                     )
-                    failed_messages.append(json.dumps(json.loads(body)))
+                    time.sleep(settings.POC_PRINT_HUB_QUEUE_RETRY_DELAY_SEC)
 
-                channel.basic_ack(method_frame.delivery_tag)
-                message_count -= 1
+    def stop_consuming(self) -> None:
+        """Stops consume_queue_messages once the messages being printed are done. Safe to call from a signal handler"""
+        self._is_consuming = False
 
-                if message_count == 0:
-                    break
+        for connection, channel in list(self._consumers.values()):
+            try:
+                connection.add_callback_threadsafe(channel.stop_consuming)
+            except Exception as ex:
+                print(f"Failed to stop print queue consumer gracefully, error: {ex}")
 
-            for message in failed_messages:
-                channel.basic_publish(
-                    exchange="",
-                    routing_key=settings.POC_PRINT_HUB_RABBIT_MQ_DEAD_QUEUE_NAME,
-                    body=message,
-                    properties=pika.BasicProperties(
-                        delivery_mode=pika.DeliveryMode.Persistent
-                    )
-                )
+    def start_republish_dead_queue_messages(self, rate_limit_per_sec: str) -> Response:
+        """Starts republishing all messages from the error to the print RabbitMQ queue as a background job"""
+        try:
+            rate_limit_per_sec_float = float(rate_limit_per_sec)
+        except (TypeError, ValueError):
+            return Response(
+                {
+                    "message": "Invalid request",
+                    "errors": "Invalid 'ratePerSec' type: should be 'float'"
+                }, 
+                status.HTTP_400_BAD_REQUEST
+            )
+
+        progress = republish_progress.read()
 
+        if progress is not None and progress["state"] in ["queued", "running"]:
             return Response(
                 {
-                    "message": 
-                        f"Command 'Republish Dead Letter messages' completed. "\
-                        f"Republished: {republished_message_count}, failed: {len(failed_messages)}."
+                    "message": "Command 'Republish Dead Letter messages' is already in progress",
+                    "progress": progress
                 }, 
-                status.HTTP_200_OK
+                status.HTTP_409_CONFLICT
             )
-        finally:
-            if connection is not None:
-                channel.close()
-                connection.close()
 
-    def get_queue_status(self) -> Response:
-        """Fetches queue status: is online, message count"""
-        print_queue_status = self._get_queue_message_count(settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_NAME)
-        dead_queue_status = self._get_queue_message_count(settings.POC_PRINT_HUB_RABBIT_MQ_DEAD_QUEUE_NAME)
+        try:
+            republish_progress.write(republish_progress.build("queued"))
+            self._start_republish_task(rate_limit_per_sec_float)
+        except Exception as ex:
+            republish_progress.clear()
+            return Response(
+                {
+                    "message": "Failed to start 'Republish Dead Letter messages' command",
+                    "errors": f"{ex}"
+                }, 
+                status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
 
         return Response(
             {
-                "print": {
-                    "isOnline": print_queue_status[0],
-                    "count": print_queue_status[1]
-                },
-                "deadLetter": {
-                    "isOnline": dead_queue_status[0],
-                    "count": dead_queue_status[1]
-                }
+                "message": "Command 'Republish Dead Letter messages' started. Track progress via 'api/queues/republish/status'."
             }, 
             status.HTTP_200_OK
         )
 
-    def _get_queue_message_count(self, queue_name: str) -> Tuple[bool, int]: # is success, count
-        parameters = self._build_connection_parameters()
-        message_count: int = 0
+    def _start_republish_task(self, rate_limit_per_sec: float) -> None:
+        # without RabbitMQ there is no Celery worker: the embedded backend republishes in the background of this process
+        if settings.POC_PRINT_HUB_QUEUE_BACKEND == "database":
+            threading.Thread(target=self.republish_dead_queue_messages, args=(rate_limit_per_sec,), daemon=True).start()
+            return
+
+        current_app.send_task(self.REPUBLISH_TASK_NAME, args=[rate_limit_per_sec])
+
+    def get_republish_status(self) -> Response:
+        """Fetches progress of the latest republish job"""
+        progress = republish_progress.read()
+
+        if progress is None:
+            return Response(
+                {
+                    "message": "Command 'Republish Dead Letter messages' has not been run"
+                }, 
+                status.HTTP_404_NOT_FOUND
+            )
+
+        return Response(progress, status.HTTP_200_OK)
+
+    def republish_dead_queue_messages(self, rate_limit_per_sec: float = 0) -> None:
+        """Republishes all messages from the error to the print RabbitMQ queue.
+
+        Streams the error queue in chunks of at most POC_PRINT_HUB_REPUBLISH_CHUNK_SIZE
+        unacked messages, forwards message bytes as they are and acks a chunk only once
+        the broker has committed its republish.
+        """
+        progress = republish_progress.build("running")
+        republish_progress.write(progress)
+
+        connection = open_connection(self._build_connection_parameters())
 
         try:
-            connection = pika.BlockingConnection(parameters)
-            channel = connection.channel()
+            consume_channel = connection.channel()
+            consume_channel.basic_qos(prefetch_count=settings.POC_PRINT_HUB_REPUBLISH_CHUNK_SIZE)
 
-            queue_info = channel.queue_declare(queue=queue_name, passive=True)
-            message_count = queue_info.method.message_count
+            dead_letter_queue = consume_channel.queue_declare(
+                queue=settings.POC_PRINT_HUB_RABBIT_MQ_DEAD_QUEUE_NAME, 
+                durable=settings.POC_PRINT_HUB_RABBIT_MQ_DEAD_QUEUE_DURABLE
+            )
+
+            # messages that fail again while printing land back in the error queue: only the initial depth is drained
+            message_count = dead_letter_queue.method.message_count
+            progress["total"] = message_count
+
+            if message_count == 0:
+                print(f"Nothing to process: {settings.POC_PRINT_HUB_RABBIT_MQ_DEAD_QUEUE_NAME} queue is empty")
+                progress["state"] = "completed"
+                return
+
+            publish_channel = connection.channel()
+
+            for priority in PriorityLanes.PRIORITIES:
+                for queue_name in self._get_lane_queue_names(priority_lanes, priority):
+                    publish_channel.queue_declare(
+                        queue=queue_name, 
+                        durable=settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_DURABLE
+                    )
+
+            publish_channel.tx_select()
+
+            chunk_message_count = 0
+            chunk_last_delivery_tag = None
+            chunk_started_at = time.monotonic()
+            next_publish_at = time.monotonic()
+
+            for method_frame, properties, body in consume_channel.consume(
+                settings.POC_PRINT_HUB_RABBIT_MQ_DEAD_QUEUE_NAME, 
+                inactivity_timeout=self.REPUBLISH_INACTIVITY_TIMEOUT_SEC
+            ):
+                if method_frame is not None:
+                    if rate_limit_per_sec > 0:
+                        connection.sleep(max(next_publish_at - time.monotonic(), 0))
+                        next_publish_at = max(next_publish_at, time.monotonic()) + 1 / rate_limit_per_sec
+
+                    # back to the lane, and tenant sub-queue, the message was first published to
+                    publish_channel.basic_publish(
+                        exchange="",
+                        routing_key=self._route_queue_message(properties),
+                        body=body,
+                        properties=self._build_republish_properties(properties)
+                    )
+
+                    chunk_message_count += 1
+                    chunk_last_delivery_tag = method_frame.delivery_tag
+                    message_count -= 1
+
+                is_drained = method_frame is None or message_count == 0
+                is_chunk_due = chunk_message_count >= settings.POC_PRINT_HUB_REPUBLISH_CHUNK_SIZE \
+                    or time.monotonic() - chunk_started_at >= self.REPUBLISH_PROGRESS_INTERVAL_SEC
+
+                if chunk_message_count > 0 and (is_drained or is_chunk_due):
+                    publish_channel.tx_commit()
+                    consume_channel.basic_ack(chunk_last_delivery_tag, multiple=True)
+
+                    progress["republished"] += chunk_message_count
+                    republish_progress.write(progress)
+
+                    chunk_message_count = 0
+                    chunk_started_at = time.monotonic()
+
+                if is_drained:
+                    break
+
+            consume_channel.cancel()
+            progress["state"] = "completed"
         except Exception as ex:
-            print(f"Failed to fetch {queue_name} queue status, error: {ex}")
-            return ( False, 0 )
+            # uncommitted messages are not acked, closing the connection returns them to the error queue
+            print(f"Failed to republish {settings.POC_PRINT_HUB_RABBIT_MQ_DEAD_QUEUE_NAME} queue messages, error: {ex}")
+            progress["state"] = "failed"
+            progress["error"] = f"{ex}"
         finally:
-            if connection is not None:
-                channel.close()
+            republish_progress.write(progress)
+
+            if connection.is_open:
                 connection.close()
 
-        return ( True, message_count )
+        print(
+            f"Command 'Republish Dead Letter messages' {progress['state']}. "\
+            f"Republished: {progress['republished']} of {progress['total']}."
+        )
 
-    def _print_message(self, body) -> None:
-        body_dict = json.loads(body)
-        message = NotificationMessage.from_json(body_dict)
+    def get_queue_status(self) -> Response:
+        """Fetches queue status: is online, message count. Cached for a short TTL"""
+        queue_statuses = queue_status_cache.get(self._get_queue_message_counts)
+        record_queue_depths(queue_statuses)
 
-        try:
-            net_print = printer.Network(settings.POC_PRINT_HUB_PRINTER_HOST)
-
-            # header
-            net_print.textln(settings.POC_PRINT_HUB_PRINTER_MESSAGE_SEPARATOR)
-            net_print.textln(f"title: {message.title}")
-
-            # body
-            match message.body_type.upper():
-                case NotificationBodyType.KEYVALUE.name:
-                    for body_print_line in self._build_key_value_body_messages(message):
-                        net_print.textln(body_print_line)
-                case NotificationBodyType.PLAINTEXT.name:
-                    net_print.textln(self._build_plain_text_body_message(message))
-                case _:
-                    net_print.textln(self._build_plain_text_body_message(message))
-            
-            # attributes
-            net_print.textln(f"origin: {message.origin}")
-            net_print.textln(f"timestamp: {message.timestamp}")
-        finally:
-            if net_print is not None:
-                net_print.close()
+        return Response(
+            self._build_queue_status_body(queue_statuses, RabbitPublisher.instance().stats()), 
+            status.HTTP_200_OK
+        )
 
-    def _is_printer_available(self) -> bool:
-        try:
-            net_print = printer.Network(settings.POC_PRINT_HUB_PRINTER_HOST)
-            is_online = net_print.is_online()
+    def metrics(self) -> HttpResponse:
+        """Exports the metrics of all API, consumer and worker processes in Prometheus text format"""
+        record_queue_depths(queue_status_cache.get(self._get_queue_message_counts))
+        body, content_type = export_metrics()
+
+        return HttpResponse(body, content_type=content_type)
+
+    def _get_queue_message_counts(self) -> Dict[str, Tuple[bool, int]]: # queue name -> is success, count
+        """Inspects the print queue lanes and the error queue over the long-lived publisher connection"""
+        publisher = RabbitPublisher.instance()
+        queue_statuses = {}
+
+        for queue_name in self._get_status_queue_names():
+            try:
+                # a passive declare of a missing queue closes the channel, so each queue borrows its own
+                with publisher.channel() as channel:
+                    queue_info = channel.queue_declare(queue=queue_name, passive=True)
 
-            if not settings.POC_PRINT_HUB_PRINTER_CHECK_PAPER_STATUS:
-                return is_online
+                queue_statuses[queue_name] = ( True, queue_info.method.message_count )
+            except Exception as ex:
+                print(f"Failed to fetch {queue_name} queue status, error: {ex}")
+                queue_statuses[queue_name] = ( False, 0 )
+
+        return queue_statuses
+
+    def _print_message(self, net_print: "printer.Network", body: bytes, content_type: str) -> None:
+        with PRINT_MESSAGE_SECONDS.time():
+            message = message_codec.decode(body, content_type)
+            job = self._get_renderer().render(message, settings.POC_PRINT_HUB_PRINTER_CUT_AFTER_MESSAGE)
+
+            # the whole job goes out in a single sendall
+            net_print._raw(job)
+
+        PRINTED_MESSAGES.inc()
+        PRINTER_BYTES_SENT.inc(len(job))
+
+    def _print_digest(self, net_print: "printer.Network", messages: List[NotificationMessage]) -> None:
+        with PRINT_DIGEST_SECONDS.time():
+            job = self._get_renderer().render_digest(
+                messages, 
+                settings.POC_PRINT_HUB_DIGEST_GROUP_BY_ORIGIN, 
+                settings.POC_PRINT_HUB_PRINTER_CUT_AFTER_MESSAGE
+            )
+
+            net_print._raw(job)
+
+        PRINTED_MESSAGES.inc(len(messages))
+        PRINTER_BYTES_SENT.inc(len(job))
+
+    def _is_printer_available(self, printer_session: PrinterSession, pool_printer: PoolPrinter) -> bool:
+        snapshot = printer_status_snapshot.read(pool_printer.name)
+
+        if snapshot is None:
+            return printer_session.is_available(settings.POC_PRINT_HUB_PRINTER_CHECK_PAPER_STATUS)
+
+        return is_printer_ready(snapshot["isOnline"], snapshot["paperStatus"])
+
+    def _get_paper_status_text(self, paper_status: int) -> str:
+        match paper_status:
+            case 0:
+                return "Empty"
+            case 1:
+                return "Near End"
+            case 2:
+                return "Plenty"
+            case _:
+                return "Invalid"
+
+    def _get_printer_status(self, pool_printer: PoolPrinter) -> dict:
+        snapshot = printer_status_snapshot.read(pool_printer.name)
+
+        if snapshot is not None:
+            return self._build_printer_status_snapshot_body(pool_printer, snapshot)
+
+        net_print = None
+
+        try:
+            net_print = network_printer(pool_printer.host)
 
-            is_paper_plenty = net_print.paper_status() == 2 # Plenty (Paper is adequate)
-            return is_online and is_paper_plenty
+            with PRINTER_PROBE_SECONDS.labels("status").time(), span("printer_probe"):
+                is_online = net_print.is_online()
+                paper_status = net_print.paper_status()
         except Exception as ex:
-            print(f"Failed to fetch printer availability status, error: {ex}")
-            return False
+            return self._build_printer_status_body(pool_printer, False, None)
         finally:
             if net_print is not None:
                 net_print.close()
 
-    def _build_key_value_body_messages(self, message: NotificationMessage) -> List[str]:
-        body_print_lines = []
-        body_messages = json.loads(message.body)
+        return self._build_printer_status_body(pool_printer, is_online, paper_status)
 
-        for key, value in body_messages.items():
-            body_print_lines.append(f"{key}: {value}")
+    def _build_printer_status_body(self, pool_printer: PoolPrinter, is_online: bool, paper_status: Optional[int]) -> dict:
+        return {
+            "name": pool_printer.name,
+            "isOnline": is_online,
+            "paperStatus": self._get_paper_status_text(paper_status) if is_online else "N/A"
+        }
 
-        return body_print_lines
-    
-    def _build_plain_text_body_message(self, message: NotificationMessage) -> str:
-        return f"body: {message.body}"
+    def _build_printer_pool_status_body(self, printer_statuses: List[dict]) -> dict:
+        """The default printer status, as with a single printer, plus the status of every pool printer"""
+        return {
+            **printer_statuses[0],
+            "printers": printer_statuses
+        }
 
-    def _publish_message(self, message: NotificationMessage, queue_name: str, queue_durable: bool) -> None:
-        parameters = self._build_connection_parameters()
+    def _build_printer_status_snapshot_body(self, pool_printer: PoolPrinter, snapshot: dict) -> dict:
+        return {
+            "name": pool_printer.name,
+            "isOnline": snapshot["isOnline"],
+            "paperStatus": self._get_paper_status_text(snapshot["paperStatus"]) if snapshot["isOnline"] else "N/A",
+            "checkedAt": datetime.fromtimestamp(snapshot["checkedAt"], timezone.utc).isoformat()
+        }
+
+    def _get_status_queue_names(self) -> List[str]:
+        queue_names = [
+            queue_name for priority in PriorityLanes.PRIORITIES for queue_name in self._get_lane_queue_names(priority_lanes, priority)
+        ]
+
+        if len(printer_pool.printers) > 1:
+            for pool_printer in printer_pool.printers:
+                queue_names.extend(queue_name for _, queue_name in pool_printer.lanes.lanes())
+
+        return queue_names + [settings.POC_PRINT_HUB_RABBIT_MQ_DEAD_QUEUE_NAME]
+
+    def _build_queue_status_body(self, queue_statuses: Dict[str, Tuple[bool, int]], publisher_stats: dict) -> dict:
+        print_queue_status = queue_statuses[settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_NAME]
+        dead_queue_status = queue_statuses[settings.POC_PRINT_HUB_RABBIT_MQ_DEAD_QUEUE_NAME]
+        lane_statuses = {
+            priority_lanes.lane_name(priority): (
+                queue_statuses[queue_name][0],
+                # the lane queue and its tenant sub-queues, if any, a sub-queue may be newer than the cached statuses
+                sum(queue_statuses.get(sub_queue_name, (False, 0))[1] for sub_queue_name in self._get_lane_queue_names(priority_lanes, priority))
+            ) for priority, queue_name in priority_lanes.lanes()
+        }
+        printer_message_counts = {
+            pool_printer.name: sum(queue_statuses[queue_name][1] for _, queue_name in pool_printer.lanes.lanes())
+            for pool_printer in printer_pool.printers
+            if len(printer_pool.printers) > 1
+        }
+
+        return {
+            "print": {
+                "isOnline": print_queue_status[0],
+                "count": sum(count for _, count in lane_statuses.values()) + sum(printer_message_counts.values())
+            },
+            "lanes": {
+                lane_name: {
+                    "isOnline": lane_status[0],
+                    "count": lane_status[1]
+                } for lane_name, lane_status in lane_statuses.items()
+            },
+            "printers": printer_message_counts, # messages routed to each pool printer
+            "deadLetter": {
+                "isOnline": dead_queue_status[0],
+                "count": dead_queue_status[1]
+            },
+            "publisher": publisher_stats
+        } | self._build_tenant_status_body(queue_statuses)
+
+    def _build_tenant_status_body(self, queue_statuses: Dict[str, Tuple[bool, int]]) -> dict:
+        """Messages waiting in the shared lanes per tenant, with fair tenant scheduling"""
+        if not tenant_scheduler.enabled:
+            return {}
+
+        return {
+            "tenants": {
+                tenant_id: sum(
+                    queue_statuses.get(tenant_scheduler.queue_name(queue_name, tenant_id), (False, 0))[1] 
+                    for _, queue_name in priority_lanes.lanes()
+                ) for tenant_id in tenant_scheduler.tenant_ids()
+            }
+        }
+
+    def _consume_queue_messages(self, printer_session: PrinterSession, pool_printer: PoolPrinter) -> None:
+        self._move_retired_tenant_queue_messages()
+
+        connection = open_connection(self._build_connection_parameters())
+        printer_idle_timer = None
+        consumed_lanes = self._get_consumed_lanes(pool_printer)
+        consumed_tenant_ids = tenant_scheduler.tenant_ids() if tenant_scheduler.enabled else None
+
+        # deliveries are buffered per lane queue, the lane to print from next is picked among the buffered ones
+        queue_deliveries: Dict[str, Deque[tuple]] = {
+            queue_name: deque() 
+            for lanes in consumed_lanes 
+            for priority in PriorityLanes.PRIORITIES 
+            for queue_name in self._get_lane_queue_names(lanes, priority)
+        }
+
+        def build_on_message(queue_name: str) -> Callable:
+            def on_message(channel: BlockingChannel, method_frame, properties, body) -> None:
+                queue_deliveries[queue_name].append((method_frame, properties, body))
+
+            return on_message
 
         try:
-            connection = pika.BlockingConnection(parameters)
             channel = connection.channel()
 
+            for lanes in consumed_lanes:
+                # the prefetch window applies per consumer: a full lower lane never blocks urgent deliveries.
+                # Shared lanes of a pool take one message at a time, so the next one goes to the first free printer
+                is_shared_by_pool = lanes is priority_lanes and len(printer_pool.printers) > 1
+                channel.basic_qos(prefetch_count=1 if is_shared_by_pool else settings.POC_PRINT_HUB_CONSUMER_PREFETCH_COUNT)
+
+                for priority in PriorityLanes.PRIORITIES:
+                    for queue_name in self._get_lane_queue_names(lanes, priority):
+                        channel.queue_declare(
+                            queue=queue_name, 
+                            durable=settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_DURABLE
+                        )
+                        channel.basic_consume(queue_name, build_on_message(queue_name))
+
             channel.queue_declare(
-                queue=queue_name, 
-                durable=queue_durable
+                queue=settings.POC_PRINT_HUB_RABBIT_MQ_DEAD_QUEUE_NAME, 
+                durable=settings.POC_PRINT_HUB_RABBIT_MQ_DEAD_QUEUE_DURABLE
             )
 
-            channel.basic_publish(
-                exchange="",
-                routing_key=queue_name,
-                body=json.dumps(message.to_dict()),
-                properties=pika.BasicProperties(
-                    delivery_mode=pika.DeliveryMode.Persistent
+            self._consumers[pool_printer.name] = (connection, channel)
+
+            while self._is_consuming:
+                if message_deduplicator.is_applied("drain"):
+                    self._publish_coalesced_messages("drain")
+
+                # reconnects to consume the sub-queues of tenants added or removed since
+                if consumed_tenant_ids is not None and tenant_scheduler.tenant_ids() != consumed_tenant_ids:
+                    print(f"Tenants changed, reconnecting print queue consumer ({pool_printer.name} printer)")
+                    return
+
+                # messages published to the sub-queues of a deleted tenant by processes that did not know yet
+                if tenant_scheduler.is_retired_check_due():
+                    self._move_retired_tenant_queue_messages()
+
+                is_buffered = any(len(deliveries) > 0 for deliveries in queue_deliveries.values())
+
+                # collects deliveries that arrived meanwhile, waits for new ones only when none is buffered
+                connection.process_data_events(time_limit=0 if is_buffered else self.CONSUMER_POLL_INTERVAL_SEC)
+
+                queue_name = self._pick_queue(
+                    pool_printer, 
+                    consumed_lanes, 
+                    lambda queue_name: len(queue_deliveries.get(queue_name, ())) > 0
                 )
+
+                if queue_name is None or not self._is_consuming:
+                    continue
+
+                method_frame, properties, body = queue_deliveries[queue_name].popleft()
+
+                if printer_idle_timer is not None:
+                    connection.remove_timeout(printer_idle_timer)
+                    printer_idle_timer = None
+
+                # probe only when (re)opening the printer connection, not for every message
+                if not printer_session.is_open:
+                    is_available = self._is_printer_available(printer_session, pool_printer)
+                    printer_pool.report_availability(pool_printer, is_available)
+
+                    if not is_available:
+                        if queue_name in pool_printer.lanes.queue_names.values() and printer_pool.is_failed_over(pool_printer):
+                            self._fail_over_queue_message(channel, pool_printer, method_frame, properties, body)
+                            continue
+
+                        print(
+                            f"Printer {pool_printer.name} not available, requeueing message. "\
+                            f"Retrying in {settings.POC_PRINT_HUB_QUEUE_RETRY_DELAY_SEC}s."
+                        )
+                        channel.basic_nack(method_frame.delivery_tag, requeue=True)
+                        connection.sleep(settings.POC_PRINT_HUB_QUEUE_RETRY_DELAY_SEC)
+                        continue
+
+                self._process_queue_message(channel, printer_session, queue_name, method_frame, properties, body)
+
+                # release the printer for other clients (status, feed, cut) once the queue goes quiet
+                printer_idle_timer = connection.call_later(
+                    settings.POC_PRINT_HUB_CONSUMER_PRINTER_IDLE_TIMEOUT_SEC,
+                    printer_session.close
+                )
+        finally:
+            self._consumers.pop(pool_printer.name, None)
+
+            # buffered, unacked deliveries go back to their lanes
+            if connection.is_open:
+                connection.close()
+
+    def _get_consumed_lanes(self, pool_printer: PoolPrinter) -> List[PriorityLanes]:
+        """Lanes a printer prints from: its own first, then the shared ones"""
+        if len(printer_pool.printers) == 1:
+            return [priority_lanes]
+
+        return [pool_printer.lanes, priority_lanes]
+
+    def _pick_queue(
+        self, 
+        pool_printer: PoolPrinter, 
+        consumed_lanes: List[PriorityLanes], 
+        has_messages: Callable[[str], bool]
+    ) -> Optional[str]:
+        """Lane queue to print from next: by priority across all consumed lanes, the printer's own first, then by tenant"""
+        priority = pool_printer.lanes.pick([
+            priority for priority in PriorityLanes.PRIORITIES 
+            if any(has_messages(queue_name) for lanes in consumed_lanes for queue_name in self._get_lane_queue_names(lanes, priority))
+        ])
+
+        if priority is None:
+            return None
+
+        for lanes in consumed_lanes:
+            waiting_queue_names = [
+                queue_name for queue_name in self._get_lane_queue_names(lanes, priority) if has_messages(queue_name)
+            ]
+
+            if len(waiting_queue_names) > 0:
+                return tenant_scheduler.pick(waiting_queue_names)
+
+        return None
+
+    def _get_lane_queue_names(self, lanes: PriorityLanes, priority: NotificationPriority) -> List[str]:
+        """Queues of a lane: for the shared lanes, the tenant sub-queues as well with fair tenant scheduling"""
+        if lanes is priority_lanes:
+            return tenant_scheduler.sub_queue_names(lanes.queue_name(priority))
+
+        return [lanes.queue_name(priority)]
+
+    def _fail_over_printer_queue_messages(self, channel: BlockingChannel, pool_printer: PoolPrinter) -> None:
+        """Moves the messages routed to an unavailable printer over to the shared lanes"""
+        moved_message_count = 0
+
+        for _, queue_name in pool_printer.lanes.lanes():
+            channel.queue_declare(
+                queue=queue_name, 
+                durable=settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_DURABLE
             )
+
+            while True:
+                method_frame, properties, body = channel.basic_get(queue_name)
+
+                if method_frame is None:
+                    break
+
+                self._fail_over_queue_message(channel, pool_printer, method_frame, properties, body)
+                moved_message_count += 1
+
+        print(f"Printer {pool_printer.name} not available, moved {moved_message_count} of its messages to the shared queues")
+
+    def _fail_over_queue_message(
+        self, 
+        channel: BlockingChannel, 
+        pool_printer: PoolPrinter, 
+        method_frame, 
+        properties: pika.BasicProperties, 
+        body: bytes
+    ) -> None:
+        # same lane in the shared queues, where any other printer picks it up
+        channel.basic_publish(
+            exchange="",
+            routing_key=self._route_queue_message(properties),
+            body=body,
+            properties=self._build_republish_properties(properties)
+        )
+        channel.basic_ack(method_frame.delivery_tag)
+
+    def _move_retired_tenant_queue_messages(self) -> None:
+        """Moves the messages left in the sub-queues of deleted tenants, or of all tenants with fair scheduling turned off,
+        back onto their lane queue"""
+        retired_tenant_ids = tenant_scheduler.retired_tenant_ids()
+
+        if len(retired_tenant_ids) == 0:
+            return
+
+        connection = None
+
+        try:
+            connection = open_connection(self._build_connection_parameters())
+            channel = connection.channel()
+
+            for tenant_id in retired_tenant_ids:
+                moved_message_count = 0
+
+                for _, lane_queue_name in priority_lanes.lanes():
+                    queue_name = tenant_scheduler.queue_name(lane_queue_name, tenant_id)
+
+                    for declared_queue_name in [queue_name, lane_queue_name]:
+                        channel.queue_declare(
+                            queue=declared_queue_name, 
+                            durable=settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_DURABLE
+                        )
+
+                    while True:
+                        method_frame, properties, body = channel.basic_get(queue_name)
+
+                        if method_frame is None:
+                            break
+
+                        channel.basic_publish(
+                            exchange="",
+                            routing_key=lane_queue_name,
+                            body=body,
+                            properties=self._build_republish_properties(properties)
+                        )
+                        channel.basic_ack(method_frame.delivery_tag)
+                        moved_message_count += 1
+
+                if moved_message_count == 0:
+                    tenant_scheduler.forget_retired(tenant_id)
+                else:
+                    print(f"Tenant {tenant_id} no longer scheduled, moved {moved_message_count} of its messages to the lane queues")
+        except Exception as ex:
+            # moved on the next drain pass, or the next check of the consumer
+            print(f"Failed to move messages of tenants no longer scheduled, error: {ex}")
         finally:
-            if connection is not None:
+            if connection is not None and connection.is_open:
                 connection.close()
 
+    def _process_queue_message(
+        self, 
+        channel: BlockingChannel, 
+        printer_session: PrinterSession, 
+        queue_name: str, 
+        method_frame, 
+        properties: pika.BasicProperties, 
+        body: bytes
+    ) -> None:
+        """Prints a queue message or moves it to the error queue as is, then acks it. Duplicates are acked unprinted"""
+        self._record_queue_wait(properties)
+
+        if message_deduplicator.is_applied("drain") and self._is_duplicate_queue_message(queue_name, properties, body):
+            channel.basic_ack(method_frame.delivery_tag)
+            return
+
+        try:
+            printer_session.run(self._print_message, body, properties.content_type)
+        except Exception as ex:
+            self._dead_letter_queue_message(channel, method_frame, properties, body, ex)
+
+        channel.basic_ack(method_frame.delivery_tag)
+
+    def _process_digest_queue_messages(
+        self, 
+        channel: BlockingChannel, 
+        printer_session: PrinterSession, 
+        deliveries: List[Tuple[str, object, pika.BasicProperties, bytes]]
+    ) -> None:
+        """Prints the messages drained in one pass as a single digest job, sent at once with at most one cut, then acks them.
+
+        Messages that fail to decode are moved to the error queue on their own,
+        all the others along with them if the digest fails to print.
+        """
+        digest_deliveries = []
+
+        for queue_name, method_frame, properties, body in deliveries:
+            self._record_queue_wait(properties)
+
+            try:
+                message = message_codec.decode(body, properties.content_type)
+            except Exception as ex:
+                self._dead_letter_queue_message(channel, method_frame, properties, body, ex)
+                channel.basic_ack(method_frame.delivery_tag)
+                continue
+
+            if message_deduplicator.is_applied("drain") and self._suppress_duplicate(message, queue_name, "drain") is not None:
+                channel.basic_ack(method_frame.delivery_tag)
+                continue
+
+            digest_deliveries.append((method_frame, properties, body, message))
+
+        if len(digest_deliveries) == 0:
+            return
+
+        try:
+            printer_session.run(self._print_digest, [message for _, _, _, message in digest_deliveries])
+        except Exception as ex:
+            for method_frame, properties, body, _ in digest_deliveries:
+                self._dead_letter_queue_message(channel, method_frame, properties, body, ex)
+
+        for method_frame, _, _, _ in digest_deliveries:
+            channel.basic_ack(method_frame.delivery_tag)
+
+    def _dead_letter_queue_message(
+        self, 
+        channel: BlockingChannel, 
+        method_frame, 
+        properties: pika.BasicProperties, 
+        body: bytes, 
+        ex: Exception
+    ) -> None:
+        """Moves a queue message to the error queue as is, the caller acks it"""
+        print(
+            f"Failed to process {settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_NAME} queue message: {ex}. "\
+            f"Delivery properties: {method_frame}. Publishing to the error queue."
+        )
+        DEAD_LETTERED_MESSAGES.inc()
+        channel.basic_publish(
+            exchange="",
+            routing_key=settings.POC_PRINT_HUB_RABBIT_MQ_DEAD_QUEUE_NAME,
+            body=body,
+            properties=self._build_republish_properties(properties)
+        )
+
+    def _record_queue_wait(self, properties: pika.BasicProperties) -> None:
+        headers = properties.headers or {}
+        published_at = headers.get(tenant_scheduler.PUBLISHED_AT_HEADER)
+
+        # published before the header was added
+        if published_at is None:
+            return
+
+        QUEUE_WAIT_SECONDS.labels(headers.get(tenant_scheduler.TENANT_HEADER) or "none").observe(max(time.time() - published_at, 0))
+
+    def _is_duplicate_queue_message(self, queue_name: str, properties: pika.BasicProperties, body: bytes) -> bool:
+        try:
+            message = message_codec.decode(body, properties.content_type)
+        except Exception:
+            return False # left for the print attempt to move it to the error queue
+
+        return self._suppress_duplicate(message, queue_name, "drain") is not None
+
+    def _suppress_duplicate(self, message: NotificationMessage, queue_name: str, stage: str) -> Optional[str]:
+        """Id of the first copy an identical message is coalesced into, or None if it goes through"""
+        duplicate_of = message_deduplicator.observe(message, queue_name)
+
+        if duplicate_of is not None:
+            DEDUP_SUPPRESSED_MESSAGES.labels(stage).inc()
+
+        return duplicate_of
+
+    def _start_coalesced_message_flusher(self) -> None:
+        """Publish time dedup: coalesced messages are queued by a thread as windows close, not by the next publish"""
+        message_deduplicator.start_flusher(lambda: self._publish_coalesced_messages("publish"))
+
+    def _publish_coalesced_messages(self, stage: str) -> None:
+        """Queues a coalesced message for each dedup window closed with copies suppressed"""
+        closed_entries = message_deduplicator.take_closed()
+
+        for index, entry in enumerate(closed_entries):
+            try:
+                self._publish_message(
+                    entry.build_coalesced_message(),
+                    entry.queue_name,
+                    settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_DURABLE,
+                    tenant_scheduler.tenant_of(entry.queue_name)
+                )
+            except Exception as ex:
+                print(f"Failed to publish coalesced messages, retrying later. Error: {ex}")
+                message_deduplicator.restore_closed(closed_entries[index:])
+                return
+
+            DEDUP_COALESCED_MESSAGES.labels(stage).inc()
+
+    def _build_republish_properties(self, properties: pika.BasicProperties) -> pika.BasicProperties:
+        return pika.BasicProperties(
+            content_type=properties.content_type,
+            content_encoding=properties.content_encoding,
+            headers=properties.headers,
+            priority=properties.priority,
+            delivery_mode=pika.DeliveryMode.Persistent
+        )
+
+    def _get_renderer(self) -> PrintRenderer:
+        if self._renderer is None:
+            self._renderer = PrintRenderer()
+
+        return self._renderer
+
+    def _parse_batch_items(self, request_body: bytes, content_type: str) -> List[Union[dict, None]]:
+        """Parses a JSON array or NDJSON lines; malformed NDJSON lines are kept as None to be reported per item"""
+        if "ndjson" not in (content_type or "") and request_body.lstrip()[:1] == b"[":
+            try:
+                return json.loads(request_body)
+            except json.JSONDecodeError as ex:
+                raise ValueError(f"Malformed JSON array: {ex}")
+
+        items = []
+
+        for line in request_body.splitlines():
+            if line.strip() == b"":
+                continue
+
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError:
+                items.append(None)
+
+        return items
+
+    def _validate_printer_target(self, message: NotificationMessage) -> List[str]:
+        if message.printer is not None and printer_pool.get(message.printer) is None:
+            return [f"Invalid 'printer': should be one of {', '.join(pool_printer.name for pool_printer in printer_pool.printers)}"]
+
+        return []
+
+    def _route_message(self, message: NotificationMessage, tenant_id: Optional[str]) -> Tuple[str, Optional[str]]: # queue name, printer name
+        """Lane queue of a message: the one of its priority, of the pool printer it is routed to, if any, else the tenant sub-queue"""
+        pool_printer = printer_pool.route(message, tenant_id)
+
+        if pool_printer is None:
+            return tenant_scheduler.route(priority_lanes.queue_name(message.priority), tenant_id), None
+
+        return pool_printer.lanes.queue_name(message.priority), pool_printer.name
+
+    def _route_queue_message(self, properties: pika.BasicProperties) -> str:
+        """Shared lane queue of a queue message being moved back: the one of its priority, of its tenant"""
+        return tenant_scheduler.route(
+            priority_lanes.queue_name(priority_lanes.priority_of(properties.priority)),
+            (properties.headers or {}).get(tenant_scheduler.TENANT_HEADER)
+        )
+
+    def _response_unknown_printer(self) -> Response:
+        return Response(
+            {
+                "message": "Invalid request",
+                "errors": f"Invalid 'printer': should be one of {', '.join(pool_printer.name for pool_printer in printer_pool.printers)}"
+            }, 
+            status.HTTP_400_BAD_REQUEST
+        )
+
+    def _publish_message(
+        self, 
+        message: NotificationMessage, 
+        queue_name: str, 
+        queue_durable: bool, 
+        tenant_id: Optional[str] = None
+    ) -> None:
+        with span("encode"):
+            body = message_codec.encode(message)
+
+        properties = self._build_message_properties(message.priority, tenant_id)
+
+        if self._spool_messages([(queue_name, body, properties)]):
+            return
+
+        RabbitPublisher.instance().publish(
+            queue_name,
+            queue_durable,
+            body,
+            properties
+        )
+
+    def _spool_messages(self, messages: List[SpoolMessage]) -> bool:
+        """Appends messages to the local publish spool, if enabled. False if they are to be published directly"""
+        if not publish_spool.enabled:
+            return False
+
+        try:
+            with span("spool"):
+                publish_spool.append(messages)
+        except (PublishSpoolFullError, OSError) as ex:
+            print(f"Failed to spool messages, publishing directly. Error: {ex}")
+            return False
+
+        return True
+
+    def _build_message_properties(
+        self, 
+        priority: NotificationPriority = NotificationPriority.NORMAL, 
+        tenant_id: Optional[str] = None
+    ) -> pika.BasicProperties:
+        return pika.BasicProperties(
+            content_type=message_codec.content_type,
+            headers=self._build_message_headers(tenant_id),
+            priority=priority.value,
+            delivery_mode=pika.DeliveryMode.Persistent
+        )
+
+    def _build_message_headers(self, tenant_id: Optional[str]) -> dict:
+        """Publish time, for the queue wait metric, and tenant, to route the message back to its sub-queue when moved"""
+        headers = { tenant_scheduler.PUBLISHED_AT_HEADER: time.time() }
+
+        if tenant_id is not None:
+            headers[tenant_scheduler.TENANT_HEADER] = tenant_id
+
+        return headers
+
     def _build_connection_parameters(self) -> pika.ConnectionParameters:
-        return pika.ConnectionParameters(
-            host=settings.POC_PRINT_HUB_RABBIT_MQ_HOST,
-            credentials=pika.PlainCredentials(
-                settings.POC_PRINT_HUB_RABBIT_MQ_USERNAME, 
-                settings.POC_PRINT_HUB_RABBIT_MQ_PASSWORD
-            )
-        )
\ No newline at end of file
+        return build_connection_parameters()
\ No newline at end of file
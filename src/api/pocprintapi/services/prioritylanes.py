@@ -0,0 +1,85 @@
+import threading
+
+from typing import Collection, Dict, List, Optional, Tuple
+from django.conf import settings
+from pocprintapi.models import NotificationPriority
+
+class PriorityLanes:
+    """Print queue lanes by message priority, one RabbitMQ queue each.
+
+    Separate queues rather than a single `x-max-priority` one: RabbitMQ refuses
+    to redeclare the existing print queue with new arguments, so it stays as is
+    and serves as the normal lane. The lane of a queued message is also kept
+    in its AMQP `priority` property, for the republish job to route it back.
+
+    Lanes are drained highest priority first, but a lower lane with messages
+    waiting is served at least once every `starvation_limit` picks, so a
+    steady stream of urgent messages cannot hold back the rest forever.
+    """
+    # highest priority first
+    PRIORITIES: Tuple[NotificationPriority, ...] = (
+        NotificationPriority.HIGH,
+        NotificationPriority.NORMAL,
+        NotificationPriority.LOW
+    )
+
+    def __init__(self, queue_name: str, starvation_limit: int):
+        self.starvation_limit: int = starvation_limit # 0 means strict priority
+        self.queue_names: Dict[NotificationPriority, str] = {
+            NotificationPriority.HIGH: f"{queue_name}_high",
+            NotificationPriority.NORMAL: queue_name,
+            NotificationPriority.LOW: f"{queue_name}_low"
+        }
+
+        self._lock = threading.Lock()
+        self._skipped_picks: Dict[NotificationPriority, int] = { priority: 0 for priority in self.PRIORITIES }
+
+    def queue_name(self, priority: NotificationPriority) -> str:
+        return self.queue_names[priority]
+
+    def lane_name(self, priority: NotificationPriority) -> str:
+        return priority.name.lower()
+
+    def lanes(self) -> List[Tuple[NotificationPriority, str]]: # priority, queue name; highest priority first
+        return [(priority, self.queue_names[priority]) for priority in self.PRIORITIES]
+
+    def priority_of(self, amqp_priority: Optional[int]) -> NotificationPriority:
+        """Lane of a queued message by its AMQP `priority` property, normal if unset (published before lanes)"""
+        for priority in self.PRIORITIES:
+            if priority.value == amqp_priority:
+                return priority
+
+        return NotificationPriority.NORMAL
+
+    def pick(self, waiting: Collection[NotificationPriority]) -> Optional[NotificationPriority]:
+        """Picks the lane to print from next out of those with messages waiting.
+
+        Picks are remembered across calls (drain ticks) within the process.
+        """
+        waiting_priorities = [priority for priority in self.PRIORITIES if priority in waiting]
+
+        if len(waiting_priorities) == 0:
+            return None
+
+        with self._lock:
+            picked = waiting_priorities[0]
+
+            if self.starvation_limit > 0:
+                # the highest priority lane that has waited long enough goes first, if any
+                for priority in waiting_priorities[1:]:
+                    if self._skipped_picks[priority] >= self.starvation_limit:
+                        picked = priority
+                        break
+
+            for priority in self.PRIORITIES:
+                if priority is picked or priority not in waiting:
+                    self._skipped_picks[priority] = 0
+                else:
+                    self._skipped_picks[priority] += 1
+
+            return picked
+
+priority_lanes = PriorityLanes(
+    settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_NAME,
+    settings.POC_PRINT_HUB_PRIORITY_LANE_STARVATION_LIMIT
+)
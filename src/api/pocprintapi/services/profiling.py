@@ -0,0 +1,79 @@
+import contextvars
+import cProfile
+import os
+import re
+import time
+
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+class RequestSpans:
+    """Timing spans of one request: total duration per phase, in recording order"""
+    def __init__(self):
+        self.started_at: float = time.perf_counter()
+        self.durations_sec: Dict[str, float] = {}
+
+    def add(self, name: str, duration_sec: float) -> None:
+        # repeated phases (a batch, a reconnect) add up
+        self.durations_sec[name] = self.durations_sec.get(name, 0.0) + duration_sec
+
+    def elapsed_sec(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    def server_timing(self, total_sec: float) -> str:
+        """`Server-Timing` header value, durations in milliseconds"""
+        entries = [f"{name};dur={duration_sec * 1000:.2f}" for name, duration_sec in self.durations_sec.items()]
+        entries.append(f"total;dur={total_sec * 1000:.2f}")
+
+        return ", ".join(entries)
+
+    def breakdown(self) -> str:
+        return ", ".join(f"{name}: {duration_sec * 1000:.1f} ms" for name, duration_sec in self.durations_sec.items())
+
+# set by the profiling middleware for the request being served: thread-local under WSGI, task-local under ASGI
+_current_spans: contextvars.ContextVar[Optional[RequestSpans]] = contextvars.ContextVar("request_spans", default=None)
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Records a timing span on the current request, a no-op outside of a profiled request"""
+    spans = _current_spans.get()
+
+    if spans is None:
+        yield
+        return
+
+    started_at = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        spans.add(name, time.perf_counter() - started_at)
+
+def activate_spans(spans: RequestSpans) -> contextvars.Token:
+    return _current_spans.set(spans)
+
+def deactivate_spans(token: contextvars.Token) -> None:
+    _current_spans.reset(token)
+
+def start_profiler() -> Optional[cProfile.Profile]:
+    """Starts a cProfile profiler, `None` when another one is already active on this thread"""
+    profiler = cProfile.Profile()
+
+    try:
+        profiler.enable()
+    except ValueError: # one profiler per thread: a concurrent async request holds it
+        return None
+
+    return profiler
+
+def dump_profile(profiler: cProfile.Profile, dump_dir: str, method: str, path: str, duration_sec: float) -> str:
+    """Saves the pstats dump of a sampled request, returns its file path"""
+    os.makedirs(dump_dir, exist_ok=True)
+
+    path_slug = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_") or "root"
+    file_name = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{method}-{path_slug}-{duration_sec * 1000:.0f}ms.prof"
+    file_path = os.path.join(dump_dir, file_name)
+
+    profiler.dump_stats(file_path)
+
+    return file_path
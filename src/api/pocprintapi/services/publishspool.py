@@ -0,0 +1,433 @@
+import atexit
+import fcntl
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+import pika
+
+from typing import BinaryIO, List, Optional, Tuple
+from django.conf import settings
+from pocprintapi.services.jsonfile import read_json_file, write_json_file_atomically
+from pocprintapi.services.metrics import PUBLISH_SPOOL_BYTES, PUBLISH_SPOOL_FLUSHED_MESSAGES
+from pocprintapi.services.rabbitpublisher import RabbitPublisher
+
+SpoolMessage = Tuple[str, bytes, pika.BasicProperties] # queue name, body, properties
+
+class PublishSpoolFullError(Exception):
+    pass
+
+class PublishSpool:
+    """Local write-ahead log of published messages, forwarded to RabbitMQ in the background.
+
+    Publishing appends messages to the current segment file of the log and
+    returns without a broker round-trip. A flusher thread forwards them in
+    order, up to flush_batch_size per AMQP transaction, and deletes a segment
+    once it is fully forwarded. Its position is kept in a cursor file, so a
+    restart resumes from there: messages forwarded right before a crash may be
+    forwarded twice, but none is lost. Messages are published as mandatory,
+    and the cursor only moves past a batch once the broker returned none of
+    it as unroutable.
+
+    Appends are synced to disk and forwarded in batches, every
+    fsync_interval_sec (0 syncs and forwards every append right away). Each process (gunicorn worker) claims a slot directory of
+    its own through a file lock. A slot left behind by an exited process is
+    recovered and flushed by the next process to claim it.
+
+    Record layout, little-endian: payload length (I), payload CRC32 (I), then
+    the payload: queue name, content type and headers as JSON, each
+    length-prefixed (I) UTF-8, then priority (B) and the message body. A torn
+    record at the end of the log, from a crash mid-append, is truncated on
+    recovery.
+    """
+    MAX_SLOTS: int = 256
+    FLUSHER_POLL_INTERVAL_SEC: float = 1.0
+
+    _RECORD_HEADER = struct.Struct("<II")
+    _LENGTH = struct.Struct("<I")
+    _PRIORITY = struct.Struct("<B")
+
+    def __init__(
+        self,
+        enabled: bool,
+        directory: str,
+        segment_max_bytes: int,
+        max_bytes: int,
+        fsync_interval_sec: float,
+        flush_batch_size: int
+    ):
+        self.enabled: bool = enabled
+        self.directory: str = directory
+        self.segment_max_bytes: int = segment_max_bytes
+        self.max_bytes: int = max_bytes # disk use bound of a slot, appends beyond it fail
+        self.fsync_interval_sec: float = fsync_interval_sec
+        self.flush_batch_size: int = max(flush_batch_size, 1)
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pid: Optional[int] = None # the process owning the slot, a forked child claims its own
+        self._slot_dir: Optional[str] = None
+        self._slot_lock_fd: Optional[int] = None
+        self._flusher: Optional[threading.Thread] = None
+        self._is_closing: bool = False
+
+        # appended to by publishers
+        self._segment_seq: int = 0
+        self._segment_fd: Optional[int] = None
+        self._segment_size: int = 0
+        self._total_bytes: int = 0
+        self._is_dirty: bool = False
+        self._synced_at: float = 0
+
+        # read by the flusher
+        self._cursor_seq: int = 0
+        self._cursor_offset: int = 0
+        self._cursor_file: Optional[BinaryIO] = None
+
+    def append(self, messages: List[SpoolMessage]) -> None:
+        """Appends messages to the log as a whole, raises PublishSpoolFullError if they do not fit"""
+        records = b"".join(self._encode_record(queue_name, body, properties) for queue_name, body, properties in messages)
+
+        with self._lock:
+            self._ensure_open()
+
+            if self._total_bytes + len(records) > self.max_bytes:
+                raise PublishSpoolFullError(f"Publish spool full: {self._total_bytes} of {self.max_bytes} bytes in use")
+
+            if self._segment_size >= self.segment_max_bytes:
+                self._roll_segment()
+
+            os.write(self._segment_fd, records)
+            self._segment_size += len(records)
+            self._total_bytes += len(records)
+            self._is_dirty = True
+
+            if self.fsync_interval_sec <= 0:
+                os.fsync(self._segment_fd)
+                self._is_dirty = False
+
+            PUBLISH_SPOOL_BYTES.set(self._total_bytes)
+
+        # otherwise the flusher picks up whatever was appended every fsync interval, in one transaction
+        if self.fsync_interval_sec <= 0:
+            self._wakeup.set()
+
+    def open(self) -> None:
+        """Claims a slot and starts flushing it, if not done yet: appending does it on first use"""
+        with self._lock:
+            self._ensure_open()
+
+    def close(self) -> None:
+        """Stops the flusher, syncs the log and releases the slot. Unflushed messages wait for the next process to claim it"""
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+
+            self._is_closing = True
+
+        self._wakeup.set()
+
+        if self._flusher is not None:
+            self._flusher.join()
+
+        with self._lock:
+            if self._cursor_file is not None:
+                self._cursor_file.close()
+
+            if self._segment_fd is not None:
+                os.fsync(self._segment_fd)
+                os.close(self._segment_fd)
+
+            os.close(self._slot_lock_fd)
+            self._reset()
+
+    def _ensure_open(self) -> None:
+        if self._pid == os.getpid():
+            return
+
+        # inherited through fork: the parent keeps its slot, its file descriptors and lock
+        self._reset()
+        self._slot_dir, self._slot_lock_fd = self._claim_slot()
+        self._pid = os.getpid()
+        self._recover()
+
+        self._flusher = threading.Thread(target=self._flush, name="publish-spool-flusher", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def _reset(self) -> None:
+        self._pid = None
+        self._slot_dir = None
+        self._slot_lock_fd = None
+        self._flusher = None
+        self._is_closing = False
+        self._segment_fd = None
+        self._segment_size = 0
+        self._total_bytes = 0
+        self._is_dirty = False
+        self._cursor_file = None
+
+    def _claim_slot(self) -> Tuple[str, int]: # slot directory, lock file descriptor
+        for slot_index in range(self.MAX_SLOTS):
+            slot_dir = os.path.join(self.directory, f"slot-{slot_index}")
+            os.makedirs(slot_dir, exist_ok=True)
+
+            lock_fd = os.open(os.path.join(slot_dir, "lock"), os.O_RDWR | os.O_CREAT)
+
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(lock_fd)
+                continue
+
+            return slot_dir, lock_fd
+
+        raise PublishSpoolFullError(f"Publish spool has no free slot out of {self.MAX_SLOTS} in {self.directory}")
+
+    def _recover(self) -> None:
+        """Resumes from the cursor, truncates a torn record at the end of the log and starts a new segment"""
+        segment_seqs = self._list_segment_seqs()
+        cursor = read_json_file(self._get_cursor_path()) or { "segment": 0, "offset": 0 }
+
+        self._cursor_seq = cursor["segment"]
+        self._cursor_offset = cursor["offset"]
+
+        if len(segment_seqs) > 0:
+            last_seq = segment_seqs[-1]
+            start_offset = self._cursor_offset if last_seq == self._cursor_seq else 0
+            valid_size = self._scan_valid_size(self._get_segment_path(last_seq), start_offset)
+
+            if valid_size < os.path.getsize(self._get_segment_path(last_seq)):
+                print(f"Publish spool {self._slot_dir}: truncating a torn record at the end of segment {last_seq}")
+                os.truncate(self._get_segment_path(last_seq), valid_size)
+
+        # flushed, but not deleted before the process exited
+        for seq in segment_seqs:
+            if seq < self._cursor_seq:
+                os.remove(self._get_segment_path(seq))
+
+        segment_seqs = [seq for seq in segment_seqs if seq >= self._cursor_seq]
+
+        self._total_bytes = sum(os.path.getsize(self._get_segment_path(seq)) for seq in segment_seqs)
+        self._segment_seq = max(segment_seqs[-1] + 1 if len(segment_seqs) > 0 else 0, self._cursor_seq)
+        self._open_segment()
+
+        if self._cursor_seq not in segment_seqs:
+            self._cursor_seq = segment_seqs[0] if len(segment_seqs) > 0 else self._segment_seq
+            self._cursor_offset = 0
+
+        if self._total_bytes > 0:
+            print(
+                f"Publish spool {self._slot_dir}: resuming from segment {self._cursor_seq}, "\
+                f"offset {self._cursor_offset}, {self._total_bytes} bytes on disk"
+            )
+
+        PUBLISH_SPOOL_BYTES.set(self._total_bytes)
+
+    def _roll_segment(self) -> None:
+        os.fsync(self._segment_fd)
+        os.close(self._segment_fd)
+
+        self._segment_seq += 1
+        self._open_segment()
+
+    def _open_segment(self) -> None:
+        self._segment_fd = os.open(
+            self._get_segment_path(self._segment_seq),
+            os.O_WRONLY | os.O_CREAT | os.O_APPEND
+        )
+        self._segment_size = os.fstat(self._segment_fd).st_size
+        self._is_dirty = False
+
+    def _flush(self) -> None:
+        while True:
+            self._sync_if_due()
+
+            with self._lock:
+                if self._is_closing:
+                    return
+
+            messages, end_position = self._read_messages()
+
+            if len(messages) == 0:
+                if not self._advance_segment():
+                    self._wakeup.wait(self.fsync_interval_sec if self.fsync_interval_sec > 0 else self.FLUSHER_POLL_INTERVAL_SEC)
+                    self._wakeup.clear()
+
+                continue
+
+            try:
+                RabbitPublisher.instance().publish_many(settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_DURABLE, messages)
+            except Exception as ex:
+                # retried from the same position, in order; on UnroutableError, the routed messages of the batch are forwarded twice
+                print(
+                    f"Failed to flush publish spool to RabbitMQ, error: {ex}. "\
+                    f"Retrying in {settings.POC_PRINT_HUB_QUEUE_RETRY_DELAY_SEC}s."
+                )
+                self._wakeup.wait(settings.POC_PRINT_HUB_QUEUE_RETRY_DELAY_SEC)
+                self._wakeup.clear() # set by appends meanwhile, which the retry picks up anyway
+                continue
+
+            self._cursor_offset = end_position
+            self._save_cursor()
+            PUBLISH_SPOOL_FLUSHED_MESSAGES.inc(len(messages))
+
+    def _sync_if_due(self) -> None:
+        with self._lock:
+            if not self._is_dirty or time.monotonic() - self._synced_at < self.fsync_interval_sec:
+                return
+
+            # synced outside of the lock, appends go on meanwhile
+            sync_fd = os.dup(self._segment_fd)
+            self._is_dirty = False
+            self._synced_at = time.monotonic()
+
+        try:
+            os.fsync(sync_fd)
+        finally:
+            os.close(sync_fd)
+
+    def _read_messages(self) -> Tuple[List[SpoolMessage], int]: # messages, cursor offset past them
+        with self._lock:
+            # the segment being appended to is read up to its last complete record
+            read_limit = self._segment_size if self._cursor_seq == self._segment_seq else None
+
+        if self._cursor_file is None:
+            self._cursor_file = open(self._get_segment_path(self._cursor_seq), "rb")
+
+        self._cursor_file.seek(self._cursor_offset)
+        offset = self._cursor_offset
+        messages = []
+
+        while len(messages) < self.flush_batch_size and (read_limit is None or offset < read_limit):
+            record_header = self._cursor_file.read(self._RECORD_HEADER.size)
+
+            if len(record_header) < self._RECORD_HEADER.size:
+                break
+
+            payload_length, payload_crc = self._RECORD_HEADER.unpack(record_header)
+            payload = self._cursor_file.read(payload_length)
+
+            if len(payload) < payload_length or zlib.crc32(payload) != payload_crc:
+                print(f"Publish spool {self._slot_dir}: skipping the corrupt rest of segment {self._cursor_seq}")
+                break
+
+            messages.append(self._decode_payload(payload))
+            offset += self._RECORD_HEADER.size + payload_length
+
+        return messages, offset
+
+    def _advance_segment(self) -> bool:
+        """Moves the cursor past a fully flushed segment, that no longer gets appended to, and deletes it"""
+        with self._lock:
+            if self._cursor_seq >= self._segment_seq:
+                return False
+
+            segment_path = self._get_segment_path(self._cursor_seq)
+            segment_size = os.path.getsize(segment_path)
+
+            if self._cursor_file is not None:
+                self._cursor_file.close()
+                self._cursor_file = None
+
+            self._cursor_seq += 1
+            self._cursor_offset = 0
+
+            # skips sequence numbers without a segment, left by a recovery
+            while self._cursor_seq < self._segment_seq and not os.path.exists(self._get_segment_path(self._cursor_seq)):
+                self._cursor_seq += 1
+
+            self._save_cursor()
+            os.remove(segment_path)
+
+            self._total_bytes -= segment_size
+            PUBLISH_SPOOL_BYTES.set(self._total_bytes)
+
+        return True
+
+    def _save_cursor(self) -> None:
+        write_json_file_atomically(
+            self._get_cursor_path(),
+            {
+                "segment": self._cursor_seq,
+                "offset": self._cursor_offset
+            }
+        )
+
+    def _scan_valid_size(self, segment_path: str, offset: int) -> int:
+        """Size of a segment up to its first incomplete or corrupt record"""
+        with open(segment_path, "rb") as segment_file:
+            segment_file.seek(offset)
+
+            while True:
+                record_header = segment_file.read(self._RECORD_HEADER.size)
+
+                if len(record_header) < self._RECORD_HEADER.size:
+                    return offset
+
+                payload_length, payload_crc = self._RECORD_HEADER.unpack(record_header)
+                payload = segment_file.read(payload_length)
+
+                if len(payload) < payload_length or zlib.crc32(payload) != payload_crc:
+                    return offset
+
+                offset += self._RECORD_HEADER.size + payload_length
+
+    def _list_segment_seqs(self) -> List[int]:
+        return sorted(
+            int(file_name[:-len(".log")]) for file_name in os.listdir(self._slot_dir) if file_name.endswith(".log")
+        )
+
+    def _get_segment_path(self, segment_seq: int) -> str:
+        return os.path.join(self._slot_dir, f"{segment_seq:012d}.log")
+
+    def _get_cursor_path(self) -> str:
+        return os.path.join(self._slot_dir, "cursor.json")
+
+    def _encode_record(self, queue_name: str, body: bytes, properties: pika.BasicProperties) -> bytes:
+        payload = b"".join([
+            self._encode_string(queue_name),
+            self._encode_string(properties.content_type or ""),
+            self._encode_string(json.dumps(properties.headers or {})),
+            self._PRIORITY.pack(properties.priority or 0),
+            body
+        ])
+
+        return self._RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+    def _decode_payload(self, payload: bytes) -> SpoolMessage:
+        queue_name, offset = self._decode_string(payload, 0)
+        content_type, offset = self._decode_string(payload, offset)
+        headers, offset = self._decode_string(payload, offset)
+        (priority,) = self._PRIORITY.unpack_from(payload, offset)
+        offset += self._PRIORITY.size
+
+        properties = pika.BasicProperties(
+            content_type=content_type or None,
+            headers=json.loads(headers) or None,
+            priority=priority,
+            delivery_mode=pika.DeliveryMode.Persistent
+        )
+
+        return queue_name, payload[offset:], properties
+
+    def _encode_string(self, string: str) -> bytes:
+        encoded = string.encode()
+        return self._LENGTH.pack(len(encoded)) + encoded
+
+    def _decode_string(self, buffer: bytes, offset: int) -> Tuple[str, int]:
+        (length,) = self._LENGTH.unpack_from(buffer, offset)
+        offset += self._LENGTH.size
+
+        return buffer[offset:offset + length].decode(), offset + length
+
+publish_spool = PublishSpool(
+    settings.POC_PRINT_HUB_PUBLISH_SPOOL_ENABLED,
+    settings.POC_PRINT_HUB_PUBLISH_SPOOL_DIR,
+    settings.POC_PRINT_HUB_PUBLISH_SPOOL_SEGMENT_BYTES,
+    settings.POC_PRINT_HUB_PUBLISH_SPOOL_MAX_BYTES,
+    settings.POC_PRINT_HUB_PUBLISH_SPOOL_FSYNC_INTERVAL_SEC,
+    settings.POC_PRINT_HUB_PUBLISH_SPOOL_FLUSH_BATCH_SIZE
+)
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+import time
+
+from typing import Awaitable, Callable, Optional
+from django.conf import settings
+
+class QueueStatusCache:
+    """Short-lived, in-process cache of queue statuses.
+
+    Concurrent requests that find the cache expired are coalesced: one of
+    them queries the broker while the others wait for its result.
+    """
+    def __init__(self, ttl_sec: float):
+        self.ttl_sec: float = ttl_sec
+
+        self._refresh_lock = threading.Lock()
+        self._async_refresh_lock: Optional[asyncio.Lock] = None
+        self._statuses: Optional[dict] = None
+        self._expires_at: float = 0
+
+    def get(self, fetch_statuses: Callable[[], dict]) -> dict:
+        statuses = self._get_fresh()
+        if statuses is not None:
+            return statuses
+
+        with self._refresh_lock:
+            # refreshed by another request while this one was waiting
+            statuses = self._get_fresh()
+            if statuses is not None:
+                return statuses
+
+            statuses = fetch_statuses()
+
+            self._statuses = statuses
+            self._expires_at = time.monotonic() + self.ttl_sec
+
+            return statuses
+
+    async def aget(self, fetch_statuses: Callable[[], Awaitable[dict]]) -> dict:
+        """Async version of get, coalesces concurrent requests of the running event loop"""
+        statuses = self._get_fresh()
+        if statuses is not None:
+            return statuses
+
+        if self._async_refresh_lock is None:
+            self._async_refresh_lock = asyncio.Lock()
+
+        async with self._async_refresh_lock:
+            statuses = self._get_fresh()
+            if statuses is not None:
+                return statuses
+
+            statuses = await fetch_statuses()
+
+            self._statuses = statuses
+            self._expires_at = time.monotonic() + self.ttl_sec
+
+            return statuses
+
+    def _get_fresh(self) -> Optional[dict]:
+        statuses, expires_at = self._statuses, self._expires_at
+
+        if statuses is None or expires_at < time.monotonic():
+            return None
+
+        return statuses
+
+queue_status_cache = QueueStatusCache(settings.POC_PRINT_HUB_QUEUE_STATUS_CACHE_TTL_SEC)
@@ -0,0 +1,346 @@
+import atexit
+import os
+import threading
+import pika
+
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Set, Tuple, Union
+from django.conf import settings
+from django.db import InterfaceError, OperationalError
+from pika.adapters.blocking_connection import BlockingChannel, ReturnedMessage
+from pika.exceptions import AMQPConnectionError, ConnectionWrongStateError, UnroutableError
+from pocprintapi.services.databasebroker import database_broker
+from pocprintapi.services.metrics import AMQP_CONNECT_SECONDS, AMQP_PUBLISH_SECONDS
+from pocprintapi.services.profiling import span
+
+# errors that mean the underlying connection is gone and a reconnect is worth a retry, database ones for the embedded backend
+RECONNECT_ERRORS = (AMQPConnectionError, ConnectionWrongStateError, InterfaceError, OperationalError)
+
+def build_connection_parameters() -> pika.ConnectionParameters:
+    return pika.ConnectionParameters(
+        host=settings.POC_PRINT_HUB_RABBIT_MQ_HOST,
+        credentials=pika.PlainCredentials(
+            settings.POC_PRINT_HUB_RABBIT_MQ_USERNAME,
+            settings.POC_PRINT_HUB_RABBIT_MQ_PASSWORD
+        )
+    )
+
+def open_connection(parameters: Optional[pika.ConnectionParameters] = None) -> pika.BlockingConnection:
+    """Connection to the queue backend: RabbitMQ, or the database queue shaped like it"""
+    if settings.POC_PRINT_HUB_QUEUE_BACKEND == "database":
+        return database_broker.connect(parameters)
+
+    return pika.BlockingConnection(parameters or build_connection_parameters())
+
+class RabbitPublisher:
+    """Long-lived RabbitMQ publisher, one per process (gunicorn worker).
+
+    Keeps a single connection open across requests along with pools of
+    confirm-mode and transactional channels, remembers declared queues and reconnects once
+    on connection loss. `BlockingConnection` is not thread-safe, so all
+    broker I/O is serialized by a per-publisher lock.
+    """
+    _instance: Optional["RabbitPublisher"] = None
+    _instance_pid: Optional[int] = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def instance(cls) -> "RabbitPublisher":
+        """Returns the publisher owned by the current process"""
+        pid = os.getpid()
+
+        with cls._instance_lock:
+            # a publisher inherited through fork shares its socket with the parent: never reuse it
+            if cls._instance is None or cls._instance_pid != pid:
+                cls._instance = RabbitPublisher(settings.POC_PRINT_HUB_RABBIT_MQ_PUBLISHER_POOL_SIZE)
+                cls._instance_pid = pid
+                atexit.register(cls._instance.close)
+
+            return cls._instance
+
+    def __init__(self, pool_size: int):
+        self.pool_size: int = max(pool_size, 1)
+        self.pool_hits: int = 0
+        self.pool_misses: int = 0
+        self.reconnects: int = 0
+
+        self._lock = threading.RLock()
+        self._connection: Optional[pika.BlockingConnection] = None
+        self._idle_channels: Dict[bool, Deque[BlockingChannel]] = { False: deque(), True: deque() } # by transactional
+        self._declared_queues: Set[str] = set()
+        self._returned_messages: List[ReturnedMessage] = [] # by the broker, during the last transaction
+
+    def publish(
+        self,
+        queue_name: str,
+        queue_durable: bool,
+        body: Union[str, bytes],
+        properties: Optional[pika.BasicProperties] = None
+    ) -> None:
+        """Publishes a message and waits for the broker confirm"""
+        self._run_with_reconnect(self._publish_confirmed, queue_name, queue_durable, body, properties)
+
+    def publish_batch(
+        self,
+        queue_name: str,
+        queue_durable: bool,
+        bodies: List[Union[str, bytes]],
+        properties: Optional[pika.BasicProperties] = None
+    ) -> List[int]:
+        """Publishes messages in a single AMQP transaction: one broker round-trip per batch.
+        Returns the indexes of the bodies the broker still returned as unroutable after declaring the queue again"""
+        properties = properties or self._persistent_properties()
+
+        return self._run_with_reconnect(
+            self._publish_transactional_many,
+            queue_durable,
+            [(queue_name, body, properties) for body in bodies]
+        )
+
+    def publish_many(
+        self,
+        queue_durable: bool,
+        messages: List[Tuple[str, Union[str, bytes], pika.BasicProperties]] # queue name, body, properties
+    ) -> None:
+        """Publishes messages to their own queues in a single AMQP transaction. Raises UnroutableError if the broker
+        still returns some after declaring their queues again, the others are published nonetheless"""
+        with self._lock:
+            returned_indexes = self._run_with_reconnect(self._publish_transactional_many, queue_durable, messages)
+
+            if len(returned_indexes) > 0:
+                raise UnroutableError(list(self._returned_messages))
+
+    @contextmanager
+    def channel(self, transactional: bool = False) -> Iterator[BlockingChannel]:
+        """Borrows a confirm-mode (or transactional) channel from the pool, returns it when done"""
+        with self._lock:
+            channel = self._acquire_channel(transactional)
+
+            try:
+                yield channel
+            except Exception:
+                self._discard_channel(channel)
+                raise
+
+            self._release_channel(channel, transactional)
+
+    def declare_queue(self, channel: BlockingChannel, queue_name: str, queue_durable: bool) -> None:
+        if queue_name in self._declared_queues:
+            return
+
+        channel.queue_declare(
+            queue=queue_name,
+            durable=queue_durable
+        )
+        self._declared_queues.add(queue_name)
+
+    def stats(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "poolHits": self.pool_hits,
+            "poolMisses": self.pool_misses,
+            "reconnects": self.reconnects,
+            "idleChannels": sum(len(channels) for channels in self._idle_channels.values())
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._reset()
+
+    def _run_with_reconnect(self, publish_func: Callable, *args):
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    return publish_func(*args)
+                except RECONNECT_ERRORS as ex:
+                    if attempt > 0:
+                        raise
+
+                    print(f"RabbitMQ publisher connection lost, reconnecting, error: {ex}")
+                    self.reconnects += 1
+                    self._reset()
+
+    def _publish_confirmed(
+        self,
+        queue_name: str,
+        queue_durable: bool,
+        body: Union[str, bytes],
+        properties: Optional[pika.BasicProperties]
+    ) -> None:
+        with self.channel() as channel:
+            self.declare_queue(channel, queue_name, queue_durable)
+
+            for attempt in range(2):
+                try:
+                    with AMQP_PUBLISH_SECONDS.labels("confirm").time(), span("amqp_publish"):
+                        channel.basic_publish(
+                            exchange="",
+                            routing_key=queue_name,
+                            body=body,
+                            properties=properties or self._persistent_properties(),
+                            mandatory=True
+                        )
+
+                    return
+                except UnroutableError:
+                    if attempt > 0:
+                        raise
+
+                    # the queue was deleted since this publisher declared it, e.g. from the management UI
+                    print(f"RabbitMQ queue {queue_name} not found, declaring it again")
+                    self._declared_queues.discard(queue_name)
+                    self.declare_queue(channel, queue_name, queue_durable)
+
+    def _publish_transactional_many(
+        self,
+        queue_durable: bool,
+        messages: List[Tuple[str, Union[str, bytes], pika.BasicProperties]]
+    ) -> List[int]:
+        # BlockingChannel waits for every single publisher confirm, whereas a transaction pipelines
+        # all publishes and waits once on commit; a failed batch is rolled back as a whole
+        with self.channel(transactional=True) as channel:
+            for queue_name in dict.fromkeys(queue_name for queue_name, _, _ in messages):
+                self.declare_queue(channel, queue_name, queue_durable)
+
+            returned_indexes = self._commit_mandatory(channel, messages)
+
+            if len(returned_indexes) == 0:
+                return returned_indexes
+
+            # queues deleted since this publisher declared them, e.g. from the management UI
+            for queue_name in dict.fromkeys(messages[index][0] for index in returned_indexes):
+                print(f"RabbitMQ queue {queue_name} not found, declaring it again")
+                self._declared_queues.discard(queue_name)
+                self.declare_queue(channel, queue_name, queue_durable)
+
+            retried_indexes = self._commit_mandatory(channel, [messages[index] for index in returned_indexes])
+
+            return [returned_indexes[index] for index in retried_indexes]
+
+    def _commit_mandatory(
+        self,
+        channel: BlockingChannel,
+        messages: List[Tuple[str, Union[str, bytes], pika.BasicProperties]]
+    ) -> List[int]:
+        """Publishes messages as mandatory in one transaction, returns the indexes of those the broker returned as unroutable.
+        The others are committed: a transaction is not rolled back for a returned message"""
+        self._returned_messages.clear()
+
+        with AMQP_PUBLISH_SECONDS.labels("transaction").time(), span("amqp_publish"):
+            for queue_name, body, properties in messages:
+                channel.basic_publish(
+                    exchange="",
+                    routing_key=queue_name,
+                    body=body,
+                    properties=properties,
+                    mandatory=True
+                )
+
+            channel.tx_commit()
+
+        # Basic.Return frames arrive before Tx.CommitOk, this dispatches them to _on_message_returned
+        self._connection.process_data_events(time_limit=0)
+
+        if len(self._returned_messages) == 0:
+            return []
+
+        # returns carry no delivery tag: matched by queue name and body, in publish order
+        returned_counts = Counter((message.method.routing_key, message.body) for message in self._returned_messages)
+        returned_indexes = []
+
+        for index, (queue_name, body, _) in enumerate(messages):
+            key = (queue_name, body.encode() if isinstance(body, str) else body)
+
+            if returned_counts[key] > 0:
+                returned_counts[key] -= 1
+                returned_indexes.append(index)
+
+        return returned_indexes
+
+    def _on_message_returned(
+        self,
+        channel: BlockingChannel,
+        method: pika.spec.Basic.Return,
+        properties: pika.BasicProperties,
+        body: bytes
+    ) -> None:
+        self._returned_messages.append(ReturnedMessage(method, properties, body))
+
+    def _persistent_properties(self) -> pika.BasicProperties:
+        return pika.BasicProperties(
+            delivery_mode=pika.DeliveryMode.Persistent
+        )
+
+    def _acquire_channel(self, transactional: bool) -> BlockingChannel:
+        connection = self._get_connection()
+
+        # services heartbeats of an idle connection and surfaces a dead one before publishing
+        connection.process_data_events(time_limit=0)
+
+        idle_channels = self._idle_channels[transactional]
+
+        while len(idle_channels) > 0:
+            channel = idle_channels.pop()
+
+            if channel.is_open:
+                self.pool_hits += 1
+                return channel
+
+        self.pool_misses += 1
+
+        channel = connection.channel()
+
+        if transactional:
+            channel.tx_select()
+            # confirm-mode channels raise UnroutableError instead
+            channel.add_on_return_callback(self._on_message_returned)
+        else:
+            channel.confirm_delivery()
+
+        return channel
+
+    def _release_channel(self, channel: BlockingChannel, transactional: bool) -> None:
+        idle_channels = self._idle_channels[transactional]
+
+        if channel.is_open and len(idle_channels) < self.pool_size:
+            idle_channels.append(channel)
+            return
+
+        self._discard_channel(channel)
+
+    def _discard_channel(self, channel: BlockingChannel) -> None:
+        try:
+            if channel.is_open:
+                channel.close()
+        except Exception as ex:
+            print(f"Failed to close RabbitMQ publisher channel, error: {ex}")
+
+    def _get_connection(self) -> pika.BlockingConnection:
+        if self._connection is not None and self._connection.is_open:
+            return self._connection
+
+        if self._connection is not None:
+            self.reconnects += 1
+            self._reset()
+
+        with AMQP_CONNECT_SECONDS.labels("sync").time(), span("amqp_connect"):
+            self._connection = open_connection()
+
+        return self._connection
+
+    def _reset(self) -> None:
+        for idle_channels in self._idle_channels.values():
+            idle_channels.clear()
+        self._declared_queues.clear()
+
+        if self._connection is None:
+            return
+
+        try:
+            if self._connection.is_open:
+                self._connection.close()
+        except Exception as ex:
+            print(f"Failed to close RabbitMQ publisher connection, error: {ex}")
+        finally:
+            self._connection = None
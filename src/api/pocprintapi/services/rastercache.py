@@ -0,0 +1,189 @@
+import hashlib
+import os
+import tempfile
+import threading
+
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from django.conf import settings
+from pocprintapi.services.metrics import RASTER_CACHE_LOOKUPS
+
+class RasterCache:
+    """Bounded cache of rendered ESC/POS raster bytes, by content hash.
+
+    Image, QR code and barcode bodies take a decode, a resize and a dither
+    to render, and the same logos and links come back over and over. The
+    final bytes are kept in an in-process LRU, backed by a directory shared
+    by the print queue consumer and Celery worker processes. On disk, the
+    least recently used files are evicted once the directory grows past its
+    bound; a hit refreshes the file's modification time.
+    """
+    FILE_SUFFIX: str = ".escpos"
+
+    def __init__(self, memory_max_bytes: int, directory: str, disk_max_bytes: int):
+        self.memory_max_bytes: int = memory_max_bytes
+        self.directory: str = directory
+        self.disk_max_bytes: int = disk_max_bytes # 0 disables the disk cache
+
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, bytes] = OrderedDict() # key -> raster bytes
+        self._memory_bytes: int = 0
+        self._disk_bytes: Optional[int] = None # counted on first write, re-counted on eviction
+
+    def key(self, *parts: str) -> str:
+        """Content hash of everything the rendered bytes depend on"""
+        return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            raster = self._entries.get(key)
+
+            if raster is not None:
+                self._entries.move_to_end(key)
+                RASTER_CACHE_LOOKUPS.labels("memory").inc()
+
+                return raster
+
+        raster = self._read_file(key)
+
+        if raster is None:
+            RASTER_CACHE_LOOKUPS.labels("miss").inc()
+            return None
+
+        RASTER_CACHE_LOOKUPS.labels("disk").inc()
+        self._set_in_memory(key, raster)
+
+        return raster
+
+    def set(self, key: str, raster: bytes) -> None:
+        self._set_in_memory(key, raster)
+
+        if self.disk_max_bytes > 0:
+            try:
+                self._write_file(key, raster)
+            except OSError as ex:
+                print(f"Failed to write raster cache file, error: {ex}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._memory_bytes = 0
+
+    def _set_in_memory(self, key: str, raster: bytes) -> None:
+        # larger than the whole memory budget: disk only
+        if len(raster) > self.memory_max_bytes:
+            return
+
+        with self._lock:
+            previous_raster = self._entries.pop(key, None)
+
+            if previous_raster is not None:
+                self._memory_bytes -= len(previous_raster)
+
+            self._entries[key] = raster
+            self._memory_bytes += len(raster)
+
+            while self._memory_bytes > self.memory_max_bytes:
+                _, evicted_raster = self._entries.popitem(last=False)
+                self._memory_bytes -= len(evicted_raster)
+
+    def _get_file_path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.FILE_SUFFIX)
+
+    def _read_file(self, key: str) -> Optional[bytes]:
+        if self.disk_max_bytes <= 0:
+            return None
+
+        file_path = self._get_file_path(key)
+
+        try:
+            with open(file_path, "rb") as raster_file:
+                raster = raster_file.read()
+
+            # most recently used, evicted last
+            os.utime(file_path)
+        except FileNotFoundError:
+            return None
+        except OSError as ex:
+            print(f"Failed to read raster cache file {file_path}, error: {ex}")
+            return None
+
+        return raster
+
+    def _write_file(self, key: str, raster: bytes) -> None:
+        # write-then-rename: other processes read whole files or none
+        os.makedirs(self.directory, exist_ok=True)
+        file_descriptor, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        file_path = self._get_file_path(key)
+
+        try:
+            with os.fdopen(file_descriptor, "wb") as temp_file:
+                temp_file.write(raster)
+
+            # the same render written by another process meanwhile is replaced, its bytes are not counted twice
+            try:
+                replaced_size = os.stat(file_path).st_size
+            except FileNotFoundError:
+                replaced_size = 0
+
+            os.replace(temp_path, file_path)
+        except Exception:
+            os.unlink(temp_path)
+            raise
+
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += len(raster) - replaced_size
+
+        if self._count_disk_bytes() > self.disk_max_bytes:
+            self._evict_files()
+
+    def _count_disk_bytes(self) -> int:
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, _, size in self._list_files())
+
+            return self._disk_bytes
+
+    def _evict_files(self) -> None:
+        """Deletes the least recently used files down to 3/4 of the bound, so evictions are not paid on every write"""
+        # other processes write to the same directory: listed again rather than tracked
+        files = sorted(self._list_files())
+        disk_bytes = sum(size for _, _, size in files)
+
+        for _, file_path, size in files:
+            if disk_bytes <= self.disk_max_bytes * 3 // 4:
+                break
+
+            try:
+                os.unlink(file_path)
+            except FileNotFoundError:
+                pass # evicted by another process
+
+            disk_bytes -= size
+
+        with self._lock:
+            self._disk_bytes = disk_bytes
+
+    def _list_files(self) -> List[Tuple[float, str, int]]: # modified at, path, size of every cache file
+        files = []
+
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith(self.FILE_SUFFIX):
+                    continue
+
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+
+                files.append((stat.st_mtime, entry.path, stat.st_size))
+
+        return files
+
+raster_cache = RasterCache(
+    settings.POC_PRINT_HUB_RASTER_CACHE_MEMORY_BYTES,
+    settings.POC_PRINT_HUB_RASTER_CACHE_DIR,
+    settings.POC_PRINT_HUB_RASTER_CACHE_DISK_BYTES
+)
@@ -0,0 +1,48 @@
+import os
+import time
+
+from typing import Optional
+from django.conf import settings
+from pocprintapi.services.jsonfile import read_json_file, write_json_file_atomically
+
+class RepublishProgress:
+    """Progress of the latest dead-letter republish job, shared between the Celery worker and API workers through a JSON file"""
+    STALE_AFTER_SEC: float = 60.0
+
+    def __init__(self, file_path: str):
+        self.file_path: str = file_path
+
+    def build(self, state: str) -> dict:
+        return {
+            "state": state, # queued, running, completed, failed
+            "total": 0,
+            "republished": 0,
+            "startedAt": time.time(),
+            "updatedAt": time.time(),
+            "error": None
+        }
+
+    def read(self) -> Optional[dict]:
+        progress = read_json_file(self.file_path)
+
+        if progress is None:
+            return None
+
+        # a job whose worker died never reports back: do not let it block new jobs forever
+        if progress["state"] in ["queued", "running"] and time.time() - progress["updatedAt"] > self.STALE_AFTER_SEC:
+            progress["state"] = "failed"
+            progress["error"] = "Job stopped reporting progress"
+
+        return progress
+
+    def write(self, progress: dict) -> None:
+        progress["updatedAt"] = time.time()
+        write_json_file_atomically(self.file_path, progress)
+
+    def clear(self) -> None:
+        try:
+            os.remove(self.file_path)
+        except FileNotFoundError:
+            pass
+
+republish_progress = RepublishProgress(settings.POC_PRINT_HUB_REPUBLISH_PROGRESS_FILE)
@@ -0,0 +1,190 @@
+import re
+import threading
+import time
+
+from typing import Dict, List, Optional
+from django.conf import settings
+from pocprintapi.models import TenantAuthConfig
+from pocprintapi.services.jsonfile import read_json_file, write_json_file_atomically
+
+QUEUE_NAME_UNSAFE_PATTERN = re.compile(r"[^A-Za-z0-9_.-]")
+
+class TenantScheduler:
+    """Fair share of the shared print queue lanes between tenants.
+
+    Each lane gets a sub-queue per tenant configured in the database, next to
+    the lane queue itself, which keeps messages published without a known
+    tenant. Within the lane picked by priority, the sub-queues with messages
+    waiting are served by smooth weighted round-robin: a tenant of weight w
+    out of a total of W is served w times every W picks, however deep the
+    other sub-queues are.
+
+    The tenant id and publish time of a message travel in its AMQP headers,
+    for the wait time metric and to route it back to its sub-queue when it
+    is republished.
+
+    The tenants with sub-queues are kept in a state file, so that the
+    sub-queues of a deleted tenant, or of every tenant once fair scheduling is
+    turned off, are known as retired, across restarts too, until their
+    messages are moved back onto the lane queue.
+    """
+    TENANT_HEADER: str = "tenantId"
+    PUBLISHED_AT_HEADER: str = "publishedAt"
+    TENANTS_REFRESH_INTERVAL_SEC: float = 30.0
+    # processes that still route to the sub-queues of a deleted tenant refresh their tenants within this
+    RETIRED_GRACE_SEC: float = TENANTS_REFRESH_INTERVAL_SEC * 2
+
+    def __init__(self, enabled: bool, weights: Dict[str, int], tenant_queues_file_path: str):
+        self.enabled: bool = enabled
+        self.weights: Dict[str, int] = weights # tenant id -> weight, 1 if not set
+        self.tenant_queues_file_path: str = tenant_queues_file_path
+
+        self._lock = threading.Lock()
+        self._tenant_ids: Optional[List[str]] = None
+        self._tenant_ids_expire_at: float = 0
+        self._tenant_by_queue: Dict[str, Optional[str]] = {} # sub-queue name -> tenant id
+        self._current_weights: Dict[str, int] = {} # sub-queue name -> smooth weighted round-robin state
+        self._has_retired_tenants: bool = False
+        self._retired_checked_at: float = 0
+
+    def queue_name(self, lane_queue_name: str, tenant_id: Optional[str]) -> str:
+        if tenant_id is None:
+            return lane_queue_name
+
+        queue_name = f"{lane_queue_name}_tenant_{QUEUE_NAME_UNSAFE_PATTERN.sub('_', tenant_id)}"
+        self._tenant_by_queue[queue_name] = tenant_id
+
+        return queue_name
+
+    def sub_queue_names(self, lane_queue_name: str) -> List[str]:
+        """Queues of a lane: the lane queue itself, then the sub-queue of every tenant"""
+        if not self.enabled:
+            return [lane_queue_name]
+
+        return [lane_queue_name] + [self.queue_name(lane_queue_name, tenant_id) for tenant_id in self.tenant_ids()]
+
+    def route(self, lane_queue_name: str, tenant_id: Optional[str]) -> str:
+        """Queue of a lane to publish to: the tenant sub-queue if the tenant is known, the lane queue otherwise"""
+        if not self.enabled or tenant_id is None or tenant_id not in self.tenant_ids():
+            return lane_queue_name
+
+        return self.queue_name(lane_queue_name, tenant_id)
+
+    def tenant_of(self, queue_name: str) -> Optional[str]:
+        """Tenant of a sub-queue, None for a lane queue"""
+        return self._tenant_by_queue.get(queue_name)
+
+    def tenant_ids(self) -> List[str]:
+        """Tenants with sub-queues, re-read from the database every TENANTS_REFRESH_INTERVAL_SEC"""
+        tenant_ids = self._get_fresh_tenant_ids()
+
+        if tenant_ids is None:
+            tenant_ids = sorted(TenantAuthConfig.objects.values_list("tenant_id", flat=True))
+            self._set_tenant_ids(tenant_ids)
+
+        return tenant_ids
+
+    async def arefresh(self) -> None:
+        """Async version of the tenant_ids refresh, for the sync methods to find them cached on the event loop"""
+        if not self.enabled or self._get_fresh_tenant_ids() is not None:
+            return
+
+        tenant_ids = [tenant_id async for tenant_id in TenantAuthConfig.objects.values_list("tenant_id", flat=True)]
+        self._set_tenant_ids(sorted(tenant_ids))
+
+    def retired_tenant_ids(self) -> List[str]:
+        """Tenants whose sub-queues are no longer served, but may still hold messages: deleted ones, or all of them
+        with fair scheduling turned off. Records the tenants served meanwhile, for their sub-queues to be known later"""
+        served_tenant_ids = self.tenant_ids() if self.enabled else []
+        tenant_queues = read_json_file(self.tenant_queues_file_path) or {} # tenant id -> retired at, None while served
+        updated_tenant_queues = { tenant_id: None for tenant_id in served_tenant_ids }
+
+        for tenant_id, retired_at in tenant_queues.items():
+            if tenant_id not in updated_tenant_queues:
+                updated_tenant_queues[tenant_id] = retired_at or time.time()
+
+        if updated_tenant_queues != tenant_queues:
+            write_json_file_atomically(self.tenant_queues_file_path, updated_tenant_queues)
+
+        retired_tenant_ids = sorted(tenant_id for tenant_id, retired_at in updated_tenant_queues.items() if retired_at is not None)
+
+        with self._lock:
+            self._has_retired_tenants = len(retired_tenant_ids) > 0
+            self._retired_checked_at = time.monotonic()
+
+        return retired_tenant_ids
+
+    def is_retired_check_due(self) -> bool:
+        """Whether retired sub-queues are left to check again, for a consumer that keeps running"""
+        with self._lock:
+            return self._has_retired_tenants and time.monotonic() - self._retired_checked_at >= self.TENANTS_REFRESH_INTERVAL_SEC
+
+    def forget_retired(self, tenant_id: str) -> None:
+        """Drops a retired tenant whose sub-queues were found empty, once no process routes to them anymore"""
+        tenant_queues = read_json_file(self.tenant_queues_file_path) or {}
+        retired_at = tenant_queues.get(tenant_id)
+
+        if retired_at is None or time.time() - retired_at < self.RETIRED_GRACE_SEC:
+            return
+
+        del tenant_queues[tenant_id]
+        write_json_file_atomically(self.tenant_queues_file_path, tenant_queues)
+
+    def pick(self, waiting_queue_names: List[str]) -> str:
+        """Picks the sub-queue to print from next out of those of a lane with messages waiting"""
+        if len(waiting_queue_names) == 1:
+            return waiting_queue_names[0]
+
+        with self._lock:
+            picked_queue_name = None
+            total_weight = 0
+
+            for queue_name in waiting_queue_names:
+                weight = self.get_weight(self.tenant_of(queue_name))
+                self._current_weights[queue_name] = self._current_weights.get(queue_name, 0) + weight
+                total_weight += weight
+
+                if picked_queue_name is None or self._current_weights[queue_name] > self._current_weights[picked_queue_name]:
+                    picked_queue_name = queue_name
+
+            self._current_weights[picked_queue_name] -= total_weight
+
+            return picked_queue_name
+
+    def get_weight(self, tenant_id: Optional[str]) -> int:
+        return self.weights.get(tenant_id, 1) if tenant_id is not None else 1
+
+    def _get_fresh_tenant_ids(self) -> Optional[List[str]]:
+        with self._lock:
+            if self._tenant_ids is None or time.monotonic() >= self._tenant_ids_expire_at:
+                return None
+
+            return self._tenant_ids
+
+    def _set_tenant_ids(self, tenant_ids: List[str]) -> None:
+        with self._lock:
+            self._tenant_ids = tenant_ids
+            self._tenant_ids_expire_at = time.monotonic() + self.TENANTS_REFRESH_INTERVAL_SEC
+
+def parse_tenant_weights(weights: str) -> Dict[str, int]: # tenant id -> weight
+    """Parses `tenant=weight` comma-separated entries"""
+    parsed_weights = {}
+
+    for entry in weights.split(","):
+        if entry.strip() == "":
+            continue
+
+        tenant_id, separator, weight = entry.strip().rpartition("=")
+
+        if separator == "" or tenant_id == "" or not weight.isdigit() or int(weight) < 1:
+            raise ValueError(f"Invalid tenant weight: '{entry}', should be tenant=weight with weight >= 1")
+
+        parsed_weights[tenant_id] = int(weight)
+
+    return parsed_weights
+
+tenant_scheduler = TenantScheduler(
+    settings.POC_PRINT_HUB_TENANT_FAIR_SCHEDULING_ENABLED,
+    parse_tenant_weights(settings.POC_PRINT_HUB_TENANT_WEIGHTS),
+    settings.POC_PRINT_HUB_TENANT_QUEUES_FILE
+)
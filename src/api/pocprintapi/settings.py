@@ -8,9 +8,19 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = os.environ.get('SECRET_KEY', 'by-using-default-secrets-I-am-running-away-from-my-responsibilities-and-it-feels-good') # - Michael Scott =)
 DEBUG = os.environ.get('DEBUG', 'False') == 'True'
 
+POC_PRINT_HUB_ASYNC_ENDPOINTS_ENABLED = os.environ.get('POC_PRINT_HUB_ASYNC_ENDPOINTS_ENABLED', 'False') == 'True'
+
 POC_PRINT_HUB_TENANT_AUTH_ENABLED = os.environ.get('POC_PRINT_HUB_TENANT_AUTH_ENABLED', 'True') == 'True'
 POC_PRINT_HUB_TENANT_ID_HEADER = 'Pph-Tenant-Id'
 POC_PRINT_HUB_TENANT_TOKEN_HEADER = 'Pph-Tenant-Token'
+POC_PRINT_HUB_TENANT_AUTH_CACHE_SIZE = int(os.environ.get('POC_PRINT_HUB_TENANT_AUTH_CACHE_SIZE', '1024'))
+POC_PRINT_HUB_TENANT_AUTH_CACHE_TTL_SEC = float(os.environ.get('POC_PRINT_HUB_TENANT_AUTH_CACHE_TTL_SEC', '60.0'))
+
+POC_PRINT_HUB_QUEUE_BACKEND = os.environ.get('POC_PRINT_HUB_QUEUE_BACKEND', 'rabbitmq')
+POC_PRINT_HUB_DATABASE_QUEUE_POLL_INTERVAL_SEC = float(os.environ.get('POC_PRINT_HUB_DATABASE_QUEUE_POLL_INTERVAL_SEC', '0.5'))
+POC_PRINT_HUB_DATABASE_QUEUE_LEASE_SEC = float(os.environ.get('POC_PRINT_HUB_DATABASE_QUEUE_LEASE_SEC', '60.0'))
+POC_PRINT_HUB_DATABASE_QUEUE_EMBEDDED_CONSUMER = os.environ.get('POC_PRINT_HUB_DATABASE_QUEUE_EMBEDDED_CONSUMER', 'False') == 'True'
+POC_PRINT_HUB_DATABASE_QUEUE_EMBEDDED_CONSUMER_LOCK_PATH = os.environ.get('POC_PRINT_HUB_DATABASE_QUEUE_EMBEDDED_CONSUMER_LOCK_PATH', '/tmp/poc_print_hub_consumer.lock')
 
 POC_PRINT_HUB_RABBIT_MQ_HOST = os.environ.get('POC_PRINT_HUB_RABBIT_MQ_HOST')
 POC_PRINT_HUB_RABBIT_MQ_USERNAME = os.environ.get('POC_PRINT_HUB_RABBIT_MQ_USERNAME')
@@ -18,17 +28,65 @@ POC_PRINT_HUB_RABBIT_MQ_PASSWORD = os.environ.get('POC_PRINT_HUB_RABBIT_MQ_PASSW
 POC_PRINT_HUB_RABBIT_MQ_QUEUE_NAME = os.environ.get('POC_PRINT_HUB_RABBIT_MQ_QUEUE_NAME', 'poc_print_hub')
 POC_PRINT_HUB_RABBIT_MQ_QUEUE_DURABLE = os.environ.get('POC_PRINT_HUB_RABBIT_MQ_QUEUE_DURABLE', 'True') == 'True'
 POC_PRINT_HUB_RABBIT_MQ_QUEUE_BATCH_SIZE = int(os.environ.get('POC_PRINT_HUB_RABBIT_MQ_QUEUE_BATCH_SIZE', '10'))
+POC_PRINT_HUB_DIGEST_ENABLED = os.environ.get('POC_PRINT_HUB_DIGEST_ENABLED', 'False') == 'True'
+POC_PRINT_HUB_DIGEST_GROUP_BY_ORIGIN = os.environ.get('POC_PRINT_HUB_DIGEST_GROUP_BY_ORIGIN', 'False') == 'True'
+POC_PRINT_HUB_DIGEST_MIN_MESSAGES = int(os.environ.get('POC_PRINT_HUB_DIGEST_MIN_MESSAGES', '2'))
+POC_PRINT_HUB_PRIORITY_LANE_STARVATION_LIMIT = int(os.environ.get('POC_PRINT_HUB_PRIORITY_LANE_STARVATION_LIMIT', '10'))
+POC_PRINT_HUB_TENANT_FAIR_SCHEDULING_ENABLED = os.environ.get('POC_PRINT_HUB_TENANT_FAIR_SCHEDULING_ENABLED', 'False') == 'True'
+POC_PRINT_HUB_TENANT_WEIGHTS = os.environ.get('POC_PRINT_HUB_TENANT_WEIGHTS', '')
+POC_PRINT_HUB_TENANT_QUEUES_FILE = os.environ.get('POC_PRINT_HUB_TENANT_QUEUES_FILE', '/tmp/poc_print_hub_tenant_queues.json')
 POC_PRINT_HUB_RABBIT_MQ_DEAD_QUEUE_NAME = os.environ.get('POC_PRINT_HUB_RABBIT_MQ_DEAD_QUEUE_NAME', 'poc_print_hub_dead_letter')
 POC_PRINT_HUB_RABBIT_MQ_DEAD_QUEUE_DURABLE = os.environ.get('POC_PRINT_HUB_RABBIT_MQ_DEAD_QUEUE_DURABLE', 'True') == 'True'
+POC_PRINT_HUB_MESSAGE_CODEC = os.environ.get('POC_PRINT_HUB_MESSAGE_CODEC', 'json')
+POC_PRINT_HUB_MESSAGE_COMPRESSION_MIN_BYTES = int(os.environ.get('POC_PRINT_HUB_MESSAGE_COMPRESSION_MIN_BYTES', '1024'))
+POC_PRINT_HUB_RABBIT_MQ_PUBLISHER_POOL_SIZE = int(os.environ.get('POC_PRINT_HUB_RABBIT_MQ_PUBLISHER_POOL_SIZE', '2'))
+POC_PRINT_HUB_QUEUE_STATUS_CACHE_TTL_SEC = float(os.environ.get('POC_PRINT_HUB_QUEUE_STATUS_CACHE_TTL_SEC', '2.0'))
+POC_PRINT_HUB_PUBLISH_BATCH_MAX_SIZE = int(os.environ.get('POC_PRINT_HUB_PUBLISH_BATCH_MAX_SIZE', '500'))
+POC_PRINT_HUB_DEDUP_MODE = os.environ.get('POC_PRINT_HUB_DEDUP_MODE', 'off')
+POC_PRINT_HUB_DEDUP_WINDOW_SEC = float(os.environ.get('POC_PRINT_HUB_DEDUP_WINDOW_SEC', '60.0'))
+POC_PRINT_HUB_DEDUP_MAX_ENTRIES = int(os.environ.get('POC_PRINT_HUB_DEDUP_MAX_ENTRIES', '1024'))
+POC_PRINT_HUB_DEDUP_INDEX_FILE = os.environ.get('POC_PRINT_HUB_DEDUP_INDEX_FILE', '/tmp/poc_print_hub_dedup_index.json')
+POC_PRINT_HUB_PUBLISH_SPOOL_ENABLED = os.environ.get('POC_PRINT_HUB_PUBLISH_SPOOL_ENABLED', 'False') == 'True'
+POC_PRINT_HUB_PUBLISH_SPOOL_DIR = os.environ.get('POC_PRINT_HUB_PUBLISH_SPOOL_DIR', '/tmp/poc_print_hub_publish_spool')
+POC_PRINT_HUB_PUBLISH_SPOOL_SEGMENT_BYTES = int(os.environ.get('POC_PRINT_HUB_PUBLISH_SPOOL_SEGMENT_BYTES', '4194304'))
+POC_PRINT_HUB_PUBLISH_SPOOL_MAX_BYTES = int(os.environ.get('POC_PRINT_HUB_PUBLISH_SPOOL_MAX_BYTES', '268435456'))
+POC_PRINT_HUB_PUBLISH_SPOOL_FSYNC_INTERVAL_SEC = float(os.environ.get('POC_PRINT_HUB_PUBLISH_SPOOL_FSYNC_INTERVAL_SEC', '0.05'))
+POC_PRINT_HUB_PUBLISH_SPOOL_FLUSH_BATCH_SIZE = int(os.environ.get('POC_PRINT_HUB_PUBLISH_SPOOL_FLUSH_BATCH_SIZE', '500'))
 
 POC_PRINT_HUB_QUEUE_SCHEDULE_SEC = float(os.environ.get('POC_PRINT_HUB_QUEUE_SCHEDULE_SEC', '5.0'))
 POC_PRINT_HUB_QUEUE_MAX_RETRIES = int(os.environ.get('POC_PRINT_HUB_QUEUE_MAX_RETRIES', '3'))
 POC_PRINT_HUB_QUEUE_RETRY_DELAY_SEC = int(os.environ.get('POC_PRINT_HUB_QUEUE_RETRY_DELAY_SEC', '3'))
 POC_PRINT_HUB_QUEUE_TIME_LIMIT_SEC = int(os.environ.get('POC_PRINT_HUB_QUEUE_TIME_LIMIT_SEC', '300'))
 
+POC_PRINT_HUB_REPUBLISH_CHUNK_SIZE = int(os.environ.get('POC_PRINT_HUB_REPUBLISH_CHUNK_SIZE', '500'))
+POC_PRINT_HUB_REPUBLISH_RATE_LIMIT_PER_SEC = float(os.environ.get('POC_PRINT_HUB_REPUBLISH_RATE_LIMIT_PER_SEC', '0'))
+POC_PRINT_HUB_REPUBLISH_TIME_LIMIT_SEC = int(os.environ.get('POC_PRINT_HUB_REPUBLISH_TIME_LIMIT_SEC', '3600'))
+POC_PRINT_HUB_REPUBLISH_PROGRESS_FILE = os.environ.get('POC_PRINT_HUB_REPUBLISH_PROGRESS_FILE', '/tmp/poc_print_hub_republish_progress.json')
+
+POC_PRINT_HUB_CONSUMER_PREFETCH_COUNT = int(os.environ.get('POC_PRINT_HUB_CONSUMER_PREFETCH_COUNT', '10'))
+POC_PRINT_HUB_CONSUMER_PRINTER_IDLE_TIMEOUT_SEC = float(os.environ.get('POC_PRINT_HUB_CONSUMER_PRINTER_IDLE_TIMEOUT_SEC', '10.0'))
+
 POC_PRINT_HUB_PRINTER_HOST = os.environ.get('POC_PRINT_HUB_PRINTER_HOST')
+POC_PRINT_HUB_PRINTER_NAME = os.environ.get('POC_PRINT_HUB_PRINTER_NAME', 'RP326')
+POC_PRINT_HUB_PRINTERS = os.environ.get('POC_PRINT_HUB_PRINTERS', '')
+POC_PRINT_HUB_PRINTER_ROUTES = os.environ.get('POC_PRINT_HUB_PRINTER_ROUTES', '')
+POC_PRINT_HUB_PRINTER_FAILOVER_AFTER_SEC = float(os.environ.get('POC_PRINT_HUB_PRINTER_FAILOVER_AFTER_SEC', '30.0'))
 POC_PRINT_HUB_PRINTER_MESSAGE_SEPARATOR = os.environ.get('POC_PRINT_HUB_PRINTER_MESSAGE_SEPARATOR', '----------')
 POC_PRINT_HUB_PRINTER_CHECK_PAPER_STATUS = os.environ.get('POC_PRINT_HUB_PRINTER_CHECK_PAPER_STATUS', 'True') == 'True'
+POC_PRINT_HUB_PRINTER_CUT_AFTER_MESSAGE = os.environ.get('POC_PRINT_HUB_PRINTER_CUT_AFTER_MESSAGE', 'False') == 'True'
+POC_PRINT_HUB_PRINTER_WIDTH_DOTS = int(os.environ.get('POC_PRINT_HUB_PRINTER_WIDTH_DOTS', '576'))
+POC_PRINT_HUB_RASTER_CACHE_MEMORY_BYTES = int(os.environ.get('POC_PRINT_HUB_RASTER_CACHE_MEMORY_BYTES', '16777216'))
+POC_PRINT_HUB_RASTER_CACHE_DIR = os.environ.get('POC_PRINT_HUB_RASTER_CACHE_DIR', '/tmp/poc_print_hub_raster_cache')
+POC_PRINT_HUB_RASTER_CACHE_DISK_BYTES = int(os.environ.get('POC_PRINT_HUB_RASTER_CACHE_DISK_BYTES', '134217728'))
+POC_PRINT_HUB_PRINTER_STATUS_FILE = os.environ.get('POC_PRINT_HUB_PRINTER_STATUS_FILE', '/tmp/poc_print_hub_printer_status.json')
+POC_PRINT_HUB_PRINTER_STATUS_PROBE_INTERVAL_SEC = float(os.environ.get('POC_PRINT_HUB_PRINTER_STATUS_PROBE_INTERVAL_SEC', '5.0'))
+POC_PRINT_HUB_PRINTER_STATUS_MAX_AGE_SEC = float(os.environ.get('POC_PRINT_HUB_PRINTER_STATUS_MAX_AGE_SEC', '15.0'))
+POC_PRINT_HUB_METRICS_DIR = os.environ.get('POC_PRINT_HUB_METRICS_DIR', '/tmp/poc_print_hub_metrics')
+POC_PRINT_HUB_METRICS_AUTH_ENABLED = os.environ.get('POC_PRINT_HUB_METRICS_AUTH_ENABLED', 'False') == 'True'
+POC_PRINT_HUB_PROFILING_ENABLED = os.environ.get('POC_PRINT_HUB_PROFILING_ENABLED', 'False') == 'True'
+POC_PRINT_HUB_PROFILING_SLOW_REQUEST_MS = float(os.environ.get('POC_PRINT_HUB_PROFILING_SLOW_REQUEST_MS', '500'))
+POC_PRINT_HUB_PROFILING_SAMPLE_RATE = float(os.environ.get('POC_PRINT_HUB_PROFILING_SAMPLE_RATE', '0'))
+POC_PRINT_HUB_PROFILING_DUMP_DIR = os.environ.get('POC_PRINT_HUB_PROFILING_DUMP_DIR', '/tmp/poc_print_hub_profiles')
 
 CELERY_BROKER_URL = f"amqp://{POC_PRINT_HUB_RABBIT_MQ_USERNAME}:{POC_PRINT_HUB_RABBIT_MQ_PASSWORD}@{POC_PRINT_HUB_RABBIT_MQ_HOST}:5672//"
 
@@ -59,6 +117,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'pocprintapi.middleware.RequestProfilingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -104,6 +163,23 @@ DATABASES = {
     }
 }
 
+# single-file database instead of PostgreSQL, for small deployments
+DATABASES_SQLITE_PATH = os.environ.get('DATABASES_SQLITE_PATH')
+
+if DATABASES_SQLITE_PATH:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": DATABASES_SQLITE_PATH,
+            'OPTIONS': {
+                # readers do not block the writer, writers queue up instead of failing right away
+                'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20
+            },
+        }
+    }
+
 STATIC_ROOT = BASE_DIR / "staticfiles"
 STORAGES = {
     "staticfiles": {
@@ -0,0 +1,195 @@
+import json
+import os
+import tempfile
+import time
+import pika
+
+from unittest import mock
+from django.conf import settings
+from django.test import TransactionTestCase, override_settings
+from pocprintapi.benchmarks.standins import DatabaseBenchmarkBroker, InMemoryBroker
+from pocprintapi.benchmarks.suite import SAMPLE_REQUEST_BODY, standins_installed
+from pocprintapi.models import QueueMessage
+from pocprintapi.services.databasebroker import database_broker
+from pocprintapi.services.printservice import PrintService
+from pocprintapi.services.queuestatuscache import queue_status_cache
+from pocprintapi.services.rabbitpublisher import open_connection
+from pocprintapi.services.tenantscheduler import tenant_scheduler
+
+class QueueBackendTests:
+    """The queue behaviour PrintService relies on, run against each queue backend by the subclasses below"""
+    queue_backend: str
+
+    def setUp(self):
+        self.broker = self.build_broker()
+        self.print_service = PrintService()
+
+        self.enterContext(standins_installed(self.broker))
+        self.enterContext(override_settings(POC_PRINT_HUB_QUEUE_BACKEND=self.queue_backend))
+        self.enterContext(mock.patch.object(queue_status_cache, "ttl_sec", 0))
+
+    def build_broker(self):
+        raise NotImplementedError()
+
+    def test_publish_is_counted_in_queue_status(self):
+        for _ in range(3):
+            response = self.print_service.publish(SAMPLE_REQUEST_BODY)
+            self.assertEqual(response.status_code, 200)
+
+        status_body = self.print_service.get_queue_status().data
+
+        self.assertEqual(status_body["print"]["count"], 3)
+        self.assertEqual(status_body["deadLetter"]["count"], 0)
+
+    def test_drain_prints_and_acks(self):
+        for _ in range(3):
+            self.print_service.publish(SAMPLE_REQUEST_BODY)
+
+        self.print_service.process_queue_messages()
+
+        self.assertEqual(self.broker.message_count(settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_NAME), 0)
+        self.assertEqual(self.broker.message_count(settings.POC_PRINT_HUB_RABBIT_MQ_DEAD_QUEUE_NAME), 0)
+
+    def test_nack_requeues_or_drops(self):
+        queue_name = settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_NAME
+        self.broker.fill(queue_name, [b"first", b"second"])
+
+        connection = open_connection()
+        channel = connection.channel()
+
+        method_frame, _, body = channel.basic_get(queue_name)
+        self.assertEqual(body, b"first")
+
+        channel.basic_nack(method_frame.delivery_tag, requeue=True)
+        method_frame, _, body = channel.basic_get(queue_name)
+        self.assertEqual(body, b"first") # back at the head of the queue
+
+        channel.basic_nack(method_frame.delivery_tag, requeue=False)
+        method_frame, _, body = channel.basic_get(queue_name)
+        self.assertEqual(body, b"second")
+
+        channel.basic_ack(method_frame.delivery_tag)
+        connection.close()
+
+        self.assertEqual(self.broker.message_count(queue_name), 0)
+
+    def test_close_returns_unacked_messages(self):
+        queue_name = settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_NAME
+        self.broker.fill(queue_name, [b"first"])
+
+        connection = open_connection()
+        connection.channel().basic_get(queue_name)
+        connection.close()
+
+        self.assertEqual(self.broker.message_count(queue_name), 1)
+
+    def test_failed_print_is_dead_lettered(self):
+        self.print_service.publish(SAMPLE_REQUEST_BODY)
+        self.broker.fill(settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_NAME, [b"not a message"], pika.BasicProperties(content_type="application/json"))
+
+        self.print_service.process_queue_messages()
+
+        self.assertEqual(self.broker.message_count(settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_NAME), 0)
+        self.assertEqual(self.broker.message_count(settings.POC_PRINT_HUB_RABBIT_MQ_DEAD_QUEUE_NAME), 1)
+        self.assertEqual(self.print_service.get_queue_status().data["deadLetter"]["count"], 1)
+
+    def test_republish_moves_dead_letters_back(self):
+        self.broker.fill(settings.POC_PRINT_HUB_RABBIT_MQ_DEAD_QUEUE_NAME, [SAMPLE_REQUEST_BODY] * 3)
+
+        self.print_service.republish_dead_queue_messages()
+
+        self.assertEqual(self.broker.message_count(settings.POC_PRINT_HUB_RABBIT_MQ_DEAD_QUEUE_NAME), 0)
+        self.assertEqual(self.broker.message_count(settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_NAME), 3)
+
+    def test_deleted_tenant_sub_queue_is_moved_back_to_lane(self):
+        queue_name = settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_NAME
+        sub_queue_name = tenant_scheduler.queue_name(queue_name, "deleted-tenant")
+        self.broker.fill(sub_queue_name, [SAMPLE_REQUEST_BODY] * 2)
+
+        state_dir = self.enterContext(tempfile.TemporaryDirectory())
+        tenant_queues_file_path = os.path.join(state_dir, "tenant_queues.json")
+        self.enterContext(mock.patch.object(tenant_scheduler, "tenant_queues_file_path", tenant_queues_file_path))
+        self.enterContext(mock.patch.object(tenant_scheduler, "enabled", True))
+
+        # served when its messages were published, deleted since
+        with open(tenant_queues_file_path, "w") as tenant_queues_file:
+            json.dump({ "deleted-tenant": None }, tenant_queues_file)
+
+        with mock.patch.object(tenant_scheduler, "tenant_ids", lambda: []):
+            self.print_service._move_retired_tenant_queue_messages()
+
+        self.assertEqual(self.broker.message_count(sub_queue_name), 0)
+        self.assertEqual(self.broker.message_count(queue_name), 2)
+        self.assertEqual(tenant_scheduler.retired_tenant_ids(), ["deleted-tenant"]) # until found empty past the grace period
+
+class InMemoryQueueBackendTests(QueueBackendTests, TransactionTestCase):
+    queue_backend = "rabbitmq"
+
+    def build_broker(self) -> InMemoryBroker:
+        return InMemoryBroker()
+
+class DatabaseQueueBackendTests(QueueBackendTests, TransactionTestCase):
+    queue_backend = "database"
+
+    def build_broker(self) -> DatabaseBenchmarkBroker:
+        return DatabaseBenchmarkBroker(database_broker.poll_interval_sec, database_broker.lease_sec)
+
+    def test_claim_expires_with_lease(self):
+        queue_name = settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_NAME
+        self.broker.fill(queue_name, [b"first"])
+
+        with mock.patch.object(database_broker, "lease_sec", 0.2):
+            consumer_channel = open_connection().channel()
+            other_channel = open_connection().channel()
+
+            self.assertEqual(consumer_channel.basic_get(queue_name)[2], b"first")
+            self.assertEqual(other_channel.basic_get(queue_name), (None, None, None)) # claimed
+            self.assertEqual(self.broker.message_count(queue_name), 0)
+
+            # the consumer is not heard from: its claim expires, like the unacked messages of a lost connection
+            time.sleep(0.3)
+            method_frame, _, body = other_channel.basic_get(queue_name)
+            self.assertEqual(body, b"first")
+
+            # the first consumer no longer owns the message: its ack is a no-op
+            consumer_channel.basic_ack(1)
+            self.assertEqual(QueueMessage.objects.count(), 1)
+
+            other_channel.basic_ack(method_frame.delivery_tag)
+            self.assertEqual(QueueMessage.objects.count(), 0)
+
+    def test_claim_is_renewed_while_channel_is_in_use(self):
+        queue_name = settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_NAME
+        self.broker.fill(queue_name, [b"first"])
+
+        with mock.patch.object(database_broker, "lease_sec", 0.3):
+            channel = open_connection().channel()
+            channel.basic_get(queue_name)
+            claimed_until = QueueMessage.objects.get().claimed_until
+
+            time.sleep(0.15)
+            channel.basic_get(queue_name) # an empty poll renews the claims past a third of the lease
+
+            self.assertGreater(QueueMessage.objects.get().claimed_until, claimed_until)
+
+    def test_consume_without_inactivity_timeout_waits_for_messages(self):
+        queue_name = settings.POC_PRINT_HUB_RABBIT_MQ_QUEUE_NAME
+        channel = open_connection().channel()
+        sleep = time.sleep
+        poll_count = 0
+
+        # published while the consumer waits on the empty queue
+        def poll_sleep(duration: float) -> None:
+            nonlocal poll_count
+            poll_count += 1
+
+            if poll_count == 3:
+                self.broker.fill(queue_name, [json.dumps({ "poll": poll_count }).encode()])
+
+            sleep(0)
+
+        with mock.patch("pocprintapi.services.databasebroker.time.sleep", poll_sleep):
+            method_frame, _, body = next(channel.consume(queue_name))
+
+        self.assertIsNotNone(method_frame)
+        self.assertEqual(json.loads(body), { "poll": 3 })
@@ -1,14 +1,24 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
 from . import endpoints
 
+# under ASGI, the hot paths are served by native async views. Only imported then: aio-pika is slow to import
+if settings.POC_PRINT_HUB_ASYNC_ENDPOINTS_ENABLED:
+    from . import asyncendpoints as hot_endpoints
+else:
+    hot_endpoints = endpoints
+
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/printer/status', endpoints.status, name='status'),
+    path('api/printer/status', hot_endpoints.status, name='status'),
     path('api/printer/feed', endpoints.feed, name='feed'),
     path('api/printer/cut', endpoints.cut, name='cut'),
-    path('api/queues/publish', endpoints.publish, name='publish'),
+    path('api/queues/publish', hot_endpoints.publish, name='publish'),
+    path('api/queues/publish/batch', endpoints.publish_batch, name='publishbatch'),
     path('api/queues/republish', endpoints.republish, name='republish'),
-    path('api/queues/status', endpoints.queue_status, name='queuestatus'),
-    path('api/tenant/role', endpoints.tenant_role, name='tenantrole')
-]
+    path('api/queues/republish/status', endpoints.republish_status, name='republishstatus'),
+    path('api/queues/status', hot_endpoints.queue_status, name='queuestatus'),
+    path('api/tenant/role', endpoints.tenant_role, name='tenantrole'),
+    path('api/metrics', endpoints.metrics, name='metrics')
+]
\ No newline at end of file